@@ -1,6 +1,6 @@
 # 실제 API 기능이 들어있는 파일
 import os
-import json
+import shutil
 from glob import glob
 import cv2
 from typing import List
@@ -8,15 +8,31 @@ from typing import List
 from fastapi import APIRouter, UploadFile, File, HTTPException
 from pydantic import BaseModel
 
-from core.report.update_report import load_report, save_report
+from core.report.update_report import (
+    export_report_json,
+    load_report,
+    load_report_section,
+    load_report_status,
+    report_exists,
+    save_report,
+)
+from core.pipeline.job_runner import (
+    StageAlreadyRunning,
+    StageCancelled,
+    StageContext,
+    get_job_runner,
+)
 from core.pipeline.dataset_builder import build_training_dataset
 from core.pipeline.retouch import retouch_image
-from core.face.visualize import save_face_preview
+from core.face.dedupe import DEDUPE_MAX_DISTANCE, dedupe_passed
+from core.face.quality import QUALITY_DECODE_SIDE, iter_check_uploads
 
 from core.io.storage import (
+    MAX_UPLOAD_JOB_BYTES,
+    UploadTooLarge,
     create_job_folder,
     is_allowed_image,
-    save_upload_file,
+    save_upload_file_async,
 )
 
 router = APIRouter()
@@ -40,16 +56,111 @@ EYE_Y_RATIO = 0.35
 EYE_DIST_TO_CROP_W = 3.5
 
 
-@router.post("/api/jobs") # 업로드 요청을 받는 API 엔드포인트. 여러 이미지 파일을 업로드 받아서 Job 폴더에 저장한다.
-async def create_job(files: List[UploadFile] = File(...)):
+@router.get("/api/models")
+def model_stats():
+    """공유 모델 레지스트리 상태 (모델별 로딩 시간 / 상주 메모리) + 켜진 INT8 모델의 정확도 기록"""
+    from core.pipeline.model_registry import get_registry, quantized_model_info
+
+    return {**get_registry().stats(), "quantized": quantized_model_info()}
+
+
+@router.get("/api/matting/stats")
+def matting_stats():
+    """매팅 브로커 상태 (해상도 단계별 큐 길이 / 배치 채움 비율 / 대기시간)"""
+    from core.pipeline.matting_broker import matting_broker_stats
+
+    return matting_broker_stats()
+
+
+@router.get("/api/cache/results")
+def result_cache_stats():
+    """job 간 단계 결과 캐시 상태 (단계별 hit / miss, 디스크 사용량, eviction)"""
+    from core.io.result_cache import get_result_cache
+
+    return get_result_cache().stats()
+
+
+@router.get("/api/cache/frames")
+def frame_cache_stats():
+    """디코딩 프레임 캐시 상태 (hit / miss / eviction / 메모리 사용량)"""
+    from core.io.frame_cache import get_frame_cache
+
+    return get_frame_cache().stats()
+
+
+def _job_path(job_id: str) -> str:
+    return os.path.join("data", "jobs", job_id)
+
+
+def _submit_stage(job_id: str, stage: str, fn, *args) -> dict:
+    """단계 함수를 워커 풀에 넘기고 handle(job_id/stage/state/status_url)을 반환"""
+    try:
+        return get_job_runner().submit(job_id, stage, fn, job_id, *args)
+    except StageAlreadyRunning as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.get("/api/jobs/{job_id}/status")
+def job_status(job_id: str):
+    """단계별 상태(queued/running/done/failed/cancelled)와 진행률"""
+    job_path = _job_path(job_id)
+    report_path = os.path.join(job_path, "report.json")
+
+    # report 전체가 아니라 jobs 테이블의 작은 상태만 읽는다
+    status = load_report_status(report_path)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return {
+        "job_id": job_id,
+        "next_stage": status["next_stage"],
+        "updated_at": status["updated_at"],
+        "stages": get_job_runner().status(job_id),
+    }
+
+
+@router.get("/api/jobs/{job_id}/report")
+def job_report(job_id: str, export: bool = False):
+    """
+    job report 전체. export=true면 report.json 파일로도 내보낸다
+    (IDPHOTO_REPORT_JSON_EXPORT가 꺼져 있으면 저장할 때마다 파일을 다시 쓰지 않으므로 필요할 때 요청)
+    """
+    job_path = _job_path(job_id)
+    report_path = os.path.join(job_path, "report.json")
+
+    if not report_exists(report_path):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    report = load_report(report_path)  # 저장소에 없는 예전 job이면 여기서 옮긴다
+    if export:
+        export_report_json(report_path)
+    return dict(report)
+
+
+@router.post("/api/jobs/{job_id}/stages/{stage}/cancel")
+def cancel_stage(job_id: str, stage: str):
+    if not get_job_runner().cancel(job_id, stage):
+        raise HTTPException(status_code=409, detail=f"{stage} is not queued or running")
+    return get_job_runner().handle(job_id, stage)
+
+
+@router.post("/api/jobs", status_code=202) # 업로드 요청을 받는 API 엔드포인트. 여러 이미지 파일을 업로드 받아서 Job 폴더에 저장한다.
+async def create_job(files: List[UploadFile] = File(...), run: bool = False, tier: str | None = None):
     """
     여러 이미지 파일을 업로드 받아서 Job 폴더에 저장한다.
     - 이미지 확장자 검사
     - 저장 파일명 충돌 방지
+    - 파일 / job 크기 제한 (청크 단위로 받으면서 SHA-256 계산)
     - report.json 뼈대 생성
+    - run=true면 품질 검사 대신 전체 파이프라인(/run)을 바로 시작한다 (tier: /run과 같은 매팅 해상도 단계)
     """
+    from core.pipeline.model_registry import resolve_matting_tier
 
-    from core.face.detect_mp import detect_faces_mediapipe
+    # 업로드를 받기 전에 검증
+    try:
+        requested_tier, tier = resolve_matting_tier(tier)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     # 1) 파일이 하나도 안 들어오면 에러 처리
     if not files:
@@ -58,10 +169,11 @@ async def create_job(files: List[UploadFile] = File(...)):
     # 2) job 폴더 생성
     job_id, job_path = create_job_folder()
     uploads_dir = os.path.join(job_path, "uploads")
-    work_dir = os.path.join(job_path, "work")
 
     saved_files = []
     rejected_files = []
+    upload_hashes = {}
+    total_bytes = 0
 
     # 3) 파일 하나씩 검사 및 저장
     for f in files:
@@ -71,8 +183,23 @@ async def create_job(files: List[UploadFile] = File(...)):
             )
             continue
 
-        saved_name = save_upload_file(f, uploads_dir)
+        try:
+            saved_name, sha256, size = await save_upload_file_async(
+                f,
+                uploads_dir,
+                remaining_job_bytes=MAX_UPLOAD_JOB_BYTES - total_bytes,
+            )
+        except UploadTooLarge as e:
+            if e.scope == "job":
+                # 요청 전체가 너무 크면 job을 만들지 않는다
+                shutil.rmtree(job_path, ignore_errors=True)
+                raise HTTPException(status_code=413, detail=str(e))
+            rejected_files.append({"filename": f.filename, "reason": str(e)})
+            continue
+
         saved_files.append(saved_name)
+        upload_hashes[saved_name] = sha256
+        total_bytes += size
 
     # 4) 저장된 이미지가 0개면 job 자체를 실패로 처리
     if len(saved_files) == 0:
@@ -91,107 +218,56 @@ async def create_job(files: List[UploadFile] = File(...)):
             "total_received": len(files),
             "saved": len(saved_files),
             "rejected": len(rejected_files),
+            "bytes_saved": total_bytes,
         },
         "saved_files": saved_files,
+        # 업로드 내용 해시 (SHA-256). 이후 단계 캐시 키로 사용
+        "upload_hashes": upload_hashes,
         "rejected_files": rejected_files,
         "next_stage": "quality_check (planned)",
     }
 
     report_path = os.path.join(job_path, "report.json")
-    with open(report_path, "w", encoding="utf-8") as fp:
-        json.dump(report, fp, ensure_ascii=False, indent=2)
+    save_report(report_path, report)
 
     # ----------------------------
-    # 2) 얼굴 탐지 품질 검사 (Day-3) 
+    # 2) 얼굴 탐지 품질 검사는 워커에서 실행 (결과는 /status 또는 report.json)
     # ----------------------------
-    report = load_report(report_path)
-    report.setdefault("idphoto_dataset", {})
-
-
-    passed_images = []
-    rejected_images = []
-
-    for filename in saved_files:
-        img_path = os.path.join(uploads_dir, filename)
-
-        image = cv2.imread(img_path)    #저장된 이미지 파일을 읽어서, 메모리 안에 “이미지 배열”로 만든다 
-
-        preview_name = f"preview__{filename}"
-
-        if image is None:
-            rejected_images.append({
-                "filename": filename,
-                "reason": "Failed to read image",
-                "preview": None
-            })
-            continue
-
-
-        #(얼굴 탐지 모델)를 이용해 얼굴을 탐지한다.
-        faces_raw = detect_faces_mediapipe(image)
-
-        # 1차: 기본 threshold (정상 사진에서 오탐 억제)
-        faces = [f for f in faces_raw if f.get("score", 0.0) >= 0.6]
-
-        # 2차(fallback): 0개면 너무 보수적일 수 있으니 threshold를 낮춰 다시 시도
-        if len(faces) == 0 and len(faces_raw) > 0:
-            faces = [f for f in faces_raw if f.get("score", 0.0) >= 0.3]
-
-        face_count = len(faces)
-
-        # 대표 얼굴 1개 선택: 일단 가장 큰 박스를 대표로(간단 버전)
-        main_face_bbox = None
-        if face_count > 0:
-            main_face = max(
-                faces,
-                key=lambda f: (f["bbox"][2] * f["bbox"][3]) * f.get("score", 1.0)
-            )
-            main_face_bbox = main_face["bbox"]
-
-        # preview 저장
-        save_face_preview(
-            image,
-            faces,
-            main_face_bbox,
-            save_dir=work_dir,
-            filename=filename,
-        )
-        
-        # 얼굴이 0개면 거부
-        if face_count == 0:
-            rejected_images.append({
-                "filename": filename,
-                "reason": "No face detected",
-                "faces_detected": face_count,
-                "preview": preview_name
-            })
-
-        # 얼굴이 2개 이상이면 거부 (새 규칙)
-        elif face_count >= 2:
-            rejected_images.append({
-                "filename": filename,
-                "reason": "Multiple faces detected",
-                "faces_detected": face_count,
-                "preview": preview_name
-            })
+    if run:
+        handle = _submit_stage(job_id, "run", _run_pipeline, tier, requested_tier)
+    else:
+        handle = _submit_stage(job_id, "quality_check", _run_quality_check)
 
-        # 얼굴이 정확히 1개면 통과
-        else:
-            passed_images.append({
-                "filename": filename,
-                "faces_detected": face_count,
-                "preview": preview_name
-            })
+    # ----------------------------
+    # 3) 최종 응답
+    # ----------------------------
+    return {
+        "job_id": job_id,
+        "saved_files": saved_files,
+        "rejected_files": rejected_files,
+        "stage": handle,
+    }
 
 
-            
+def _apply_quality_gate(
+    report: dict,
+    passed_images: list,
+    rejected_images: list,
+    detector: str,
+    duplicates: list | None = None,
+) -> None:
     report["quality_check"] = {
+        "detector": detector,
         "passed": passed_images,
-        "rejected": rejected_images
+        "rejected": rejected_images,
+        # 중복으로 묶여 빠진 사진 (passed에는 그룹마다 가장 선명한 1장만 남는다)
+        "duplicates": duplicates or [],
+        "dedupe_max_distance": DEDUPE_MAX_DISTANCE,
     }
 
     report["summary"]["quality_passed"] = len(passed_images)
     report["summary"]["quality_rejected"] = len(rejected_images)
+    report["summary"]["quality_duplicates"] = len(duplicates or [])
 
     # ----------------------------
     # (Day-3 Gate) 최소 통과 장수 기준
@@ -218,83 +294,273 @@ async def create_job(files: List[UploadFile] = File(...)):
     # next_stage도 gate 결과에 따라 다르게
     report["next_stage"] = "prepare_faces (planned)" if can_proceed else "upload_more_photos"
 
-    save_report(report_path, report)
 
+def _run_quality_check(ctx: StageContext, job_id: str) -> dict:
+    from core.face.detect_mp import FACE_DETECTOR_BACKEND, detect_faces
+
+    job_path = _job_path(job_id)
+    report_path = os.path.join(job_path, "report.json")
 
     # ----------------------------
-    # 3) 최종 응답
+    # 2) 얼굴 탐지 품질 검사 (Day-3) 
     # ----------------------------
+    report = load_report(report_path)
+    report.setdefault("idphoto_dataset", {})
+
+    saved_files = report["saved_files"]
+    ctx.set_total(len(saved_files))
+
+    passed_images = []
+    rejected_images = []
+
+    # 워커 풀에서 병렬로 검사하되 결과 순서는 업로드 순서 그대로
+    # 얼굴 유무/개수만 보면 되므로 축소 해상도로 검사 (QUALITY_DECODE_SIDE, 원본 프레임은 캐시에 남아 prepare_faces가 재사용)
+    for entry, _, _ in iter_check_uploads(
+        job_path, saved_files, detect_faces, decode_side=QUALITY_DECODE_SIDE
+    ):
+        if "reason" in entry:
+            rejected_images.append(entry)
+        else:
+            passed_images.append(entry)
+        ctx.step()
+
+    # 연사 / 같은 사진 중복 업로드는 가장 선명한 1장만 다음 단계로
+    passed_images, duplicates = dedupe_passed(passed_images)
+
+    _apply_quality_gate(report, passed_images, rejected_images, FACE_DETECTOR_BACKEND, duplicates)
+
+    save_report(report_path, report)
+
     return {
         "job_id": job_id,
-        "saved_files": saved_files,
-        "rejected_files": rejected_files,
         "quality_check": report["quality_check"],
         "policy": report["policy"],
         "gate": report["gate"],
     }
 
 
+@router.post("/api/jobs/{job_id}/run", status_code=202)
+async def run_pipeline(job_id: str, tier: str | None = None):
+    """
+    업로드된 사진들을 detect → frame → matte → embed 까지 한 번에 처리한다.
+    단계별 엔드포인트와 같은 report 섹션을 만들지만, 중간 파일을 쓰고 다시 읽지 않는다.
+    - tier: 매팅 해상도 단계 full | medium | low (기본 IDPHOTO_MATTING_TIER)
+    """
+    from core.pipeline.model_registry import resolve_matting_tier
 
-
-@router.post("/api/jobs/{job_id}/prepare_faces")
-async def prepare_faces(job_id: str):
-    from core.pipeline.face_align import frame_id_photo, draw_landmarks
-
-    job_path = os.path.join("data", "jobs", job_id)
+    job_path = _job_path(job_id)
     report_path = os.path.join(job_path, "report.json")
 
-    if not os.path.exists(report_path):
+    if not report_exists(report_path):
         raise HTTPException(status_code=404, detail="Job not found")
 
+    try:
+        requested_tier, tier = resolve_matting_tier(tier)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return _submit_stage(job_id, "run", _run_pipeline, tier, requested_tier)
+
+
+def _run_pipeline(ctx: StageContext, job_id: str, tier: str, requested_tier: str) -> dict:
+    from core.face.detect_mp import FACE_DETECTOR_BACKEND, detect_faces
+    from core.pipeline.face_embedding import finalize_identity, resolve_embedding_device
+    from core.pipeline.matting_broker import get_matting_broker
+    from core.pipeline.model_registry import (
+        BIREFNET_WEIGHT_PATH,
+        get_arcface_embedder,
+        get_face_mesh_aligner,
+        quantized_model_info,
+    )
+    from core.pipeline.bg_outputs import resolve_profile, white_rel
+    from core.pipeline.streaming import run_streaming_pipeline
+
+    job_path = _job_path(job_id)
+    report_path = os.path.join(job_path, "report.json")
     report = load_report(report_path)
+    report.setdefault("idphoto_dataset", {})
+
+    saved_files = report["saved_files"]
+    ctx.set_total(len(saved_files))
+
+    broker = get_matting_broker(tier)
+    output_profile = resolve_profile()
+    frame_params = {
+        "out_w": OUT_W,
+        "out_h": OUT_H,
+        "eye_y_ratio": EYE_Y_RATIO,
+        "eye_dist_to_crop_w": EYE_DIST_TO_CROP_W,
+    }
+
+    res = run_streaming_pipeline(
+        job_path,
+        saved_files,
+        detect_fn=detect_faces,
+        frame_params=frame_params,
+        broker=broker,
+        aligner=get_face_mesh_aligner(),
+        output_profile=output_profile,
+        on_item=ctx.step,
+    )
+
+    # 1) 품질 검사 섹션 (create_job과 같은 형식)
+    _apply_quality_gate(report, res["passed"], res["rejected"], FACE_DETECTOR_BACKEND, res["duplicates"])
+
+    # 2) 프레이밍 섹션 (prepare_faces와 같은 형식)
+    report["idphoto_dataset"]["params"] = frame_params
+    report["idphoto_dataset"]["prepared_faces"] = res["prepared_faces"]
+    report["idphoto_dataset"]["failed"] = res["framing_failed"]
+    report["idphoto_dataset"]["framing"] = res["framing"]
+
+    # 3) 배경 섹션 (background와 같은 형식)
+    report["background"] = {
+        "method": "BiRefNet_dynamic-matting",
+        "params": {
+            # identity 단계가 흰 배경 파일을 읽으므로 /run은 프로필과 관계없이 항상 저장
+            "out_white": True,
+            "out_rgba": "bgra" in output_profile["artifacts"],
+            "weight_file": os.path.basename(BIREFNET_WEIGHT_PATH),
+            # 실제로 쓴 tier (INT8 BiRefNet이면 full로 내려간다) / 요청한 tier
+            "tier": tier,
+            "requested_tier": requested_tier,
+            "max_batch": broker.max_batch,
+            "max_wait_ms": broker.max_wait_s * 1000.0,
+            # INT8 모델이면 양자화 때 기록한 fp32 대비 정확도 (아니면 None)
+            "quantized": quantized_model_info().get("birefnet"),
+        },
+        "profile": output_profile,
+        "outputs": res["bg_outputs"],
+        "failed": res["bg_failed"],
+    }
+
+    # 4) 동일인 임베딩 (gate를 통과한 경우만)
+    if report["gate"]["can_proceed"]:
+        device = resolve_embedding_device()
+        try:
+            report["identity"] = finalize_identity(
+                job_path,
+                res["identity_items"],
+                res["aligned_items"],
+                res["aligned_crops"],
+                embedder=get_arcface_embedder(prefer_gpu=(device == "cuda")),
+                inputs=[white_rel(x) for x in res["bg_outputs"]],
+                device=device,
+                sim_threshold=0.38,
+            )
+            report["next_stage"] = "build_dataset"
+        except Exception as e:
+            report["identity"] = {"error": f"embedding error: {type(e).__name__}: {e}"}
+            report["next_stage"] = "embedding"
+
+    save_report(report_path, report)
+
+    identity = report.get("identity", {})
+    return {
+        "job_id": job_id,
+        "gate": report["gate"],
+        "faces_prepared": len(res["prepared_faces"]),
+        "background_done": len(res["bg_outputs"]),
+        "kept": len(identity.get("kept", [])),
+        "dropped": len(identity.get("dropped", [])),
+        "next_stage": report["next_stage"],
+    }
+
+
+@router.post("/api/jobs/{job_id}/prepare_faces", status_code=202)
+async def prepare_faces(job_id: str):
+    job_path = _job_path(job_id)
+    report_path = os.path.join(job_path, "report.json")
+
+    if not report_exists(report_path):
+        raise HTTPException(status_code=404, detail="Job not found")
 
-    if not report.get("gate", {}).get("can_proceed", False):
+    if not load_report_section(report_path, "gate", {}).get("can_proceed", False):
         raise HTTPException(status_code=400, detail="Not enough valid photos")
 
-    uploads_dir = os.path.join(job_path, "uploads")
-    faces_dir = os.path.join(job_path, "faces")
-    os.makedirs(faces_dir, exist_ok=True)
+    return _submit_stage(job_id, "prepare_faces", _run_prepare_faces)
+
+
+def _run_prepare_faces(ctx: StageContext, job_id: str) -> dict:
+    from core.io.result_cache import sha256_file
+    from core.pipeline.framing_pool import frame_faces, framing_fingerprint
+    from core.report.checkpoints import StageCheckpoints, files_exist
+
+    job_path = _job_path(job_id)
+    report_path = os.path.join(job_path, "report.json")
+    report = load_report(report_path)
 
     prepared_faces = []
     failed = []  
+    framing = {}
+    timings = []
 
-    for idx, item in enumerate(report["quality_check"]["passed"], start=1):
-        filename = item["filename"]
-        img_path = os.path.join(uploads_dir, filename)
+    passed = report["quality_check"]["passed"]
+    ctx.set_total(len(passed))
 
-        image = cv2.imread(img_path)
-        if image is None:
-            failed.append({"filename": filename, "reason": "Failed to read image"})
-            continue
+    params = {
+        "out_w": OUT_W,
+        "out_h": OUT_H,
+        "eye_y_ratio": EYE_Y_RATIO,
+        "eye_dist_to_crop_w": EYE_DIST_TO_CROP_W,
+    }
+    upload_hashes = dict(report.get("upload_hashes") or {})
 
-        try:
-            framed, landmarks = frame_id_photo(
-                image,
-                out_w=OUT_W,
-                out_h=OUT_H,
-                eye_y_ratio=EYE_Y_RATIO,
-                eye_dist_to_crop_w=EYE_DIST_TO_CROP_W,
-            )
-        except Exception as e:
-            failed.append({
-                "filename": filename,
-                "reason": f"align error: {type(e).__name__}: {e}"
-            })
+    # 증분 재실행: 업로드 내용 / 파라미터가 같고 결과 파일이 남아 있는 사진은 다시 프레이밍하지 않는다
+    checkpoints = StageCheckpoints(job_id, "prepare_faces")
+    fingerprints = {}
+    reuse = {}
+    for idx, item in enumerate(passed, start=1):
+        filename = item["filename"]
+        if filename not in upload_hashes:
+            upload_hashes[filename] = sha256_file(os.path.join(job_path, "uploads", filename))
+        fp = framing_fingerprint(upload_hashes[filename], params, idx, item.get("landmarks"))
+        if fp is None:
             continue
+        fingerprints[filename] = fp
+        prev = checkpoints.lookup(
+            filename,
+            fp,
+            lambda out: files_exist(job_path, [
+                os.path.join("faces", out["out_name"]),
+                out["framing"]["landmarks"],
+                out["framing"]["transform"],
+            ]),
+        )
+        if prev is not None:
+            reuse[filename] = prev
+
+    def record(res: dict) -> None:
+        # 1장 끝날 때마다 기록 → 중간에 죽어도 다시 실행하면 남은 사진부터 (실패한 사진은 다음에 다시 시도)
+        fp = fingerprints.get(res["filename"])
+        if fp is not None and res["out_name"] is not None:
+            checkpoints.record(res["filename"], fp, {
+                k: res[k] for k in ("idx", "filename", "out_name", "reason", "framing")
+            })
 
-    
-        if framed is None:
-            failed.append({"filename": filename, "reason": "Framing failed"})
-            continue 
-        out_name = f"idphoto_{idx:02d}_{filename}"
-        cv2.imwrite(os.path.join(faces_dir, out_name), framed)
-        prepared_faces.append(out_name)
+    # 사진 단위로 프로세스 풀에 나눠서 프레이밍 (결과는 idx 순서 그대로)
+    results = frame_faces(
+        job_path,
+        passed,
+        params,
+        upload_hashes=upload_hashes,
+        reuse=reuse,
+        on_result=record,
+        on_item=ctx.step,
+    )
+
+    for res in results:
+        timings.append({
+            "filename": res["filename"],
+            "out_name": res["out_name"],
+            **res["timings_ms"],
+        })
+        if res["out_name"] is None:
+            failed.append({"filename": res["filename"], "reason": res["reason"]})
+            continue
+        prepared_faces.append(res["out_name"])
+        framing[res["out_name"]] = res["framing"]
 
-        # 디버깅: 원본에 랜드마크 표기 저장(확인용)
-        landmark_img = draw_landmarks(image, landmarks)
-        landmark_name = f"landmark_{idx:02d}_{filename}"
-        cv2.imwrite(os.path.join(faces_dir, landmark_name), landmark_img)
-        
+    ctx.done = len(passed)
 
     report["idphoto_dataset"]["params"] = {
         "out_w": OUT_W,
@@ -305,6 +571,10 @@ async def prepare_faces(job_id: str):
     report["next_stage"] = "background (planned)"   
     report["idphoto_dataset"]["prepared_faces"] = prepared_faces
     report["idphoto_dataset"]["failed"] = failed
+    report["idphoto_dataset"]["framing"] = framing
+    report["idphoto_dataset"]["timings_ms"] = timings
+    report["idphoto_dataset"]["cache_hits"] = sum(1 for res in results if res.get("cached"))
+    report["idphoto_dataset"]["incremental"] = checkpoints.summary([item["filename"] for item in passed])
 
     save_report(report_path, report)
 
@@ -313,30 +583,42 @@ async def prepare_faces(job_id: str):
         "faces_prepared": len(prepared_faces)
     }
 
-@router.post("/api/jobs/{job_id}/embedding")
+@router.post("/api/jobs/{job_id}/embedding", status_code=202)
 async def embedding(job_id: str):
-    from core.pipeline.face_embedding import extract_identity_embeddings
-    job_path = os.path.join("data", "jobs", job_id)
+    job_path = _job_path(job_id)
     report_path = os.path.join(job_path, "report.json")
 
-    if not os.path.exists(report_path):
+    if not report_exists(report_path):
         raise HTTPException(status_code=404, detail="Job not found")
 
-    report = load_report(report_path)
-
-    background_outputs = report.get("background", {}).get("outputs", [])
+    background_outputs = load_report_section(report_path, "background", {}).get("outputs", [])
     if not background_outputs:
         raise HTTPException(status_code=400, detail="No background outputs. Run /background first.")
 
+    return _submit_stage(job_id, "embedding", _run_embedding)
+
+
+def _run_embedding(ctx: StageContext, job_id: str) -> dict:
+    from core.pipeline.face_embedding import extract_identity_embeddings, resolve_embedding_device
+
+    job_path = _job_path(job_id)
+    report_path = os.path.join(job_path, "report.json")
+    report = load_report(report_path)
+
+    ctx.set_total(len(report.get("background", {}).get("outputs", [])))
+
     try:
         identity = extract_identity_embeddings(
             job_path,
             report,
-            device="cuda",          # cuda 안되면 "cpu"
-            sim_threshold=0.38      # 시작값(필요하면 0.35~0.45 사이 조정)
+            device=resolve_embedding_device(),
+            sim_threshold=0.38,     # 시작값(필요하면 0.35~0.45 사이 조정)
+            on_item=ctx.step,
         )
+    except StageCancelled:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"embedding error: {type(e).__name__}: {e}")
+        raise RuntimeError(f"embedding error: {type(e).__name__}: {e}")
 
     report["identity"] = identity
     report["next_stage"] = "build_dataset"
@@ -358,7 +640,7 @@ async def build_dataset(
     job_path = os.path.join("data", "jobs", job_id)
     report_path = os.path.join(job_path, "report.json")
 
-    if not os.path.exists(report_path):
+    if not report_exists(report_path):
         raise HTTPException(status_code=404, detail="Job not found")
 
     report = load_report(report_path)
@@ -398,97 +680,312 @@ async def build_dataset(
         "missing": len(dataset_info.get("missing", [])),
     }
 
-@router.post("/api/jobs/{job_id}/background")
-async def background(job_id: str):
-    from core.pipeline.background_birefnet import BiRefNetMatting, remove_bg_and_compose_white
+@router.post("/api/jobs/{job_id}/background", status_code=202)
+async def background(
+    job_id: str,
+    profile: str | None = None,
+    artifacts: str | None = None,
+    white_format: str | None = None,
+    jpeg_quality: int | None = None,
+    webp_quality: int | None = None,
+    png_compression: int | None = None,
+    tier: str | None = None,
+):
+    """
+    배경 제거. 저장할 산출물은 출력 프로필로 고른다.
+    - profile: full | white | webp | mask (기본 IDPHOTO_BG_PROFILE)
+    - artifacts: "mask,bgra,white" 처럼 직접 지정 (mask는 항상 저장)
+    - white_format: jpg | webp, 인코딩 품질: jpeg_quality / webp_quality / png_compression
+    저장하지 않은 산출물은 GET /api/jobs/{job_id}/background/{name}/{artifact} 요청 때 합성한다.
+    - tier: 매팅 해상도 단계 full | medium | low (기본 IDPHOTO_MATTING_TIER).
+      full이 아니면 줄여서 추론하고 원본을 guide로 alpha를 원래 해상도까지 올린다.
+    """
+    from core.pipeline.bg_outputs import resolve_profile
+    from core.pipeline.model_registry import BIREFNET_WEIGHT_PATH, resolve_matting_tier
+
     try:
-        job_path = os.path.join("data", "jobs", job_id)
-        report_path = os.path.join(job_path, "report.json")
+        requested_tier, tier = resolve_matting_tier(tier)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        output_profile = resolve_profile(
+            profile,
+            artifacts=[a.strip() for a in artifacts.split(",") if a.strip()] if artifacts else None,
+            white_format=white_format,
+            jpeg_quality=jpeg_quality,
+            webp_quality=webp_quality,
+            png_compression=png_compression,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    job_path = _job_path(job_id)
+    report_path = os.path.join(job_path, "report.json")
+
+    if not report_exists(report_path):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    prepared = load_report_section(report_path, "idphoto_dataset", {}).get("prepared_faces", None)
+    if not prepared:
+        raise HTTPException(status_code=400, detail="No prepared faces. Run prepare_faces first.")
 
-        if not os.path.exists(report_path):
-            raise HTTPException(status_code=404, detail="Job not found")
+    # ✅ HF에서 받은 weight 파일명에 맞춰 경로를 지정
+    # 예: third_party/BiRefNet/weights/model.safetensors
+    if not os.path.exists(BIREFNET_WEIGHT_PATH):
+        raise HTTPException(status_code=500, detail=f"BiRefNet weight not found: {BIREFNET_WEIGHT_PATH}")
+
+    return _submit_stage(job_id, "background", _run_background, output_profile, tier, requested_tier)
+
+
+def _run_background(
+    ctx: StageContext,
+    job_id: str,
+    output_profile: dict,
+    tier: str,
+    requested_tier: str,
+) -> dict:
+    from concurrent.futures import Future
+    import numpy as np
+    from core.io.frame_cache import get_frame_cache
+    from core.io.result_cache import cache_key, get_result_cache, sha256_file
+    from core.pipeline.bg_outputs import alpha_to_u8, write_outputs
+    from core.pipeline.matting_broker import get_matting_broker
+    from core.pipeline.model_registry import BIREFNET_WEIGHT_PATH, birefnet_variant, quantized_model_info
+    from core.report.checkpoints import StageCheckpoints, files_exist, fingerprint
+
+    job_path = _job_path(job_id)
+    report_path = os.path.join(job_path, "report.json")
+    report = load_report(report_path)
 
-        report = load_report(report_path)
+    prepared = report["idphoto_dataset"]["prepared_faces"]
+    ctx.set_total(len(prepared))
 
-        prepared = report.get("idphoto_dataset", {}).get("prepared_faces", None)
-        if not prepared:
-            raise HTTPException(status_code=400, detail="No prepared faces. Run prepare_faces first.")
+    weight_path = BIREFNET_WEIGHT_PATH
 
-        faces_dir = os.path.join(job_path, "faces")
-        bg_dir = os.path.join(job_path, "background")
-        os.makedirs(bg_dir, exist_ok=True)
+    # ✅ 공유 BiRefNet 앞단의 동적 배칭 브로커 (다른 job 요청과 한 배치로 묶일 수 있음)
+    broker = get_matting_broker(tier)
 
-        # ✅ HF에서 받은 weight 파일명에 맞춰 경로를 지정
-        # 예: third_party/BiRefNet/weights/model.safetensors
-        weight_path = os.path.join("third_party", "BiRefNet", "weights", "model.safetensors")
-        if not os.path.exists(weight_path):
-            raise HTTPException(status_code=500, detail=f"BiRefNet weight not found: {weight_path}")
+    entries = {}
+    failed = []
 
-        # ✅ GPU/CPU 자동 선택 (문제 분리하려면 device="cpu"로 고정도 가능)
-        matting = BiRefNetMatting(weight_path=weight_path)
+    # prepare_faces가 캐시에 넣어둔 idphoto가 있으면 다시 디코딩하지 않는다
+    frame_cache = get_frame_cache()
 
-        outputs = []
-        failed = []
+    result_cache = get_result_cache()
+    matting_params = {
+        "weight_file": os.path.basename(weight_path),
+        "variant": birefnet_variant(),
+        "tier": tier,
+    }
 
-        for name in prepared:
-            src_path = os.path.join(faces_dir, name)
-            img = cv2.imread(src_path)
-            if img is None:
-                failed.append({"src": name, "reason": "Failed to read idphoto"})
+    # 증분 재실행: 프레이밍 결과 파일 내용 + 매팅 파라미터 + 출력 프로필이 같고
+    # 저장했던 산출물이 남아 있는 사진은 디코딩 / 매팅 / 인코딩 모두 건너뛴다
+    checkpoints = StageCheckpoints(job_id, "background")
+    artifact_keys = {"mask": "mask_png", "bgra": "bg_png", "white": "white"}
+    fingerprints = {}
+
+    names = []
+    images = []
+    keys = []
+    for name in prepared:
+        face_sha = sha256_file(os.path.join(job_path, "faces", name))
+        if face_sha:
+            fingerprints[name] = fingerprint(face=face_sha, matting=matting_params, profile=output_profile)
+            prev = checkpoints.lookup(
+                name,
+                fingerprints[name],
+                lambda entry: files_exist(job_path, [entry[artifact_keys[k]] for k in entry["written"]]),
+            )
+            if prev is not None:
+                entries[name] = prev
+                ctx.step()
                 continue
 
+        img = frame_cache.get_bgr(job_path, os.path.join("faces", name))
+        if img is None:
+            failed.append({"src": name, "reason": "Failed to read idphoto"})
+            ctx.step()
+            continue
+        names.append(name)
+        images.append(img)
+        # job 간 결과 캐시: 프레이밍 결과 파일 내용 + 가중치 / 엔진 / tier가 같으면 alpha를 재사용
+        keys.append(cache_key(face_sha, matting_params) if face_sha and result_cache.enabled else None)
+
+    # 캐시에 없는 것만 한 장씩 큐에 넣어두면 브로커가 다른 job 요청과 함께 배치로 추론한다
+    futures = []
+    cached = set()
+    for name, img, key in zip(names, images, keys):
+        files = result_cache.get("matting", key) if key else None
+        mask = cv2.imdecode(np.frombuffer(files["alpha.png"], np.uint8), cv2.IMREAD_GRAYSCALE) if files else None
+        if mask is not None:
+            done = Future()
+            done.set_result(mask)
+            futures.append(done)
+            cached.add(name)
+        else:
+            futures.append(broker.submit(img))
+
+    try:
+        for name, img, fut, key in zip(names, images, futures, keys):
             try:
-                bgra, white_bgr = remove_bg_and_compose_white(img, matting)
+                alpha = fut.result()
             except Exception as e:
                 failed.append({"src": name, "reason": f"matting error: {type(e).__name__}: {e}"})
+                ctx.step()
                 continue
 
-            base = os.path.splitext(name)[0]  # idphoto_01_xxx
-            out_png = f"bg_{base}.png"
-            out_jpg = f"white_{base}.jpg"
+            if key and name not in cached:
+                ok, png = cv2.imencode(".png", alpha_to_u8(alpha))
+                if ok:
+                    result_cache.put("matting", key, {"alpha.png": png.tobytes()})
+
+            # 프로필에 있는 산출물만 인코딩 (알파 마스크는 항상)
+            entry, rendered = write_outputs(job_path, f"faces/{name}", img, alpha, output_profile)
+            if "white" in rendered:
+                # embedding 단계가 흰 배경 결과를 다시 디코딩하지 않도록 (무손실 포맷일 때만 캐시에 들어간다)
+                frame_cache.put(job_path, entry["white"], rendered["white"])
+
+            entries[name] = entry
+            if name in fingerprints:
+                checkpoints.record(name, fingerprints[name], entry)
+            ctx.step()
+    except StageCancelled:
+        # 아직 배치에 들어가지 않은 요청은 브로커 큐에서 빠지도록 취소
+        for fut in futures:
+            fut.cancel()
+        raise
 
-            png_path = os.path.join(bg_dir, out_png)
-            jpg_path = os.path.join(bg_dir, out_jpg)
+    outputs = [entries[name] for name in prepared if name in entries]
+    report["background"] = {
+        "method": "BiRefNet_dynamic-matting",
+        "params": {
+            "out_white": "white" in output_profile["artifacts"],
+            "out_rgba": "bgra" in output_profile["artifacts"],
+            "weight_file": os.path.basename(weight_path),
+            # 실제로 쓴 tier (INT8 BiRefNet이면 full로 내려간다) / 요청한 tier
+            "tier": tier,
+            "requested_tier": requested_tier,
+            "max_batch": broker.max_batch,
+            "max_wait_ms": broker.max_wait_s * 1000.0,
+            # INT8 모델이면 양자화 때 기록한 fp32 대비 정확도 (아니면 None)
+            "quantized": quantized_model_info().get("birefnet"),
+        },
+        "profile": output_profile,
+        "outputs": outputs,
+        "failed": failed,
+        "cache_hits": len(cached),
+        "incremental": checkpoints.summary(prepared),
+    }
+    report["next_stage"] = "embedding"
+    save_report(report_path, report)
 
-            cv2.imwrite(png_path, bgra)
-            cv2.imwrite(jpg_path, white_bgr)
-            
-            outputs.append({
-                "src": f"faces/{name}",
-                "bg_png": f"background/{out_png}",
-                "white_jpg": f"background/{out_jpg}"
-            })
+    return {
+        "job_id": job_id,
+        "background_done": len(outputs),
+        "failed": len(failed),
+    }
 
-        report["background"] = {
-            "method": "BiRefNet_dynamic-matting",
-            "params": {
-                "out_white": True,
-                "out_rgba": True,
-                "weight_file": os.path.basename(weight_path)
-            },
-            "outputs": outputs,
-            "failed": failed
-        }
-        report["next_stage"] = "embedding"
-        save_report(report_path, report)
-
-        return {
-            "job_id": job_id,
-            "background_done": len(outputs),
-            "failed": len(failed),
-        }
-
-    except HTTPException:
-        # FastAPI에서 의도적으로 던진 에러는 그대로 올림
-        raise
-    except Exception as e:
-        # ✅ 500 원인을 response body(detail)로 바로 확인 가능
-        raise HTTPException(
-            status_code=500,
-            detail=f"background error: {type(e).__name__}: {e}"
+
+@router.post("/api/jobs/{job_id}/background/composite")
+def background_composite(
+    job_id: str,
+    colors: str | None = "white",
+    gradient: str | None = None,
+    direction: str = "vertical",
+    fmt: str = "jpg",
+):
+    """
+    저장된 알파 마스크로 다른 배경색 결과를 만든다. (모델 추론 없음, background 단계 이후)
+    - colors: "white,lightblue,#D3D3D3" 처럼 단색 목록 (색마다 1장)
+    - gradient: "white,lightblue" 처럼 시작색,끝색 (그라디언트 1장), direction: vertical | horizontal
+    - fmt: jpg | webp  (품질은 background 단계의 출력 프로필을 따른다)
+    결과: background/composite/{idphoto 이름}_{색 라벨}.{fmt}
+    """
+    from core.pipeline.bg_outputs import resolve_profile, write_composites
+    from core.pipeline.compositing import parse_backgrounds
+
+    job_path = _job_path(job_id)
+    report_path = os.path.join(job_path, "report.json")
+    if not report_exists(report_path):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    if direction not in ("vertical", "horizontal"):
+        raise HTTPException(status_code=400, detail="direction must be vertical or horizontal")
+    try:
+        specs = parse_backgrounds(
+            [c for c in colors.split(",") if c.strip()] if colors else None,
+            [c for c in gradient.split(",") if c.strip()] if gradient else None,
+            vertical=direction == "vertical",
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    background = load_report_section(report_path, "background", {})
+    outputs = background.get("outputs", [])
+    if not outputs:
+        raise HTTPException(status_code=400, detail="Run background first")
+    output_profile = background.get("profile") or resolve_profile()
+
+    results = []
+    failed = []
+    for item in outputs:
+        try:
+            files = write_composites(job_path, item, specs, output_profile, fmt=fmt)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except FileNotFoundError as e:
+            failed.append({"src": item.get("src"), "reason": str(e)})
+            continue
+        results.append({"src": item["src"], "files": files})
+
+    return {
+        "job_id": job_id,
+        "backgrounds": [s["label"] for s in specs],
+        "outputs": results,
+        "failed": failed,
+    }
+
+
+@router.get("/api/jobs/{job_id}/background/{name}/{artifact}")
+def background_artifact(job_id: str, name: str, artifact: str, fmt: str | None = None):
+    """
+    배경 제거 산출물 1개를 돌려준다. 저장되지 않은 산출물은 저장된 알파 마스크로 합성해서 만든다.
+    - name: idphoto 파일명 (확장자 없이도 가능)
+    - artifact: mask | bgra | white,  fmt: white일 때 jpg | webp
+    """
+    from fastapi.responses import FileResponse
+    from core.pipeline.bg_outputs import ensure_artifact, resolve_profile
+
+    job_path = _job_path(job_id)
+    report_path = os.path.join(job_path, "report.json")
+    if not report_exists(report_path):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    background = load_report_section(report_path, "background", {})
+    base = os.path.splitext(name)[0]
+    entry = next(
+        (x for x in background.get("outputs", [])
+         if os.path.splitext(os.path.basename(x["src"]))[0] == base),
+        None,
+    )
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"No background output for {name}")
+
+    try:
+        rel = ensure_artifact(
+            job_path,
+            entry,
+            artifact,
+            background.get("profile") or resolve_profile(),
+            white_format=fmt,
         )
-    
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
 
+    return FileResponse(os.path.join(job_path, rel))
 
 
 @router.post("/api/jobs/{job_id}/retouch")
@@ -497,10 +994,12 @@ async def retouch(job_id: str):
     Legacy compatibility endpoint.
     Pipeline no longer requires this stage, but it is retained for older clients/branches.
     """
+    from core.pipeline.bg_outputs import ensure_artifact, resolve_profile
+
     job_path = os.path.join("data", "jobs", job_id)
     report_path = os.path.join(job_path, "report.json")
 
-    if not os.path.exists(report_path):
+    if not report_exists(report_path):
         raise HTTPException(status_code=404, detail="Job not found")
 
     report = load_report(report_path)
@@ -513,10 +1012,13 @@ async def retouch(job_id: str):
     retouch_dir = os.path.join(job_path, "retouch")
     os.makedirs(retouch_dir, exist_ok=True)
 
+    output_profile = background.get("profile") or resolve_profile()
+
     results = []
     for item in outputs:
-        src = item.get("white_jpg")
-        if not src:
+        try:
+            src = ensure_artifact(job_path, item, "white", output_profile)
+        except FileNotFoundError:
             continue
 
         src_path = os.path.join(job_path, src)
@@ -549,12 +1051,12 @@ async def retouch(job_id: str):
     }
 
 
-@router.post("/api/jobs/{job_id}/generate")
+@router.post("/api/jobs/{job_id}/generate", status_code=202)
 async def generate_images(job_id: str, req: GenerateRequest):
-    job_path = os.path.join("data", "jobs", job_id)
+    job_path = _job_path(job_id)
     report_path = os.path.join(job_path, "report.json")
 
-    if not os.path.exists(report_path):
+    if not report_exists(report_path):
         raise HTTPException(status_code=404, detail="Job not found")
 
     report = load_report(report_path)
@@ -590,7 +1092,7 @@ async def generate_images(job_id: str, req: GenerateRequest):
 
     # 지연 import: 생성 파이프라인 모듈이 있을 때만 로딩
     try:
-        from core.pipeline.generate_lora import generate_with_lora
+        from core.pipeline.generate_lora import generate_with_lora  # noqa: F401
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -601,6 +1103,17 @@ async def generate_images(job_id: str, req: GenerateRequest):
             ),
         )
 
+    return _submit_stage(job_id, "generate", _run_generate, req, lora_path)
+
+
+def _run_generate(ctx: StageContext, job_id: str, req: GenerateRequest, lora_path: str) -> dict:
+    from core.pipeline.generate_lora import generate_with_lora
+
+    job_path = _job_path(job_id)
+    report_path = os.path.join(job_path, "report.json")
+
+    ctx.set_total(req.num_images)
+
     try:
         gen_result = generate_with_lora(
             job_path=job_path,
@@ -615,13 +1128,14 @@ async def generate_images(job_id: str, req: GenerateRequest):
             height=req.height,
             seed=req.seed,
             device=None,
+            on_item=ctx.step,
         )
+    except StageCancelled:
+        raise
     except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"generate error: {type(e).__name__}: {e}"
-        )
+        raise RuntimeError(f"generate error: {type(e).__name__}: {e}")
 
+    report = load_report(report_path)
     report["generation"] = gen_result
     report["next_stage"] = "review / face_similarity_check"
     save_report(report_path, report)
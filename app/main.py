@@ -1,8 +1,34 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from starlette.concurrency import run_in_threadpool
 
 from app.api_routes import router
+from core.io.frame_cache import get_frame_cache
+from core.io.storage import UploadSizeLimitMiddleware
+from core.pipeline.framing_pool import shutdown_framing_pool
+from core.pipeline.job_runner import shutdown_job_runner
+from core.pipeline.matting_broker import shutdown_matting_broker
+from core.pipeline.model_registry import get_registry, preload_models
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 서버 시작: 설정된 모델을 미리 로딩 (로딩은 blocking이라 threadpool에서)
+    app.state.model_preload = await run_in_threadpool(preload_models)
+    yield
+    # 서버 종료: 실행 중인 단계 취소 → 워커 풀/브로커 정지 → 공유 모델 해제
+    shutdown_job_runner()
+    shutdown_framing_pool()
+    shutdown_matting_broker()
+    get_registry().clear()
+    get_frame_cache().clear()
+
+
+app = FastAPI(lifespan=lifespan) # 서버 앱 생성
 
-app = FastAPI() # 서버 앱 생성
+# 업로드 본문이 임시 파일로 다 받아지기 전에 요청 크기 제한 (IDPHOTO_MAX_UPLOAD_JOB_MB 기준)
+app.add_middleware(UploadSizeLimitMiddleware)
 
 app.include_router(router)  # api_routes.py에 있는 router(API 모음)를 서버에 등록
 
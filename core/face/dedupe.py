@@ -0,0 +1,88 @@
+# 업로드 중복(연사 / 같은 셀카 두 번) 제거
+# 품질 검사 때 이미 디코딩한 이미지로 dHash(64bit)와 선명도를 구해두고,
+# 해밍 거리가 가까운 사진끼리 묶어서 그룹마다 가장 선명한 1장만 남긴다.
+# (중복 사진이 FaceMesh / BiRefNet / ArcFace를 다시 타지 않고, LoRA 데이터셋도 한쪽으로 치우치지 않게)
+import os
+
+import cv2
+import numpy as np
+
+# 같은 사진으로 볼 dHash 해밍 거리 (64bit 중). 음수면 중복 제거를 하지 않는다.
+DEDUPE_MAX_DISTANCE = int(os.environ.get("IDPHOTO_DEDUPE_MAX_DISTANCE", "6"))
+
+# 선명도 계산용 축소 크기 (긴 변)
+_SHARPNESS_SIDE = 512
+
+
+def dhash(image_bgr: np.ndarray, hash_size: int = 8) -> str:
+    """
+    difference hash. (hash_size+1) x hash_size 흑백으로 줄인 뒤 가로로 이웃 픽셀 밝기를 비교한다.
+    반환: 16자리 hex 문자열 (hash_size=8 → 64bit)
+    """
+    gray = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    value = 0
+    for b in bits:
+        value = (value << 1) | int(b)
+    return f"{value:0{hash_size * hash_size // 4}x}"
+
+
+def hamming(a: str, b: str) -> int:
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+def sharpness(image_bgr: np.ndarray) -> float:
+    """Laplacian 분산 (클수록 선명). 해상도 영향을 줄이려고 긴 변 512로 줄여서 계산"""
+    h, w = image_bgr.shape[:2]
+    scale = min(1.0, _SHARPNESS_SIDE / float(max(h, w)))
+    gray = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2GRAY)
+    if scale < 1.0:
+        gray = cv2.resize(gray, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+def dedupe_passed(passed: list[dict], max_distance: int = DEDUPE_MAX_DISTANCE) -> tuple[list[dict], list[dict]]:
+    """
+    품질 검사 통과 항목(dhash / sharpness 포함)을 중복 그룹으로 묶고 그룹마다 1장만 남긴다.
+
+    반환: (kept, duplicates)
+      - kept: 남길 항목 (원래 순서 유지)
+      - duplicates: [{"filename", "duplicate_of", "distance", "sharpness"}, ...]
+    """
+    if max_distance < 0 or len(passed) < 2:
+        return list(passed), []
+
+    # 선명한 사진부터 보면서, 이미 남긴 사진(대표) 중 가장 가까운 것과 max_distance 이하면 그 그룹으로 넣고
+    # 아니면 새 대표로 남긴다. 대표와 직접 비교하므로 비슷한 사진이 사슬처럼 이어져 한 그룹이 되지 않고,
+    # 기록되는 distance도 항상 max_distance 이하다. (같은 선명도면 먼저 올라온 사진이 대표)
+    hashes = [item.get("dhash") for item in passed]
+    order = sorted(range(len(passed)), key=lambda i: (-passed[i].get("sharpness", 0.0), i))
+
+    representatives: list[int] = []
+    keep_idx = set()
+    duplicates = []
+    for i in order:
+        best, best_dist = None, None
+        if hashes[i] is not None:
+            for r in representatives:
+                d = hamming(hashes[i], hashes[r])
+                if d <= max_distance and (best_dist is None or d < best_dist):
+                    best, best_dist = r, d
+        if best is None:
+            keep_idx.add(i)
+            if hashes[i] is not None:
+                representatives.append(i)
+            continue
+        duplicates.append({
+            "index": i,
+            "filename": passed[i]["filename"],
+            "duplicate_of": passed[best]["filename"],
+            "distance": best_dist,
+            "sharpness": passed[i].get("sharpness"),
+        })
+
+    # 업로드 순서로 기록
+    duplicates.sort(key=lambda d: d.pop("index"))
+    kept = [item for i, item in enumerate(passed) if i in keep_idx]
+    return kept, duplicates
@@ -1,30 +1,52 @@
-import cv2
+import os
+import threading
+
 import mediapipe as mp
 
-_mp_face_mesh = None
+from core.face.detect_proxy import bbox_to_full, make_detection_proxy
+from core.face.landmarks_store import landmarks_to_array
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+# 품질 검사용 얼굴 탐지 백엔드: "facemesh" | "blazeface"
+FACE_DETECTOR_BACKEND = os.environ.get("IDPHOTO_FACE_DETECTOR", "facemesh")
+
+# 레포에 포함된 BlazeFace(short range) 모델
+BLAZEFACE_MODEL_PATH = os.path.join(ROOT, "models", "blaze_face_short_range.tflite")
+
+# create_job의 0.6 / 0.3 fallback이 동작하도록 낮은 값까지 후보로 받아둔다
+BLAZEFACE_MIN_CONFIDENCE = 0.3
+
+# FaceMesh / FaceDetector 인스턴스는 스레드 간 공유가 안전하지 않으므로 스레드마다 하나씩 만든다
+_local = threading.local()
 
 
 def _get_face_mesh():
-    """FaceMesh를 최초 1회만 생성(지연 초기화)"""
-    global _mp_face_mesh
-    if _mp_face_mesh is None:
-        _mp_face_mesh = mp.solutions.face_mesh.FaceMesh(
+    """현재 스레드의 FaceMesh를 최초 1회만 생성(지연 초기화)"""
+    fm = getattr(_local, "face_mesh", None)
+    if fm is None:
+        fm = mp.solutions.face_mesh.FaceMesh(
             static_image_mode=True,
             max_num_faces=5,
             refine_landmarks=True,
             min_detection_confidence=0.5,
         )
-    return _mp_face_mesh
+        _local.face_mesh = fm
+    return fm
 
-def detect_faces_mediapipe(image_bgr):
+def detect_faces_mediapipe(image_bgr, image_rgb=None, max_side=None):
     """
     FaceMesh 기반 얼굴 탐지.
+    image_rgb: 프레임 캐시에 이미 변환해둔 RGB가 있으면 넘긴다 (cvtColor 생략)
+    max_side: 탐지 프록시 긴 변 (None이면 DETECT_MAX_SIDE, 0이면 원본 해상도)
     반환:
-      [{"bbox": (x, y, w, h), "score": 1.0}, ...]
+      [{"bbox": (x, y, w, h), "score": 1.0, "landmarks": (478,3) float32 정규화 좌표}, ...]
+      - bbox는 원본 해상도 픽셀 좌표
     """
 
+    # 랜드마크는 정규화 좌표라서 축소 프록시에서 구해도 원본 크기(w, h)를 곱하면 원본 좌표가 된다
     h, w = image_bgr.shape[:2]
-    rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
+    rgb, _ = make_detection_proxy(image_bgr, image_rgb, max_side)
 
     results = _get_face_mesh().process(rgb)
 
@@ -44,7 +66,70 @@ def detect_faces_mediapipe(image_bgr):
 
         faces.append({
             "bbox": (x_min, y_min, x_max - x_min, y_max - y_min),
-            "score": 1.0  # FaceMesh는 별도 score 없음
+            "score": 1.0,  # FaceMesh는 별도 score 없음
+            # 이후 단계(prepare_faces, embedding)에서 재사용하도록 랜드마크도 같이 반환
+            "landmarks": landmarks_to_array(face_landmarks.landmark),
+        })
+
+    return faces
+
+
+
+def _get_blaze_detector():
+    """현재 스레드의 BlazeFace FaceDetector를 최초 1회만 생성(지연 초기화)"""
+    detector = getattr(_local, "blaze_detector", None)
+    if detector is None:
+        from mediapipe.tasks import python as mp_tasks
+        from mediapipe.tasks.python import vision
+
+        if not os.path.exists(BLAZEFACE_MODEL_PATH):
+            raise FileNotFoundError(f"BlazeFace model not found: {BLAZEFACE_MODEL_PATH}")
+
+        options = vision.FaceDetectorOptions(
+            base_options=mp_tasks.BaseOptions(model_asset_path=BLAZEFACE_MODEL_PATH),
+            running_mode=vision.RunningMode.IMAGE,
+            min_detection_confidence=BLAZEFACE_MIN_CONFIDENCE,
+        )
+        detector = vision.FaceDetector.create_from_options(options)
+        _local.blaze_detector = detector
+    return detector
+
+
+def detect_faces_blazeface(image_bgr, image_rgb=None, max_side=None):
+    """
+    BlazeFace(short range) 기반 얼굴 탐지. FaceMesh보다 훨씬 가볍고 실제 confidence를 준다.
+    반환:
+      [{"bbox": (x, y, w, h), "score": float}, ...]
+    (랜드마크는 없으므로 prepare_faces에서 FaceMesh로 한 번 구한다)
+    """
+    rgb, scale = make_detection_proxy(image_bgr, image_rgb, max_side)
+    mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb)
+
+    result = _get_blaze_detector().detect(mp_image)
+
+    faces = []
+    for det in result.detections:
+        bb = det.bounding_box
+        score = det.categories[0].score if det.categories else 0.0
+        faces.append({
+            # 프록시 픽셀 → 원본 픽셀
+            "bbox": bbox_to_full((bb.origin_x, bb.origin_y, bb.width, bb.height), scale),
+            "score": float(score),
         })
 
     return faces
+
+
+_DETECTORS = {
+    "facemesh": detect_faces_mediapipe,
+    "blazeface": detect_faces_blazeface,
+}
+
+
+def detect_faces(image_bgr, backend: str | None = None, *, image_rgb=None, max_side=None):
+    """설정된 백엔드(FACE_DETECTOR_BACKEND)로 얼굴을 탐지한다. image_rgb가 있으면 변환 없이 사용"""
+    backend = backend or FACE_DETECTOR_BACKEND
+    fn = _DETECTORS.get(backend)
+    if fn is None:
+        raise ValueError(f"Unknown face detector backend: {backend}")
+    return fn(image_bgr, image_rgb=image_rgb, max_side=max_side)
@@ -0,0 +1,56 @@
+# 얼굴 탐지/랜드마크용 축소 프록시 이미지
+# 폰 업로드(4000x3000 등)를 그대로 FaceMesh에 넣어도 내부에서는 훨씬 작은 해상도로 처리하므로,
+# 탐지는 긴 변 DETECT_MAX_SIDE 이하로 줄인 프록시에서 하고 좌표만 원본 해상도로 되돌린다.
+# (원본 픽셀은 최종 프레이밍 warp에서만 읽는다)
+import os
+
+import cv2
+import numpy as np
+
+# 탐지 프록시의 긴 변 최대 길이(px). 0(기본)이면 원본 해상도로 탐지한다.
+# 1280 정도로 켜면 탐지가 빨라지지만 랜드마크가 축소 이미지 기준이 되므로 기본은 끔 (예전 동작 유지)
+DETECT_MAX_SIDE = int(os.environ.get("IDPHOTO_DETECT_MAX_SIDE", "0"))
+
+
+def make_detection_proxy(
+    image_bgr: np.ndarray,
+    image_rgb: np.ndarray | None = None,
+    max_side: int | None = None,
+) -> tuple[np.ndarray, float]:
+    """
+    탐지용 RGB 프록시를 만든다.
+    반환: (proxy_rgb, scale)  - scale = 프록시 픽셀 / 원본 픽셀 (축소 안 했으면 1.0)
+
+    정규화 좌표(FaceMesh 랜드마크)는 프록시와 원본에서 같으므로 그대로 쓰면 되고,
+    픽셀 좌표(BlazeFace bbox 등)는 scale로 나눠서 원본 좌표로 되돌린다.
+    """
+    max_side = DETECT_MAX_SIDE if max_side is None else int(max_side)
+    h, w = image_bgr.shape[:2]
+    long_side = max(h, w)
+
+    if max_side <= 0 or long_side <= max_side:
+        if image_rgb is None:
+            image_rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
+        return image_rgb, 1.0
+
+    scale = max_side / float(long_side)
+    size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+
+    # 이미 RGB가 있으면 그걸 줄이고, 없으면 BGR을 먼저 줄인 뒤 작은 이미지에서 색 변환
+    if image_rgb is not None:
+        proxy = cv2.resize(image_rgb, size, interpolation=cv2.INTER_AREA)
+    else:
+        proxy = cv2.cvtColor(cv2.resize(image_bgr, size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2RGB)
+
+    # 반올림으로 생긴 종횡비 차이까지 반영한 실제 배율 (x/y 평균)
+    scale = 0.5 * (size[0] / float(w) + size[1] / float(h))
+    return proxy, scale
+
+
+def bbox_to_full(bbox: tuple[int, int, int, int], scale: float) -> tuple[int, int, int, int]:
+    """프록시 픽셀 bbox (x, y, w, h) → 원본 픽셀 bbox"""
+    if scale == 1.0:
+        return tuple(int(v) for v in bbox)
+    x, y, w, h = bbox
+    inv = 1.0 / scale
+    return int(round(x * inv)), int(round(y * inv)), int(round(w * inv)), int(round(h * inv))
@@ -0,0 +1,66 @@
+# 업로드 단계에서 구한 FaceMesh 랜드마크를 job 폴더에 저장/재사용하는 모듈
+# create_job -> prepare_faces -> embedding 이 같은 사진에 FaceMesh를 세 번 돌리지 않도록 한다.
+#
+# 저장 형식 (data/jobs/<job_id>/landmarks/)
+#   - <upload_stem>.npy        : (478,3) float32, 원본 이미지 기준 정규화 좌표 (x, y in 0~1, z)
+#   - <idphoto_stem>.affine.npy: (2,3) float32, 정규화 원본 좌표 -> 프레이밍 결과(픽셀) 좌표 변환
+import os
+
+import numpy as np
+
+LANDMARKS_DIR = "landmarks"
+
+
+def landmarks_to_array(landmark_list) -> np.ndarray:
+    """MediaPipe NormalizedLandmarkList(.landmark) -> (N,3) float32"""
+    return np.array([(lm.x, lm.y, lm.z) for lm in landmark_list], dtype=np.float32)
+
+
+def _stem(filename: str) -> str:
+    return os.path.splitext(os.path.basename(filename))[0]
+
+
+def save_landmarks(job_path: str, filename: str, landmarks: np.ndarray) -> str:
+    """업로드 파일 1장의 대표 얼굴 랜드마크 저장. 반환: job 기준 상대경로"""
+    rel = os.path.join(LANDMARKS_DIR, f"{_stem(filename)}.npy")
+    abs_path = os.path.join(job_path, rel)
+    os.makedirs(os.path.dirname(abs_path), exist_ok=True)
+    np.save(abs_path, np.asarray(landmarks, dtype=np.float32))
+    return rel
+
+
+def load_landmarks(job_path: str, rel: str | None) -> np.ndarray | None:
+    if not rel:
+        return None
+    abs_path = os.path.join(job_path, rel)
+    if not os.path.exists(abs_path):
+        return None
+    return np.load(abs_path)
+
+
+def normalized_transform(M: np.ndarray, image_w: int, image_h: int) -> np.ndarray:
+    """
+    픽셀 좌표 기준 affine(2x3)을 정규화 좌표 입력용으로 바꾼다.
+    (x_norm, y_norm) -> (x_norm * w, y_norm * h) -> M
+    """
+    scale = np.diag([float(image_w), float(image_h), 1.0])
+    return (np.asarray(M, dtype=np.float64) @ scale).astype(np.float32)
+
+
+def save_framing_transform(job_path: str, face_name: str, M_norm: np.ndarray) -> str:
+    """프레이밍 결과 1장의 (정규화 원본 -> 프레이밍 픽셀) 변환 저장. 반환: 상대경로"""
+    rel = os.path.join(LANDMARKS_DIR, f"{_stem(face_name)}.affine.npy")
+    abs_path = os.path.join(job_path, rel)
+    os.makedirs(os.path.dirname(abs_path), exist_ok=True)
+    np.save(abs_path, np.asarray(M_norm, dtype=np.float32))
+    return rel
+
+
+def load_framing_transform(job_path: str, rel: str | None) -> np.ndarray | None:
+    return load_landmarks(job_path, rel)
+
+
+def project_points(M: np.ndarray, pts: np.ndarray) -> np.ndarray:
+    """(N,2) 점들에 2x3 affine 적용 -> (N,2) float32"""
+    pts = np.asarray(pts, dtype=np.float32)[:, :2]
+    return (pts @ M[:, :2].T + M[:, 2]).astype(np.float32)
@@ -0,0 +1,198 @@
+# 업로드 사진 1장에 대한 얼굴 품질 판정 규칙
+# create_job(단계별 실행)과 /run(스트리밍 실행)이 같은 규칙을 쓰도록 분리했다.
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
+
+from core.io.frame_cache import get_frame_cache
+from core.face.detect_proxy import DETECT_MAX_SIDE
+from core.face.dedupe import dhash, sharpness
+from core.face.landmarks_store import save_landmarks
+from core.face.visualize import save_face_preview
+
+# 품질 검사(디코딩 + 얼굴 탐지) 워커 수. 워커마다 FaceMesh/BlazeFace 인스턴스를 하나씩 가진다.
+QUALITY_CHECK_WORKERS = int(
+    os.environ.get("IDPHOTO_QUALITY_CHECK_WORKERS", str(min(4, os.cpu_count() or 1)))
+)
+
+# 품질 검사(create_job)는 얼굴 유무/개수만 보므로 긴 변이 이 크기 이상 남는 범위에서 JPEG를 축소해서 본다.
+# 프레임 캐시가 켜져 있으면 원본을 한 번 디코딩해 캐시에 두고(prepare_faces가 재사용) 거기서 줄이고,
+# 꺼져 있으면 JPEG 축소 디코딩을 쓴다. 기본값은 탐지 프록시 크기와 같게 둔다 (0이면 원본)
+QUALITY_DECODE_SIDE = int(os.environ.get("IDPHOTO_QUALITY_DECODE_SIDE", str(DETECT_MAX_SIDE)))
+
+# 1차: 기본 threshold (정상 사진에서 오탐 억제)
+SCORE_THRESHOLD = 0.6
+# 2차(fallback): 0개면 너무 보수적일 수 있으니 threshold를 낮춰 다시 시도
+FALLBACK_SCORE_THRESHOLD = 0.3
+
+
+def select_faces(faces_raw: list[dict]) -> tuple[list[dict], dict | None]:
+    """
+    탐지 결과에서 score 기준으로 얼굴을 고르고 대표 얼굴 1개를 선택한다.
+    반환: (faces, main_face)
+    """
+    faces = [f for f in faces_raw if f.get("score", 0.0) >= SCORE_THRESHOLD]
+
+    if len(faces) == 0 and len(faces_raw) > 0:
+        faces = [f for f in faces_raw if f.get("score", 0.0) >= FALLBACK_SCORE_THRESHOLD]
+
+    # 대표 얼굴 1개 선택: 일단 가장 큰 박스를 대표로(간단 버전)
+    main_face = None
+    if faces:
+        main_face = max(
+            faces,
+            key=lambda f: (f["bbox"][2] * f["bbox"][3]) * f.get("score", 1.0)
+        )
+
+    return faces, main_face
+
+
+def reject_reason(face_count: int) -> str | None:
+    """통과면 None, 거부면 사유 문자열"""
+    # 얼굴이 0개면 거부
+    if face_count == 0:
+        return "No face detected"
+    # 얼굴이 2개 이상이면 거부 (새 규칙)
+    if face_count >= 2:
+        return "Multiple faces detected"
+    # 얼굴이 정확히 1개면 통과
+    return None
+
+
+def check_upload(
+    job_path: str,
+    filename: str,
+    detect_fn,
+    *,
+    write_preview: bool = True,
+    decode_side: int | None = None,
+) -> tuple[dict, dict | None, object | None]:
+    """
+    업로드 1장 품질 검사.
+    반환: (report 항목, 대표 얼굴 dict 또는 None, 디코딩된 이미지(read-only) 또는 None)
+      - report 항목에 "reason"이 있으면 거부, 없으면 통과
+    decode_side: 주면 긴 변이 이 값 이상 남는 범위에서 축소한 이미지로 검사한다.
+      (이때 돌려주는 이미지 / preview도 축소 해상도. 랜드마크는 정규화 좌표라 영향 없음)
+    """
+    work_dir = os.path.join(job_path, "work")
+
+    # 저장된 이미지 파일을 읽어서, 메모리 안에 “이미지 배열”로 만든다
+    # (프레임 캐시에 두어 prepare_faces 등 다음 단계가 다시 디코딩하지 않게 한다)
+    # 원본 해상도로 탐지할 때만 RGB도 같이 캐시한다. 축소 프록시 탐지면 작은 이미지에서 변환하는 게 싸다.
+    upload_rel = os.path.join("uploads", filename)
+    if DETECT_MAX_SIDE > 0:
+        image, image_rgb = get_frame_cache().get_bgr(job_path, upload_rel, target_side=decode_side), None
+    else:
+        image, image_rgb = get_frame_cache().get_rgb(job_path, upload_rel, target_side=decode_side)
+
+    preview_name = f"preview__{filename}" if write_preview else None
+
+    if image is None:
+        return {
+            "filename": filename,
+            "reason": "Failed to read image",
+            "preview": None
+        }, None, None
+
+    #(얼굴 탐지 모델)를 이용해 얼굴을 탐지한다.
+    faces, main_face = select_faces(detect_fn(image, image_rgb=image_rgb))
+    face_count = len(faces)
+
+    # preview 저장
+    if write_preview:
+        save_face_preview(
+            image,
+            faces,
+            main_face["bbox"] if main_face is not None else None,
+            save_dir=work_dir,
+            filename=filename,
+        )
+
+    reason = reject_reason(face_count)
+    if reason is not None:
+        return {
+            "filename": filename,
+            "reason": reason,
+            "faces_detected": face_count,
+            "preview": preview_name
+        }, None, image
+
+    # 얼굴이 정확히 1개면 통과
+    passed_item = {
+        "filename": filename,
+        "faces_detected": face_count,
+        "preview": preview_name,
+        # 중복 업로드 묶기용 (core/face/dedupe.py)
+        "dhash": dhash(image),
+        "sharpness": round(sharpness(image), 2),
+    }
+
+    # 랜드마크를 저장해두면 prepare_faces / embedding에서 FaceMesh를 다시 돌리지 않는다
+    if main_face.get("landmarks") is not None:
+        passed_item["landmarks"] = save_landmarks(job_path, filename, main_face["landmarks"])
+
+    return passed_item, main_face, image
+
+
+_check_pool: ThreadPoolExecutor | None = None
+_check_pool_lock = threading.Lock()
+
+
+def _get_check_pool() -> ThreadPoolExecutor:
+    """
+    품질 검사 전용 스레드 풀. 프로세스 전역으로 유지해서
+    워커 스레드별 FaceMesh 인스턴스(detect_mp의 thread-local)를 job 간에 재사용한다.
+    """
+    global _check_pool
+    if _check_pool is None:
+        with _check_pool_lock:
+            if _check_pool is None:
+                _check_pool = ThreadPoolExecutor(
+                    max_workers=max(1, QUALITY_CHECK_WORKERS),
+                    thread_name_prefix="quality-check",
+                )
+    return _check_pool
+
+
+def iter_check_uploads(
+    job_path: str,
+    filenames: list[str],
+    detect_fn,
+    *,
+    write_preview: bool = True,
+    keep_image: bool = False,
+    decode_side: int | None = None,
+) -> Iterator[tuple[dict, dict | None, object | None]]:
+    """
+    check_upload를 워커 풀에서 병렬로 돌리되, 결과는 filenames 순서 그대로 내보낸다.
+    (report의 passed / rejected 순서가 항상 같도록)
+
+    한꺼번에 모든 사진을 디코딩해 메모리에 올리지 않도록
+    워커 수의 2배까지만 미리 제출한다.
+    keep_image=False면 디코딩된 이미지는 버리고 None을 돌려준다.
+    """
+    pool = _get_check_pool()
+    window = max(1, QUALITY_CHECK_WORKERS) * 2
+
+    def _one(filename: str):
+        entry, main_face, image = check_upload(
+            job_path, filename, detect_fn, write_preview=write_preview, decode_side=decode_side
+        )
+        return entry, main_face, (image if keep_image else None)
+
+    pending: deque = deque()
+    names = iter(filenames)
+    try:
+        for filename in names:
+            pending.append(pool.submit(_one, filename))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # 소비자가 중간에 멈추면(취소 등) 아직 시작 안 한 작업은 버린다
+        for fut in pending:
+            fut.cancel()
@@ -0,0 +1,72 @@
+# 이미지 디코딩 레이어
+# 얼굴 유무/개수만 보면 되는 단계(품질 검사 등)는 12MP 원본을 전부 디코딩할 필요가 없다.
+# JPEG는 DCT 단계에서 1/2, 1/4, 1/8로 줄여서 디코딩할 수 있으므로(IMREAD_REDUCED_COLOR_*),
+# 파일 헤더의 크기와 단계가 필요한 해상도(target_side)를 보고 가장 작은 배율을 고른다.
+# JPEG가 아니면(PNG/WEBP 등) 그냥 원본 디코딩한다.
+import os
+
+import cv2
+import numpy as np
+
+# 배율 → imread 플래그 (큰 배율부터 시도)
+_REDUCED_FLAGS = {
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+}
+
+_JPEG_EXTENSIONS = {".jpg", ".jpeg"}
+
+
+def read_image_size(path: str) -> tuple[int, int] | None:
+    """
+    픽셀 데이터는 읽지 않고 헤더만 보고 (width, height)를 반환한다. 실패하면 None
+    (PIL은 open 시점에 헤더만 파싱한다)
+    """
+    from PIL import Image
+
+    try:
+        with Image.open(path) as im:
+            return im.size
+    except Exception:
+        return None
+
+
+def pick_reduction(width: int, height: int, target_side: int) -> int:
+    """
+    긴 변이 target_side 이상으로 남는 가장 큰 축소 배율(1/2/4/8)을 고른다.
+    (필요한 해상도보다 작게 디코딩하지 않는다)
+    """
+    if target_side <= 0:
+        return 1
+    long_side = max(width, height)
+    for factor in sorted(_REDUCED_FLAGS, reverse=True):
+        if long_side / factor >= target_side:
+            return factor
+    return 1
+
+
+def is_reducible(path: str) -> bool:
+    """축소 디코딩이 되는 포맷(JPEG)인지"""
+    return os.path.splitext(path)[1].lower() in _JPEG_EXTENSIONS
+
+
+def decode_image(path: str, *, target_side: int | None = None) -> tuple[np.ndarray | None, int]:
+    """
+    BGR 이미지를 디코딩한다.
+    target_side: 단계가 실제로 쓰는 긴 변 크기(px). None/0이면 원본 해상도.
+    반환: (image 또는 None, 적용된 축소 배율)
+      - 배율이 1보다 크면 image 좌표 * 배율 = 원본 좌표
+    """
+    factor = 1
+    if target_side and is_reducible(path):
+        size = read_image_size(path)
+        if size is not None:
+            factor = pick_reduction(size[0], size[1], int(target_side))
+
+    if factor > 1:
+        image = cv2.imread(path, _REDUCED_FLAGS[factor])
+        if image is not None:
+            return image, factor
+
+    return cv2.imread(path), 1
@@ -0,0 +1,301 @@
+# 디코딩된 이미지 프레임 캐시 (job 단계 간 공유)
+# create_job → prepare_faces → background → embedding을 연달아 돌릴 때
+# 같은 파일을 단계마다 cv2.imread / cvtColor(BGR2RGB) 하지 않도록
+# (job_path, 상대경로, 디코딩 해상도) 단위로 BGR 배열(+ 요청 시 RGB 배열)을 메모리에 들고 있는다.
+#
+# - 전체 크기(byte) 예산을 넘으면 가장 오래 안 쓴 프레임부터 버린다(LRU)
+# - 파일의 (mtime, size)를 같이 저장해서 디스크 파일이 바뀌면 캐시 항목을 무시한다
+# - 캐시된 배열은 여러 스레드가 같이 보므로 read-only로 만들어 둔다 (수정하려면 copy)
+# - 축소 해상도 요청(품질 검사)도 원본 프레임을 한 번 디코딩해 캐시에 두고 거기서 줄인다.
+#   그래서 다음 단계(prepare_faces)가 원본 해상도로 요청하면 다시 디코딩하지 않는다.
+import os
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from core.io.decode import decode_image, is_reducible, pick_reduction
+
+# 캐시 예산 (MB). 12MP BGR 1장 ≈ 36MB. 0이면 캐시를 쓰지 않는다.
+FRAME_CACHE_BUDGET_MB = int(os.environ.get("IDPHOTO_FRAME_CACHE_MB", "1024"))
+
+# put()으로 넣을 수 있는 무손실 포맷 (디스크에서 다시 디코딩해도 같은 픽셀)
+_LOSSLESS_EXTS = (".png", ".bmp", ".tif", ".tiff")
+
+
+def _file_signature(path: str) -> tuple[int, int] | None:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _readonly(arr: np.ndarray) -> np.ndarray:
+    arr.setflags(write=False)
+    return arr
+
+
+class _Frame:
+    __slots__ = ("bgr", "rgb", "signature")
+
+    def __init__(self, bgr: np.ndarray, signature: tuple[int, int] | None):
+        self.bgr = bgr
+        self.rgb: np.ndarray | None = None
+        self.signature = signature
+
+    @property
+    def nbytes(self) -> int:
+        return self.bgr.nbytes + (self.rgb.nbytes if self.rgb is not None else 0)
+
+
+class FrameCache:
+    """
+    byte 예산 기반 LRU 프레임 캐시.
+
+    get_bgr(job_path, rel)  : 캐시에 있으면 그대로, 없으면 디코딩 후 저장
+    get_rgb(job_path, rel)  : BGR 옆에 RGB 배열도 같이 저장해두고 반환 (MediaPipe 입력용)
+    peek_bgr(job_path, rel) : 원본 프레임이 캐시에 있을 때만 반환 (디코딩하지 않음, 워커 프로세스에 넘길 때)
+    put(job_path, rel, bgr) : 단계가 방금 무손실로 저장한 결과를 다음 단계용으로 넣어둔다
+    target_side를 주면 원본 프레임에서 축소 디코딩(core.io.decode)과 같은 크기로 줄인 프레임을 별도 항목으로 캐시한다.
+    """
+
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = int(budget_bytes)
+        self._frames: "OrderedDict[tuple[str, str, int], _Frame]" = OrderedDict()
+        self._resident = 0
+        self._lock = threading.Lock()
+        # 같은 파일을 여러 스레드가 동시에 디코딩하지 않도록 key별 잠금
+        self._key_locks: dict[tuple[str, str, int], threading.Lock] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.rgb_hits = 0
+        self.rgb_misses = 0
+        self.evictions = 0
+        self.stale = 0
+        self.derived = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget_bytes > 0
+
+    @staticmethod
+    def _key(job_path: str, rel: str, target_side: int | None = None) -> tuple[str, str, int]:
+        return os.path.abspath(job_path), os.path.normpath(rel), int(target_side or 0)
+
+    def _key_lock(self, key: tuple[str, str, int]) -> threading.Lock:
+        with self._lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = threading.Lock()
+                self._key_locks[key] = lock
+            return lock
+
+    def _lookup(self, key: tuple[str, str, int], signature) -> _Frame | None:
+        """(self._lock 안에서 호출) 유효한 항목이면 LRU 갱신 후 반환"""
+        frame = self._frames.get(key)
+        if frame is None:
+            return None
+        if frame.signature != signature:
+            # 디스크 파일이 다시 쓰였음 → 옛 프레임 폐기
+            self._drop(key)
+            self.stale += 1
+            return None
+        self._frames.move_to_end(key)
+        return frame
+
+    def _drop(self, key: tuple[str, str, int]) -> None:
+        frame = self._frames.pop(key, None)
+        if frame is not None:
+            self._resident -= frame.nbytes
+        self._key_locks.pop(key, None)
+
+    def _evict_over_budget(self) -> None:
+        while self._resident > self.budget_bytes and self._frames:
+            key, frame = self._frames.popitem(last=False)
+            self._resident -= frame.nbytes
+            self._key_locks.pop(key, None)
+            self.evictions += 1
+
+    def _store(self, key: tuple[str, str, int], frame: _Frame) -> None:
+        if frame.nbytes > self.budget_bytes:
+            return  # 예산보다 큰 프레임은 캐시하지 않는다
+        self._drop(key)
+        self._frames[key] = frame
+        self._resident += frame.nbytes
+        self._evict_over_budget()
+
+    def _get_frame(self, job_path: str, rel: str, target_side: int | None = None) -> _Frame | None:
+        path = os.path.join(job_path, rel)
+
+        if not self.enabled:
+            img, _ = decode_image(path, target_side=target_side)
+            return _Frame(img, None) if img is not None else None
+
+        key = self._key(job_path, rel, target_side)
+        signature = _file_signature(path)
+
+        if target_side:
+            return self._get_reduced(job_path, rel, key, signature, int(target_side))
+
+        with self._lock:
+            frame = self._lookup(key, signature)
+            if frame is not None:
+                self.hits += 1
+                return frame
+
+        with self._key_lock(key):
+            # 기다리는 동안 다른 스레드가 디코딩했을 수 있다
+            with self._lock:
+                frame = self._lookup(key, signature)
+                if frame is not None:
+                    self.hits += 1
+                    return frame
+                self.misses += 1
+
+            img, _ = decode_image(path, target_side=target_side)
+            if img is None:
+                return None
+            frame = _Frame(_readonly(img), signature)
+
+            with self._lock:
+                self._store(key, frame)
+        return frame
+
+    def _get_reduced(self, job_path: str, rel: str, key, signature, target_side: int) -> _Frame | None:
+        """원본 프레임(캐시 또는 디코딩)을 decode_image의 축소 배율과 같은 크기로 줄인다"""
+        with self._lock:
+            frame = self._lookup(key, signature)
+            if frame is not None:
+                self.hits += 1
+                return frame
+
+        full = self._get_frame(job_path, rel)
+        if full is None:
+            return None
+        h, w = full.bgr.shape[:2]
+        factor = pick_reduction(w, h, target_side) if is_reducible(rel) else 1
+        if factor == 1:
+            return full
+
+        with self._key_lock(key):
+            with self._lock:
+                frame = self._lookup(key, signature)
+                if frame is not None:
+                    return frame
+            # libjpeg 축소 디코딩과 같은 크기 (올림)
+            size = (-(-w // factor), -(-h // factor))
+            frame = _Frame(_readonly(cv2.resize(full.bgr, size, interpolation=cv2.INTER_AREA)), full.signature)
+            with self._lock:
+                self.derived += 1
+                self._store(key, frame)
+        return frame
+
+    def peek_bgr(self, job_path: str, rel: str) -> np.ndarray | None:
+        """원본 해상도 프레임이 캐시에 있으면 반환, 없으면 None (디코딩하지 않는다)"""
+        if not self.enabled:
+            return None
+        key = self._key(job_path, rel)
+        signature = _file_signature(os.path.join(job_path, rel))
+        with self._lock:
+            frame = self._lookup(key, signature)
+            if frame is None:
+                return None
+            self.hits += 1
+            return frame.bgr
+
+    def get_bgr(self, job_path: str, rel: str, *, target_side: int | None = None) -> np.ndarray | None:
+        """
+        디코딩된 BGR 배열 (read-only). 파일을 못 읽으면 None
+        target_side: 긴 변이 이 값 이상 남는 범위에서 JPEG 축소 디코딩 (None이면 원본)
+        """
+        frame = self._get_frame(job_path, rel, target_side)
+        return frame.bgr if frame is not None else None
+
+    def get_rgb(
+        self,
+        job_path: str,
+        rel: str,
+        *,
+        target_side: int | None = None,
+    ) -> tuple[np.ndarray | None, np.ndarray | None]:
+        """(bgr, rgb) 둘 다 반환. RGB 변환 결과도 캐시에 같이 둔다."""
+        frame = self._get_frame(job_path, rel, target_side)
+        if frame is None:
+            return None, None
+
+        rgb = frame.rgb
+        if rgb is not None:
+            with self._lock:
+                self.rgb_hits += 1
+            return frame.bgr, rgb
+
+        rgb = _readonly(cv2.cvtColor(frame.bgr, cv2.COLOR_BGR2RGB))
+        if not self.enabled:
+            return frame.bgr, rgb
+
+        key = self._key(job_path, rel, target_side)
+        with self._lock:
+            self.rgb_misses += 1
+            if self._frames.get(key) is frame and frame.rgb is None:
+                frame.rgb = rgb
+                self._resident += rgb.nbytes
+                self._evict_over_budget()
+        return frame.bgr, rgb
+
+    def put(self, job_path: str, rel: str, bgr: np.ndarray) -> None:
+        """
+        단계가 디스크에 쓴 결과 이미지를 캐시에 넣는다. (반드시 cv2.imwrite 이후에 호출)
+        JPEG / WEBP처럼 손실 포맷이면 넣지 않는다: 인코딩 전 픽셀은 디스크 파일을 디코딩한 결과와 달라서
+        다음 단계 결과가 캐시 상태에 따라 바뀌고, 파일 해시 기반 fingerprint / 결과 캐시 key와도 어긋난다.
+        """
+        if not self.enabled or bgr is None:
+            return
+        if os.path.splitext(rel)[1].lower() not in _LOSSLESS_EXTS:
+            return
+        signature = _file_signature(os.path.join(job_path, rel))
+        if signature is None:
+            return
+        frame = _Frame(_readonly(bgr.copy() if bgr.flags.writeable else bgr), signature)
+        with self._lock:
+            self._store(self._key(job_path, rel), frame)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._frames.clear()
+            self._key_locks.clear()
+            self._resident = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "budget_bytes": self.budget_bytes,
+                "resident_bytes": self._resident,
+                "entries": len(self._frames),
+                "rgb_entries": sum(1 for f in self._frames.values() if f.rgb is not None),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+                "rgb_hits": self.rgb_hits,
+                "rgb_misses": self.rgb_misses,
+                "evictions": self.evictions,
+                "stale": self.stale,
+                "derived": self.derived,
+            }
+
+
+_cache: FrameCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_frame_cache() -> FrameCache:
+    """프로세스 전역 프레임 캐시"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = FrameCache(FRAME_CACHE_BUDGET_MB * 1024 * 1024)
+    return _cache
@@ -0,0 +1,232 @@
+# job 간에 공유하는 단계 결과 캐시 (content-addressed, 디스크)
+# gate에서 떨어진 뒤 같은 사진을 새 job으로 다시 올리면 프레이밍 / 매팅 / 임베딩을 처음부터 다시 돌리게 된다.
+# 입력 내용 해시 + 단계 파라미터(결과 크기, 눈 위치 비율, 가중치 파일 등)로 key를 만들고
+# 결과 파일(랜드마크, 프레이밍 결과, alpha, 임베딩)을 data/cache/<stage>/<key 앞 2자리>/<key>/ 에 저장한다.
+#
+# - 항목은 임시 폴더에 다 쓴 뒤 rename 하므로 반쯤 쓰인 항목은 보이지 않는다
+# - 전체 크기가 예산을 넘으면 가장 오래 안 쓴 항목부터 지운다 (hit 때 폴더 mtime 갱신, LRU)
+# - 단계별 hit / miss 통계
+import io
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+
+import numpy as np
+
+# 캐시 위치 / 예산 (MB). 0이면 캐시를 쓰지 않는다.
+RESULT_CACHE_DIR = os.environ.get("IDPHOTO_RESULT_CACHE_DIR", os.path.join("data", "cache"))
+RESULT_CACHE_BUDGET_MB = int(os.environ.get("IDPHOTO_RESULT_CACHE_MB", "2048"))
+
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def sha256_file(path: str) -> str | None:
+    h = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+    except OSError:
+        return None
+    return h.hexdigest()
+
+
+def cache_key(content_hash: str, params: dict) -> str:
+    """입력 내용 해시 + 단계 파라미터 → key (파라미터 순서와 무관)"""
+    payload = json.dumps({"input": content_hash, "params": params}, sort_keys=True, default=str)
+    return sha256_bytes(payload.encode("utf-8"))
+
+
+def array_to_bytes(arr: np.ndarray) -> bytes:
+    buf = io.BytesIO()
+    np.save(buf, np.asarray(arr), allow_pickle=False)
+    return buf.getvalue()
+
+
+def bytes_to_array(data: bytes) -> np.ndarray:
+    return np.load(io.BytesIO(data), allow_pickle=False)
+
+
+class ResultCache:
+    """
+    단계 결과 파일 캐시.
+
+    get(stage, key)          : {파일명: bytes} 또는 None
+    put(stage, key, files)   : {파일명: bytes} 저장 (이미 있으면 그대로 둔다)
+    stats()                  : 단계별 hit / miss / 항목 수, 전체 크기
+    """
+
+    def __init__(self, root: str, budget_bytes: int):
+        self.root = root
+        self.budget_bytes = int(budget_bytes)
+        self._lock = threading.Lock()
+        # key 경로 → (마지막 사용 시각, 크기). 처음 쓸 때 디스크를 한 번 훑어서 만든다
+        self._index: dict[str, tuple[float, int]] | None = None
+        self._resident = 0
+
+        self.hits: dict[str, int] = {}
+        self.misses: dict[str, int] = {}
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget_bytes > 0
+
+    def _entry_dir(self, stage: str, key: str) -> str:
+        return os.path.join(self.root, stage, key[:2], key)
+
+    @staticmethod
+    def _dir_size(path: str) -> int:
+        total = 0
+        for name in os.listdir(path):
+            try:
+                total += os.path.getsize(os.path.join(path, name))
+            except OSError:
+                pass
+        return total
+
+    def _load_index(self) -> dict[str, tuple[float, int]]:
+        """(lock 안에서 호출) 디스크의 기존 항목 목록"""
+        if self._index is None:
+            self._index = {}
+            self._resident = 0
+            if os.path.isdir(self.root):
+                for stage in os.listdir(self.root):
+                    stage_dir = os.path.join(self.root, stage)
+                    if not os.path.isdir(stage_dir):
+                        continue
+                    for prefix in os.listdir(stage_dir):
+                        prefix_dir = os.path.join(stage_dir, prefix)
+                        if not os.path.isdir(prefix_dir):
+                            continue
+                        for key in os.listdir(prefix_dir):
+                            path = os.path.join(prefix_dir, key)
+                            if key.startswith(".") or not os.path.isdir(path):
+                                continue
+                            size = self._dir_size(path)
+                            self._index[path] = (os.path.getmtime(path), size)
+                            self._resident += size
+        return self._index
+
+    def get(self, stage: str, key: str) -> dict[str, bytes] | None:
+        if not self.enabled:
+            return None
+
+        path = self._entry_dir(stage, key)
+        files = None
+        if os.path.isdir(path):
+            try:
+                files = {}
+                for name in os.listdir(path):
+                    with open(os.path.join(path, name), "rb") as f:
+                        files[name] = f.read()
+                now = time.time()
+                os.utime(path, (now, now))
+            except OSError:
+                # 다른 스레드가 막 지운 항목
+                files = None
+
+        with self._lock:
+            index = self._load_index()
+            if files is None:
+                self.misses[stage] = self.misses.get(stage, 0) + 1
+                return None
+            self.hits[stage] = self.hits.get(stage, 0) + 1
+            if path in index:
+                index[path] = (time.time(), index[path][1])
+        return files
+
+    def put(self, stage: str, key: str, files: dict[str, bytes]) -> None:
+        if not self.enabled:
+            return
+
+        path = self._entry_dir(stage, key)
+        if os.path.isdir(path):
+            return
+
+        parent = os.path.dirname(path)
+        os.makedirs(parent, exist_ok=True)
+        tmp = os.path.join(parent, f".{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+        os.makedirs(tmp, exist_ok=True)
+        for name, data in files.items():
+            with open(os.path.join(tmp, name), "wb") as f:
+                f.write(data)
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            # 같은 항목을 다른 곳에서 먼저 저장했다
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+
+        size = sum(len(d) for d in files.values())
+        with self._lock:
+            index = self._load_index()
+            if path not in index:
+                index[path] = (time.time(), size)
+                self._resident += size
+            self._evict_over_budget()
+
+    def _evict_over_budget(self) -> None:
+        """(lock 안에서 호출) 예산을 넘으면 오래 안 쓴 항목부터 삭제"""
+        index = self._index
+        if self._resident <= self.budget_bytes:
+            return
+        for path, (_, size) in sorted(index.items(), key=lambda kv: kv[1][0]):
+            if self._resident <= self.budget_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            del index[path]
+            self._resident -= size
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            shutil.rmtree(self.root, ignore_errors=True)
+            self._index = None
+            self._resident = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            index = self._load_index()
+            stages = sorted(set(self.hits) | set(self.misses))
+            per_stage = {}
+            for stage in stages:
+                hits = self.hits.get(stage, 0)
+                lookups = hits + self.misses.get(stage, 0)
+                per_stage[stage] = {
+                    "hits": hits,
+                    "misses": self.misses.get(stage, 0),
+                    "hit_ratio": (hits / lookups) if lookups else 0.0,
+                }
+            total_hits = sum(self.hits.values())
+            total_lookups = total_hits + sum(self.misses.values())
+            return {
+                "root": self.root,
+                "budget_bytes": self.budget_bytes,
+                "resident_bytes": self._resident,
+                "entries": len(index),
+                "hits": total_hits,
+                "misses": total_lookups - total_hits,
+                "hit_ratio": (total_hits / total_lookups) if total_lookups else 0.0,
+                "evictions": self.evictions,
+                "stages": per_stage,
+            }
+
+
+_cache: ResultCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """프로세스 전역 단계 결과 캐시"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache(RESULT_CACHE_DIR, RESULT_CACHE_BUDGET_MB * 1024 * 1024)
+    return _cache
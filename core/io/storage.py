@@ -83,3 +83,143 @@ def save_upload_file(upload_file, save_dir: str) -> str:
         shutil.copyfileobj(upload_file.file, buffer)
 
     return filename
+
+
+# 업로드 크기 제한 (MB). 파일 1개 / job 1개(요청 전체) 기준
+MAX_UPLOAD_FILE_BYTES = int(os.environ.get("IDPHOTO_MAX_UPLOAD_FILE_MB", "25")) * 1024 * 1024
+MAX_UPLOAD_JOB_BYTES = int(os.environ.get("IDPHOTO_MAX_UPLOAD_JOB_MB", "400")) * 1024 * 1024
+
+# 업로드를 읽어서 쓰는 단위
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+# 요청 본문 상한 = job 제한 + multipart 헤더 / boundary 여유분
+MAX_REQUEST_BODY_BYTES = MAX_UPLOAD_JOB_BYTES + 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    """업로드가 파일 / job 크기 제한을 넘었을 때. scope는 "file" 또는 "job" """
+
+    def __init__(self, scope: str, limit_bytes: int):
+        super().__init__(f"Upload exceeds {scope} limit ({limit_bytes // (1024 * 1024)} MB)")
+        self.scope = scope
+        self.limit_bytes = limit_bytes
+
+
+def _write_chunk(fp, hasher, chunk: bytes) -> None:
+    hasher.update(chunk)
+    fp.write(chunk)
+
+
+def _discard_file(fp, tmp_path: str) -> None:
+    fp.close()
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+
+def _finish_file(fp) -> None:
+    # rename 전에 내용이 디스크에 있도록
+    fp.flush()
+    os.fsync(fp.fileno())
+    fp.close()
+
+
+async def save_upload_file_async(
+    upload_file,
+    save_dir: str,
+    *,
+    max_bytes: int = MAX_UPLOAD_FILE_BYTES,
+    remaining_job_bytes: int | None = None,
+) -> tuple[str, str, int]:
+    """
+    UploadFile을 청크 단위로 읽어서 디스크에 저장한다. (이벤트 루프를 막지 않도록 쓰기/해시는 threadpool)
+
+    - 읽는 동안 SHA-256을 같이 계산한다
+    - max_bytes(파일) / remaining_job_bytes(job에 남은 용량)를 넘으면 UploadTooLarge
+    - 임시 파일(.part)에 쓴 뒤 다 받으면 os.replace로 원자적으로 이름을 바꾼다
+      (중간에 실패하면 임시 파일은 지운다 → uploads/에는 완성된 파일만 남는다)
+
+    반환: (저장된 파일명, sha256 hex, 바이트 수)
+    """
+    import hashlib
+    from starlette.concurrency import run_in_threadpool
+
+    await run_in_threadpool(os.makedirs, save_dir, exist_ok=True)
+
+    filename = safe_filename(upload_file.filename)
+    save_path = os.path.join(save_dir, filename)
+    tmp_path = os.path.join(save_dir, f".{filename}.part")
+
+    hasher = hashlib.sha256()
+    size = 0
+
+    fp = await run_in_threadpool(open, tmp_path, "wb")
+    try:
+        while True:
+            chunk = await upload_file.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge("file", max_bytes)
+            if remaining_job_bytes is not None and size > remaining_job_bytes:
+                raise UploadTooLarge("job", MAX_UPLOAD_JOB_BYTES)
+
+            await run_in_threadpool(_write_chunk, fp, hasher, chunk)
+
+        await run_in_threadpool(_finish_file, fp)
+        await run_in_threadpool(os.replace, tmp_path, save_path)
+    except BaseException:
+        await run_in_threadpool(_discard_file, fp, tmp_path)
+        raise
+
+    return filename, hasher.hexdigest(), size
+
+
+class UploadSizeLimitMiddleware:
+    """
+    요청 본문 크기 제한 (ASGI 미들웨어, app/main.py에서 등록).
+
+    Starlette는 핸들러가 실행되기 전에 multipart 본문 전체를 임시 파일로 받아두므로
+    save_upload_file_async의 파일 / job 제한만으로는 큰 요청이 디스크를 채우는 것을 막지 못한다.
+    - Content-Length가 max_bytes를 넘으면 본문을 읽지 않고 바로 413
+    - Content-Length가 없거나 틀려도(chunked) 받은 바이트를 세다가 넘으면 413
+    """
+
+    def __init__(self, app, max_bytes: int = MAX_REQUEST_BODY_BYTES):
+        self.app = app
+        self.max_bytes = int(max_bytes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.max_bytes <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        from fastapi import HTTPException
+        from starlette.responses import JSONResponse
+
+        detail = f"Request body exceeds limit ({self.max_bytes // (1024 * 1024)} MB)"
+        for name, value in scope.get("headers", []):
+            if name == b"content-length":
+                try:
+                    too_large = int(value) > self.max_bytes
+                except ValueError:
+                    too_large = False
+                if too_large:
+                    await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+                    return
+                break
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # 폼 파싱 중에 올라가면 FastAPI가 그대로 413 응답으로 바꾼다
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -4,9 +4,49 @@ BREF = os.path.join(ROOT, "third_party", "BiRefNet")
 if BREF not in sys.path:
     sys.path.insert(0, BREF)
 
+import threading
+
 import numpy as np
 import cv2
 
+from core.pipeline.compositing import composite_white
+
+# 배치 추론 설정
+# - MATTING_MAX_BATCH: 한 번의 forward에 넣을 최대 장수
+# - MATTING_BYTES_PER_PIXEL: 입력 픽셀당 추론 메모리 추정치 (auto batch 계산용)
+# - MATTING_MEMORY_FRACTION: auto batch 계산 시 사용할 여유 메모리 비율
+MATTING_MAX_BATCH = int(os.environ.get("IDPHOTO_MATTING_MAX_BATCH", "8"))
+MATTING_BYTES_PER_PIXEL = int(os.environ.get("IDPHOTO_MATTING_BYTES_PER_PIXEL", "4096"))
+MATTING_MEMORY_FRACTION = float(os.environ.get("IDPHOTO_MATTING_MEMORY_FRACTION", "0.5"))
+
+# 매팅 엔진 선택
+# - MATTING_ENGINE: "torch" (PyTorch eager) | "onnx" (ONNX Runtime CPU, 가중치 옆에 export 캐시)
+# - MATTING_CHANNELS_LAST / MATTING_DTYPE: torch 엔진 CPU 옵션 (channels_last 메모리 배치, bf16 autocast)
+# - MATTING_ONNX_THREADS: ONNX Runtime intra-op 스레드 수 (0이면 기본값)
+# - MATTING_ONNX_OPSET: export opset
+MATTING_ENGINES = ("torch", "onnx")
+MATTING_ENGINE = os.environ.get("IDPHOTO_MATTING_ENGINE", "torch")
+MATTING_CHANNELS_LAST = os.environ.get("IDPHOTO_MATTING_CHANNELS_LAST", "0") == "1"
+MATTING_DTYPE = os.environ.get("IDPHOTO_MATTING_DTYPE", "fp32")
+MATTING_ONNX_THREADS = int(os.environ.get("IDPHOTO_MATTING_ONNX_THREADS", "0"))
+MATTING_ONNX_OPSET = int(os.environ.get("IDPHOTO_MATTING_ONNX_OPSET", "17"))
+
+_MATTING_DTYPES = ("fp32", "bf16")
+
+# 매팅 해상도 단계 (속도/품질 조절)
+# 내부 추론 해상도 = 원본 x scale. scale < 1 이면 작게 추론한 alpha를
+# 원본 BGR을 guide로 하는 guided filter로 원래 해상도까지 올린다.
+MATTING_TIERS = {
+    "full": 1.0,    # 640x800 (기존과 동일)
+    "medium": 0.75,  # 480x600
+    "low": 0.5,     # 320x400
+}
+MATTING_TIER = os.environ.get("IDPHOTO_MATTING_TIER", "full")
+
+# guided upsampling 파라미터 (반지름은 원본 해상도 px 기준)
+GUIDED_RADIUS = int(os.environ.get("IDPHOTO_MATTING_GUIDED_RADIUS", "8"))
+GUIDED_EPS = float(os.environ.get("IDPHOTO_MATTING_GUIDED_EPS", "1e-4"))
+
 
 # ------------------------------------------------------------
 # Padding Helpers
@@ -37,77 +77,261 @@ def _crop_back(arr: np.ndarray, orig_hw: tuple[int, int]) -> np.ndarray:
     return arr[:oh, :ow]
 
 
-# ------------------------------------------------------------
-# Alpha Blending
-# ------------------------------------------------------------
+def _batch_target_hw(bgrs: list[np.ndarray], min_hw: tuple[int, int] = (800, 640)) -> tuple[int, int]:
+    """배치 공통 패딩 크기: 최소 min_hw (기본 800x640), 32 배수로 올림"""
+    max_h = max(min_hw[0], max(b.shape[0] for b in bgrs))
+    max_w = max(min_hw[1], max(b.shape[1] for b in bgrs))
+    return -(-max_h // 32) * 32, -(-max_w // 32) * 32
+
+
+def tier_scale(tier: str | None) -> float:
+    """해상도 단계 이름 → 축소 배율. 잘못된 이름이면 ValueError"""
+    tier = tier or MATTING_TIER
+    if tier not in MATTING_TIERS:
+        raise ValueError(f"Unknown matting tier: {tier} (choose from {', '.join(MATTING_TIERS)})")
+    return MATTING_TIERS[tier]
+
 
-def _alpha_blend_white(bgr: np.ndarray, alpha: np.ndarray) -> np.ndarray:
+def tier_min_hw(tier: str | None) -> tuple[int, int]:
+    """해상도 단계의 최소 패딩 크기 (800x640 x scale)"""
+    scale = tier_scale(tier)
+    return int(round(800 * scale)), int(round(640 * scale))
+
+
+def guided_upsample(
+    alpha_low: np.ndarray,
+    guide_bgr: np.ndarray,
+    *,
+    radius: int = GUIDED_RADIUS,
+    eps: float = GUIDED_EPS,
+) -> np.ndarray:
     """
-    bgr: (H,W,3) uint8
-    alpha: (H,W) float32 in [0,1]
-    return: white background composed bgr uint8
+    저해상도 alpha → guide(원본 BGR) 해상도 alpha. (Fast Guided Filter, 흑백 guide)
+    선형 계수 a, b를 저해상도에서 구하고 bilinear로 올린 뒤 q = a * I + b 로 경계를 원본 에지에 맞춘다.
     """
-    h, w = bgr.shape[:2]
+    h, w = guide_bgr.shape[:2]
+    lh, lw = alpha_low.shape[:2]
+    if (lh, lw) == (h, w):
+        return alpha_low
+
+    guide = cv2.cvtColor(guide_bgr, cv2.COLOR_BGR2GRAY).astype(np.float32) * (1.0 / 255.0)
+    guide_low = cv2.resize(guide, (lw, lh), interpolation=cv2.INTER_AREA)
+    p = alpha_low.astype(np.float32)
+
+    r = max(1, int(round(radius * lw / float(w))))
+    ksize = (2 * r + 1, 2 * r + 1)
+
+    def box(x):
+        return cv2.boxFilter(x, -1, ksize, borderType=cv2.BORDER_REFLECT)
 
-    white = np.ones((h, w, 3), dtype=np.float32) * 255.0
-    fg = bgr.astype(np.float32)
+    mean_i = box(guide_low)
+    mean_p = box(p)
+    cov_ip = box(guide_low * p) - mean_i * mean_p
+    var_i = box(guide_low * guide_low) - mean_i * mean_i
 
-    a3 = np.repeat(alpha[..., None], 3, axis=2)
+    a = cov_ip / (var_i + eps)
+    b = mean_p - a * mean_i
+    mean_a = cv2.resize(box(a), (w, h), interpolation=cv2.INTER_LINEAR)
+    mean_b = cv2.resize(box(b), (w, h), interpolation=cv2.INTER_LINEAR)
 
-    out = fg * a3 + white * (1.0 - a3)
-    return np.clip(out, 0, 255).astype(np.uint8)
+    q = mean_a * guide + mean_b
+    return np.clip(q, 0.0, 1.0)
+
+
+def _prepare_batch(
+    bgrs: list[np.ndarray],
+    target_h: int,
+    target_w: int,
+) -> tuple[np.ndarray, list[tuple[int, int]]]:
+    """
+    BGR 리스트 -> (N,3,H,W) float32 RGB [0,1] 배열
+    return: batch, [(orig_h, orig_w), ...]
+    """
+    batch = np.empty((len(bgrs), 3, target_h, target_w), dtype=np.float32)
+    orig_hws = []
+
+    for i, bgr in enumerate(bgrs):
+        # 🔥 핵심: 600 → 640 패딩 (32 배수 맞춤)
+        bgr_pad, orig_hw = _pad_to_target(bgr, target_h=target_h, target_w=target_w)
+        rgb = cv2.cvtColor(bgr_pad, cv2.COLOR_BGR2RGB)
+        batch[i] = rgb.transpose(2, 0, 1)
+        orig_hws.append(orig_hw)
+
+    batch *= 1.0 / 255.0
+    return batch, orig_hws
 
 
 # ------------------------------------------------------------
 # BiRefNet Wrapper
 # ------------------------------------------------------------
 
-class BiRefNetMatting:
+def _load_birefnet_module(weight_path: str):
+    """safetensors 가중치로 BiRefNet nn.Module을 만든다 (eval 모드, CPU)"""
+    from models.birefnet import BiRefNet
+    from utils import check_state_dict
+    from safetensors.torch import load_file
+
+    model = BiRefNet(bb_pretrained=False)
+
+    sd = load_file(weight_path)
+    sd = check_state_dict(sd)
+
+    model.load_state_dict(sd, strict=False)
+    return model.eval()
+
+
+class _MattingEngine:
+    """
+    엔진 공통 배치 처리. 하위 클래스는 _infer((N,3,H,W) float32 numpy) -> (N,H,W) float32 만 구현한다.
+    """
+
+    def _infer(self, x: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def _free_bytes(self) -> int | None:
+        """auto batch 계산용 여유 메모리 (CPU: psutil 가용 메모리)"""
+        try:
+            import psutil
+            return psutil.virtual_memory().available
+        except Exception:
+            return None
+
+    def predict_alpha(self, bgr: np.ndarray, tier: str | None = None) -> np.ndarray:
+        """
+        입력: 600x800 BGR
+        내부적으로 640x800으로 패딩 후 추론 (tier가 full이 아니면 축소해서 추론)
+        출력은 다시 600x800으로 복원
+        """
+        return self.predict_alpha_batch([bgr], batch_size=1, tier=tier)[0]
+
+    def auto_batch_size(self, h: int = 800, w: int = 640) -> int:
+        """
+        사용 가능한 메모리 기준으로 한 번에 돌릴 배치 크기를 정한다.
+        - GPU: torch.cuda.mem_get_info()의 여유 메모리
+        - CPU: psutil 가용 메모리 (없으면 MATTING_MAX_BATCH 그대로)
+        샘플 1장당 메모리는 MATTING_BYTES_PER_PIXEL * H * W 로 추정한다.
+        """
+        free_bytes = self._free_bytes()
+        if free_bytes is None:
+            return MATTING_MAX_BATCH
+
+        per_sample = MATTING_BYTES_PER_PIXEL * h * w
+        fit = int(free_bytes * MATTING_MEMORY_FRACTION // per_sample)
+        return max(1, min(MATTING_MAX_BATCH, fit))
+
+    def predict_alpha_batch(
+        self,
+        bgrs: list[np.ndarray],
+        batch_size: int | None = None,
+        tier: str | None = None,
+    ) -> list[np.ndarray]:
+        """
+        여러 장을 (N,3,H,W) 텐서 하나로 쌓아서 forward 1번에 추론한다.
+        - 모든 입력을 배치 내 최대 크기(32 배수, 최소 800x640)로 패딩
+        - batch_size가 None이면 auto_batch_size()로 결정
+        - tier: MATTING_TIERS 이름. full이 아니면 입력을 줄여서 추론하고 guided_upsample로 원래 크기 alpha를 만든다
+        반환: 입력 순서대로 원래 크기의 alpha (H,W) float32 리스트
+        """
+        if not bgrs:
+            return []
+
+        scale = tier_scale(tier)
+        if scale < 1.0:
+            small = [
+                cv2.resize(b, (max(1, int(round(b.shape[1] * scale))), max(1, int(round(b.shape[0] * scale)))),
+                           interpolation=cv2.INTER_AREA)
+                for b in bgrs
+            ]
+            low = self._predict_padded(small, batch_size, tier_min_hw(tier))
+            return [guided_upsample(a, b) for a, b in zip(low, bgrs)]
+
+        return self._predict_padded(bgrs, batch_size, (800, 640))
+
+    def _predict_padded(
+        self,
+        bgrs: list[np.ndarray],
+        batch_size: int | None,
+        min_hw: tuple[int, int],
+    ) -> list[np.ndarray]:
+        target_h, target_w = _batch_target_hw(bgrs, min_hw)
+
+        if batch_size is None:
+            batch_size = self.auto_batch_size(target_h, target_w)
+        batch_size = max(1, int(batch_size))
+
+        alphas: list[np.ndarray] = []
+        for start in range(0, len(bgrs), batch_size):
+            chunk = bgrs[start:start + batch_size]
+
+            x, orig_hws = _prepare_batch(chunk, target_h, target_w)
+
+            pred = self._infer(x)
+
+            for i, orig_hw in enumerate(orig_hws):
+                # 🔥 원래 크기(600x800)로 복원
+                alphas.append(_crop_back(pred[i], orig_hw))
+
+        return alphas
+
+
+class BiRefNetMatting(_MattingEngine):
     """
-    BiRefNet 기반 매팅 모델 래퍼
+    BiRefNet 기반 매팅 모델 래퍼 (PyTorch eager)
+
+    CPU 옵션:
+    - channels_last: 모델/입력을 NHWC 메모리 배치로 (oneDNN conv가 빨라지는 경우가 많다)
+    - dtype: "fp32" | "bf16" (bf16은 torch.autocast, AVX512-BF16/AMX가 있는 CPU에서 효과)
     """
 
-    def __init__(self, weight_path: str, device: str | None = None):
+    def __init__(
+        self,
+        weight_path: str,
+        device: str | None = None,
+        *,
+        channels_last: bool = MATTING_CHANNELS_LAST,
+        dtype: str = MATTING_DTYPE,
+    ):
         import torch
-        from models.birefnet import BiRefNet
-        from utils import check_state_dict
-        from safetensors.torch import load_file
+
+        if dtype not in _MATTING_DTYPES:
+            raise ValueError(f"Unknown matting dtype: {dtype} (choose from {', '.join(_MATTING_DTYPES)})")
 
         if device is None:
             device = "cuda" if torch.cuda.is_available() else "cpu"
 
         self.device = device
         self.torch = torch
+        self.channels_last = bool(channels_last)
+        self.dtype = dtype
 
-        model = BiRefNet(bb_pretrained=False)
-
-        sd = load_file(weight_path)
-        sd = check_state_dict(sd)
-
-        model.load_state_dict(sd, strict=False)
-        model.eval().to(device)
+        model = _load_birefnet_module(weight_path).to(device)
+        if self.channels_last:
+            model = model.to(memory_format=torch.channels_last)
 
         self.model = model
 
-    def predict_alpha(self, bgr: np.ndarray) -> np.ndarray:
-        """
-        입력: 600x800 BGR
-        내부적으로 640x800으로 패딩 후 추론
-        출력은 다시 600x800으로 복원
-        """
+    def _free_bytes(self) -> int | None:
         torch = self.torch
+        if str(self.device).startswith("cuda") and torch.cuda.is_available():
+            free_bytes, _ = torch.cuda.mem_get_info()
+            return free_bytes
+        return super()._free_bytes()
 
-        # 🔥 핵심: 600 → 640 패딩 (32 배수 맞춤)
-        bgr_pad, orig_hw = _pad_to_target(
-            bgr,
-            target_h=800,
-            target_w=640
-        )
+    def _forward(self, x):
+        """x: (N,3,H,W) float tensor -> (N,H,W) alpha numpy float32"""
+        torch = self.torch
+
+        if self.channels_last:
+            x = x.contiguous(memory_format=torch.channels_last)
 
-        rgb = cv2.cvtColor(bgr_pad, cv2.COLOR_BGR2RGB).astype(np.float32) / 255.0
-        x = torch.from_numpy(rgb).permute(2, 0, 1).unsqueeze(0).to(self.device)
+        device_type = "cuda" if str(self.device).startswith("cuda") else "cpu"
+        autocast = torch.autocast(
+            device_type=device_type,
+            dtype=torch.bfloat16,
+            enabled=self.dtype == "bf16",
+        )
 
-        with torch.no_grad():
+        with torch.no_grad(), autocast:
             y = self.model(x)
 
             if isinstance(y, (list, tuple)):
@@ -118,20 +342,194 @@ class BiRefNetMatting:
             if y.dim() == 4 and y.size(1) != 1:
                 y = y[:, :1, :, :]
 
-            alpha = torch.sigmoid(y)[0, 0].cpu().numpy()
+            alpha = torch.sigmoid(y.float())[:, 0].cpu().numpy()
+
+        return np.clip(alpha, 0.0, 1.0).astype(np.float32)
+
+    def _infer(self, x: np.ndarray) -> np.ndarray:
+        return self._forward(self.torch.from_numpy(x).to(self.device))
 
-        alpha = np.clip(alpha, 0.0, 1.0).astype(np.float32)
 
-        # 🔥 원래 600x800으로 복원
-        alpha = _crop_back(alpha, orig_hw)
+# ------------------------------------------------------------
+# ONNX Runtime (CPU) 엔진
+# ------------------------------------------------------------
+
+def onnx_export_path(weight_path: str, height: int = 800, width: int = 640) -> str:
+    """가중치 옆에 캐시해두는 ONNX 파일 경로 (입력 크기 / opset별)"""
+    stem, _ = os.path.splitext(weight_path)
+    return f"{stem}.{height}x{width}.opset{MATTING_ONNX_OPSET}.onnx"
+
+
+def export_birefnet_onnx(
+    weight_path: str,
+    onnx_path: str | None = None,
+    *,
+    height: int = 800,
+    width: int = 640,
+    opset: int = MATTING_ONNX_OPSET,
+) -> str:
+    """
+    BiRefNet을 ONNX로 1번 export 해서 가중치 옆에 저장한다. 이미 있으면 그대로 쓴다.
+    - 입력 (N,3,height,width) float32 RGB [0,1], batch만 동적
+    - 출력 (N,1,height,width) alpha (sigmoid 적용 후)
+    반환: onnx 파일 경로
+    """
+    onnx_path = onnx_path or onnx_export_path(weight_path, height, width)
+    if os.path.exists(onnx_path):
+        return onnx_path
 
-        return alpha
+    import torch
+
+    class _AlphaHead(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, x):
+            y = self.model(x)
+            if isinstance(y, (list, tuple)):
+                y = y[0]
+            if isinstance(y, dict):
+                y = y.get("pred", next(iter(y.values())))
+            return torch.sigmoid(y[:, :1])
+
+    wrapped = _AlphaHead(_load_birefnet_module(weight_path))
+    dummy = torch.zeros((1, 3, height, width), dtype=torch.float32)
+
+    # 여러 프로세스가 동시에 export 해도 완성된 파일만 보이도록 임시 파일 → rename
+    tmp_path = f"{onnx_path}.{os.getpid()}.tmp"
+    with torch.no_grad():
+        torch.onnx.export(
+            wrapped,
+            dummy,
+            tmp_path,
+            input_names=["input"],
+            output_names=["alpha"],
+            dynamic_axes={"input": {0: "batch"}, "alpha": {0: "batch"}},
+            opset_version=opset,
+        )
+    os.replace(tmp_path, onnx_path)
+    return onnx_path
+
+
+class BiRefNetONNXMatting(_MattingEngine):
+    """
+    ONNX Runtime CPU로 돌리는 BiRefNet 매팅 엔진.
+    처음 생성할 때 export_birefnet_onnx()로 ONNX를 만들고(가중치 옆에 캐시), 이후에는 torch 없이 실행된다.
+    다른 입력 크기(저해상도 tier 등)는 처음 쓸 때 그 크기로 따로 export 한다.
+    onnx_path를 주면 그 파일을 그대로 로딩하고 (INT8 변환 모델 등),
+    다른 크기의 배치는 그 모델 크기로 리사이즈해서 추론한 뒤 되돌린다.
+    """
+
+    def __init__(
+        self,
+        weight_path: str,
+        *,
+        onnx_path: str | None = None,
+        height: int = 800,
+        width: int = 640,
+        intra_op_threads: int = MATTING_ONNX_THREADS,
+    ):
+        import onnxruntime as ort
+
+        self.ort = ort
+        self.weight_path = weight_path
+        # 직접 지정한 파일(예: INT8 변환 결과)은 그 크기로만 돌리고, 아니면 입력 크기별로 export 한다
+        self.fixed = onnx_path is not None
+        if onnx_path is None:
+            onnx_path = export_birefnet_onnx(weight_path, height=height, width=width)
+        elif not os.path.exists(onnx_path):
+            raise FileNotFoundError(f"BiRefNet ONNX not found: {onnx_path}")
+        self.onnx_path = onnx_path
+
+        so = ort.SessionOptions()
+        if intra_op_threads > 0:
+            so.intra_op_num_threads = int(intra_op_threads)
+        so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.sess_options = so
+
+        self.device = "cpu"
+        self.providers = ["CPUExecutionProvider"]
+        self.sess = ort.InferenceSession(self.onnx_path, sess_options=so, providers=self.providers)
+        self.in_name = self.sess.get_inputs()[0].name
+        self.out_name = self.sess.get_outputs()[0].name
+        self.hw = (height, width)
+
+        # 해상도 단계별 세션 (저해상도 tier용, 처음 쓸 때 export + 로딩)
+        self._sessions = {self.hw: self.sess}
+        self._sessions_lock = threading.Lock()
+
+    def _session_for(self, h: int, w: int):
+        """(h, w) 입력용 세션. 고정 모델이면 None (export 크기로 리사이즈해서 돌린다)"""
+        if self.fixed:
+            return self._sessions.get((h, w))
+        with self._sessions_lock:
+            sess = self._sessions.get((h, w))
+            if sess is None:
+                path = export_birefnet_onnx(self.weight_path, height=h, width=w)
+                sess = self.ort.InferenceSession(path, sess_options=self.sess_options, providers=self.providers)
+                self._sessions[(h, w)] = sess
+            return sess
+
+    def _infer(self, x: np.ndarray) -> np.ndarray:
+        n, _, h, w = x.shape
+        sess = self._session_for(h, w)
+        if sess is not None:
+            y = sess.run([self.out_name], {self.in_name: np.ascontiguousarray(x)})[0][:, 0]
+            return np.clip(y, 0.0, 1.0).astype(np.float32)
+
+        eh, ew = self.hw
+        if (h, w) != (eh, ew):
+            x = np.stack([
+                cv2.resize(img.transpose(1, 2, 0), (ew, eh), interpolation=cv2.INTER_LINEAR).transpose(2, 0, 1)
+                for img in x
+            ])
+
+        y = self.sess.run([self.out_name], {self.in_name: np.ascontiguousarray(x)})[0][:, 0]
+
+        if (h, w) != (eh, ew):
+            y = np.stack([cv2.resize(a, (w, h), interpolation=cv2.INTER_LINEAR) for a in y])
+        return np.clip(y, 0.0, 1.0).astype(np.float32)
+
+
+def create_matting(
+    weight_path: str,
+    *,
+    engine: str = MATTING_ENGINE,
+    device: str | None = None,
+    **kwargs,
+) -> _MattingEngine:
+    """
+    매팅 엔진 선택
+    - "torch": PyTorch eager (channels_last / dtype 옵션)
+    - "onnx" : ONNX Runtime CPU (처음 1번 export)
+    """
+    if engine == "torch":
+        return BiRefNetMatting(weight_path, device=device, **kwargs)
+    if engine == "onnx":
+        return BiRefNetONNXMatting(weight_path, **kwargs)
+    raise ValueError(f"Unknown matting engine: {engine} (choose from {', '.join(MATTING_ENGINES)})")
 
 
 # ------------------------------------------------------------
 # Public API
 # ------------------------------------------------------------
 
+def compose_from_alpha(bgr: np.ndarray, alpha: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    이미 구한 alpha로 BGRA / 흰 배경 합성 결과를 만든다. (모델 추론 없음)
+    returns: (bgra, white_bgr)
+    """
+    alpha_u8 = (alpha * 255.0).astype(np.uint8)
+
+    # 🔥 OpenCV 기준으로 BGRA 그대로 생성
+    bgra = np.dstack([bgr, alpha_u8])
+
+    white_bgr = composite_white(bgr, alpha_u8)
+
+    return bgra, white_bgr
+
+
 def remove_bg_and_compose_white(
     bgr: np.ndarray,
     matting: BiRefNetMatting
@@ -144,11 +542,20 @@ def remove_bg_and_compose_white(
 
     alpha = matting.predict_alpha(bgr)
 
-    alpha_u8 = (alpha * 255.0).astype(np.uint8)
+    return compose_from_alpha(bgr, alpha)
 
-    # 🔥 OpenCV 기준으로 BGRA 그대로 생성
-    bgra = np.dstack([bgr, alpha_u8])
 
-    white_bgr = _alpha_blend_white(bgr, alpha)
 
-    return bgra, white_bgr
\ No newline at end of file
+def remove_bg_and_compose_white_batch(
+    bgrs: list[np.ndarray],
+    matting: BiRefNetMatting,
+    batch_size: int | None = None,
+) -> list[tuple[np.ndarray, np.ndarray]]:
+    """
+    remove_bg_and_compose_white의 배치 버전. (브로커 없이 직접 배치 추론할 때: 스크립트 / 단일 job)
+    matting 자리에 MattingBroker를 넘기면 다른 요청과 같은 배치로 묶인다.
+    returns: 입력 순서대로 [(bgra, white_bgr), ...]
+    """
+    alphas = matting.predict_alpha_batch(bgrs, batch_size=batch_size)
+
+    return [compose_from_alpha(bgr, alpha) for bgr, alpha in zip(bgrs, alphas)]
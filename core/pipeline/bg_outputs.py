@@ -0,0 +1,250 @@
+# background 단계 산출물 인코딩 (job별 출력 프로필)
+# 매팅 결과 중 실제로 저장할 파일(알파 마스크 PNG / BGRA PNG / 흰 배경 JPG·WebP)과
+# 인코딩 품질을 프로필로 고른다. 8bit 알파 마스크는 항상 저장해두고,
+# 저장하지 않은 산출물은 요청이 올 때 faces/ 원본 + 마스크로 다시 합성한다. (모델 추론 없음)
+import os
+
+import cv2
+import numpy as np
+
+from core.pipeline.compositing import build_background, composite_many, composite_white
+
+ARTIFACTS = ("mask", "bgra", "white")
+WHITE_FORMATS = ("jpg", "webp")
+
+# 프로필 프리셋. mask는 on-demand 합성의 원본이라 항상 포함된다.
+OUTPUT_PROFILES = {
+    "full": {"artifacts": ["mask", "bgra", "white"], "white_format": "jpg"},
+    "white": {"artifacts": ["mask", "white"], "white_format": "jpg"},
+    "webp": {"artifacts": ["mask", "white"], "white_format": "webp"},
+    "mask": {"artifacts": ["mask"], "white_format": "jpg"},
+}
+
+# 기본 프로필 (대부분의 클라이언트는 흰 배경 결과만 쓴다)
+DEFAULT_OUTPUT_PROFILE = os.environ.get("IDPHOTO_BG_PROFILE", "white")
+
+# 인코딩 기본값
+DEFAULT_JPEG_QUALITY = 95
+DEFAULT_WEBP_QUALITY = 90
+DEFAULT_PNG_COMPRESSION = 1  # 0~9, 낮을수록 빠르고 파일이 크다
+
+
+def resolve_profile(
+    name: str | None = None,
+    *,
+    artifacts: list[str] | None = None,
+    white_format: str | None = None,
+    jpeg_quality: int | None = None,
+    webp_quality: int | None = None,
+    png_compression: int | None = None,
+) -> dict:
+    """
+    프리셋 + 개별 설정으로 출력 프로필을 만든다. 잘못된 값이면 ValueError
+    반환: {"name", "artifacts", "white_format", "jpeg_quality", "webp_quality", "png_compression"}
+    """
+    name = name or DEFAULT_OUTPUT_PROFILE
+    base = OUTPUT_PROFILES.get(name)
+    if base is None:
+        raise ValueError(f"Unknown output profile: {name} (choose from {', '.join(OUTPUT_PROFILES)})")
+
+    chosen = list(artifacts) if artifacts is not None else list(base["artifacts"])
+    unknown = [a for a in chosen if a not in ARTIFACTS]
+    if unknown:
+        raise ValueError(f"Unknown artifacts: {unknown} (choose from {', '.join(ARTIFACTS)})")
+    if "mask" not in chosen:
+        chosen.insert(0, "mask")
+
+    white_format = white_format or base["white_format"]
+    if white_format not in WHITE_FORMATS:
+        raise ValueError(f"Unknown white format: {white_format} (choose from {', '.join(WHITE_FORMATS)})")
+
+    profile = {
+        "name": name,
+        "artifacts": [a for a in ARTIFACTS if a in chosen],
+        "white_format": white_format,
+        "jpeg_quality": DEFAULT_JPEG_QUALITY if jpeg_quality is None else int(jpeg_quality),
+        "webp_quality": DEFAULT_WEBP_QUALITY if webp_quality is None else int(webp_quality),
+        "png_compression": DEFAULT_PNG_COMPRESSION if png_compression is None else int(png_compression),
+    }
+    if not (0 <= profile["jpeg_quality"] <= 100 and 1 <= profile["webp_quality"] <= 100):
+        raise ValueError("jpeg_quality must be 0~100 and webp_quality 1~100")
+    if not 0 <= profile["png_compression"] <= 9:
+        raise ValueError("png_compression must be 0~9")
+    return profile
+
+
+def artifact_names(src_name: str, white_format: str) -> dict[str, str]:
+    """idphoto 파일명 → 산출물 상대경로 (저장 여부와 무관하게 이름은 고정)"""
+    base = os.path.splitext(os.path.basename(src_name))[0]  # idphoto_01_xxx
+    return {
+        "mask": f"background/mask_{base}.png",
+        "bgra": f"background/bg_{base}.png",
+        "white": f"background/white_{base}.{white_format}",
+    }
+
+
+def _imwrite_params(rel: str, profile: dict) -> list[int]:
+    ext = os.path.splitext(rel)[1].lower()
+    if ext in (".jpg", ".jpeg"):
+        return [cv2.IMWRITE_JPEG_QUALITY, profile["jpeg_quality"]]
+    if ext == ".webp":
+        return [cv2.IMWRITE_WEBP_QUALITY, profile["webp_quality"]]
+    if ext == ".png":
+        return [cv2.IMWRITE_PNG_COMPRESSION, profile["png_compression"]]
+    return []
+
+
+def _remove_stale(job_path: str, src_rel: str, kind: str) -> None:
+    rels = {artifact_names(src_rel, fmt)[kind] for fmt in WHITE_FORMATS}
+    for rel in rels:
+        path = os.path.join(job_path, rel)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def alpha_to_u8(alpha: np.ndarray) -> np.ndarray:
+    """매팅 결과 alpha (float [0,1]) → 8bit 마스크 (이미 uint8이면 그대로)"""
+    if alpha.dtype == np.uint8:
+        return alpha
+    return (alpha * 255.0).astype(np.uint8)
+
+
+def render(kind: str, bgr: np.ndarray, alpha_u8: np.ndarray) -> np.ndarray:
+    """저장된 8bit 알파로 산출물 1종을 합성한다."""
+    if kind == "mask":
+        return alpha_u8
+    if kind == "bgra":
+        return np.dstack([bgr, alpha_u8])
+    if kind == "white":
+        return composite_white(bgr, alpha_u8)
+    raise ValueError(f"Unknown artifact: {kind}")
+
+
+def write_outputs(
+    job_path: str,
+    src_rel: str,
+    bgr: np.ndarray,
+    alpha: np.ndarray,
+    profile: dict,
+    *,
+    always: tuple = (),
+) -> tuple[dict, dict[str, np.ndarray]]:
+    """
+    프로필에 있는 산출물만 인코딩해서 저장한다.
+    alpha: 매팅 결과 (float [0,1]) 또는 8bit 마스크 (결과 캐시 hit)
+    always: 프로필과 관계없이 저장할 산출물 (예: /run은 identity 단계가 흰 배경 파일을 읽으므로 "white")
+
+    반환: (report 항목, {산출물 종류: 합성된 이미지})
+      report 항목: {"src", "mask_png", "bg_png", "white", "white_jpg", "written": [...]}
+        - 경로는 저장 여부와 관계없이 고정 이름. 저장된 것만 written에 들어간다.
+        - white_jpg는 background.items[].white_jpg를 읽는 기존 클라이언트용으로 white와 같은 경로를 둔다
+          (webp 프로필이면 .webp 경로)
+    """
+    names = artifact_names(src_rel, profile["white_format"])
+    os.makedirs(os.path.join(job_path, "background"), exist_ok=True)
+
+    alpha_u8 = alpha_to_u8(alpha)
+    rendered = {}
+    written = []
+    for kind in ARTIFACTS:
+        if kind not in profile["artifacts"] and kind not in always:
+            # 예전 실행에서 남은 파일이 새 마스크와 어긋나지 않도록 지운다 (필요하면 on-demand로 다시 합성)
+            _remove_stale(job_path, src_rel, kind)
+            continue
+        img = render(kind, bgr, alpha_u8)
+        rel = names[kind]
+        cv2.imwrite(os.path.join(job_path, rel), img, _imwrite_params(rel, profile))
+        rendered[kind] = img
+        written.append(kind)
+
+    entry = {
+        "src": src_rel,
+        "mask_png": names["mask"],
+        "bg_png": names["bgra"],
+        "white": names["white"],
+        "white_jpg": names["white"],
+        "written": written,
+    }
+    return entry, rendered
+
+
+def white_rel(entry: dict) -> str | None:
+    """report 항목의 흰 배경 결과 경로 (예전 report의 white_jpg 키도 지원)"""
+    return entry.get("white") or entry.get("white_jpg")
+
+
+def ensure_artifact(
+    job_path: str,
+    entry: dict,
+    kind: str,
+    profile: dict,
+    *,
+    white_format: str | None = None,
+) -> str:
+    """
+    산출물 파일이 없으면 faces/ 원본 + 저장된 마스크로 합성해서 저장한다. (모델 추론 없음)
+    반환: 산출물 상대경로
+    """
+    if kind not in ARTIFACTS:
+        raise ValueError(f"Unknown artifact: {kind}")
+
+    if kind == "white" and white_format is not None:
+        if white_format not in WHITE_FORMATS:
+            raise ValueError(f"Unknown white format: {white_format}")
+        rel = artifact_names(entry["src"], white_format)["white"]
+    elif kind == "white":
+        rel = white_rel(entry)
+    else:
+        rel = entry.get("mask_png") if kind == "mask" else entry.get("bg_png")
+    if rel is None:
+        raise FileNotFoundError(f"No {kind} path recorded for {entry.get('src')}")
+
+    abs_path = os.path.join(job_path, rel)
+    if os.path.exists(abs_path):
+        return rel
+
+    bgr, alpha_u8 = _load_source(job_path, entry)
+    cv2.imwrite(abs_path, render(kind, bgr, alpha_u8), _imwrite_params(rel, profile))
+    return rel
+
+
+def _load_source(job_path: str, entry: dict) -> tuple[np.ndarray, np.ndarray]:
+    """faces/ 원본(BGR) + 저장된 8bit 알파 마스크"""
+    from core.io.frame_cache import get_frame_cache
+
+    mask_rel = entry.get("mask_png")
+    bgr = get_frame_cache().get_bgr(job_path, entry["src"])
+    alpha_u8 = cv2.imread(os.path.join(job_path, mask_rel), cv2.IMREAD_GRAYSCALE) if mask_rel else None
+    if bgr is None or alpha_u8 is None:
+        raise FileNotFoundError(f"Missing source or mask for {entry['src']}")
+    return bgr, alpha_u8
+
+
+def write_composites(
+    job_path: str,
+    entry: dict,
+    specs: list[dict],
+    profile: dict,
+    *,
+    fmt: str = "jpg",
+) -> list[str]:
+    """
+    저장된 알파 마스크 1장으로 여러 배경(compositing.parse_backgrounds 결과)을 한 번에 합성해서 저장한다.
+    반환: 저장한 상대경로 목록 (specs 순서)
+    """
+    if fmt not in WHITE_FORMATS:
+        raise ValueError(f"Unknown format: {fmt} (choose from {', '.join(WHITE_FORMATS)})")
+
+    bgr, alpha_u8 = _load_source(job_path, entry)
+    h, w = bgr.shape[:2]
+    images = composite_many(bgr, alpha_u8, [build_background(spec, h, w) for spec in specs])
+
+    base = os.path.splitext(os.path.basename(entry["src"]))[0]
+    os.makedirs(os.path.join(job_path, "background", "composite"), exist_ok=True)
+
+    rels = []
+    for spec, img in zip(specs, images):
+        rel = f"background/composite/{base}_{spec['label']}.{fmt}"
+        cv2.imwrite(os.path.join(job_path, rel), img, _imwrite_params(rel, profile))
+        rels.append(rel)
+    return rels
@@ -0,0 +1,145 @@
+# 알파 마스크 1장으로 여러 배경 합성 (모델 추론 없음)
+# 흰 배경 외에 하늘색 / 회색 / 그라디언트 배경을 BiRefNet을 다시 돌리지 않고 만든다.
+# 합성은 uint16 고정소수점으로 한다: out = round((fg * a + bg * (255 - a)) / 255)
+#   - fg * a + bg * (255 - a) <= 255 * 255 라서 uint16에 들어간다
+#   - /255 반올림은 t = x + 128; (t + (t >> 8)) >> 8 (0 <= x <= 255*255 에서 정확)
+#   - 배경은 (1,1,3) 단색 / (H,1,3) 세로 그라디언트 / (1,W,3) 가로 그라디언트로 broadcast 하므로
+#     원본 크기의 float 임시 배열이나 배경 canvas를 만들지 않는다
+import re
+
+import numpy as np
+
+# 이름으로 고를 수 있는 배경색 (RGB hex)
+BACKGROUND_COLORS = {
+    "white": "#FFFFFF",
+    "lightblue": "#D9E8F5",
+    "blue": "#A9C8E8",
+    "gray": "#D3D3D3",
+}
+
+_HEX_RE = re.compile(r"^#?([0-9a-fA-F]{6})$")
+
+
+def parse_color(spec: str) -> tuple[int, int, int]:
+    """
+    "white" / "lightblue" / "#D9E8F5" / "D9E8F5" → BGR 튜플. 잘못된 값이면 ValueError
+    """
+    spec = spec.strip()
+    spec = BACKGROUND_COLORS.get(spec.lower(), spec)
+    m = _HEX_RE.match(spec)
+    if m is None:
+        raise ValueError(f"Unknown color: {spec} (use #RRGGBB or {', '.join(BACKGROUND_COLORS)})")
+    v = m.group(1)
+    r, g, b = int(v[0:2], 16), int(v[2:4], 16), int(v[4:6], 16)
+    return b, g, r
+
+
+def color_label(spec: str) -> str:
+    """파일명용 라벨 (이름이면 그대로, hex면 소문자 6자리)"""
+    spec = spec.strip()
+    if spec.lower() in BACKGROUND_COLORS:
+        return spec.lower()
+    return _HEX_RE.match(spec).group(1).lower()
+
+
+def solid(color_bgr: tuple[int, int, int]) -> np.ndarray:
+    """단색 배경 (1,1,3) uint8"""
+    return np.asarray(color_bgr, dtype=np.uint8).reshape(1, 1, 3)
+
+
+def gradient(
+    start_bgr: tuple[int, int, int],
+    end_bgr: tuple[int, int, int],
+    length: int,
+    *,
+    vertical: bool = True,
+) -> np.ndarray:
+    """
+    선형 그라디언트 배경. vertical이면 위→아래 (length,1,3), 아니면 왼쪽→오른쪽 (1,length,3) uint8
+    """
+    t = np.linspace(0, 255, num=length).round().astype(np.uint16)[:, None]  # (L,1)
+    a = np.asarray(start_bgr, dtype=np.uint16)[None, :]
+    b = np.asarray(end_bgr, dtype=np.uint16)[None, :]
+    line = _div255(a * (255 - t) + b * t).astype(np.uint8)  # (L,3)
+    return line[:, None, :] if vertical else line[None, :, :]
+
+
+def parse_backgrounds(
+    colors: list[str] | None = None,
+    gradient_colors: list[str] | None = None,
+    *,
+    vertical: bool = True,
+) -> list[dict]:
+    """
+    요청 값 → 배경 spec 목록. 잘못된 값이면 ValueError
+      colors: ["white", "#D9E8F5", ...]  (단색마다 1장)
+      gradient_colors: [시작색, 끝색]      (그라디언트 1장)
+    반환: [{"label", "kind": "solid"|"gradient", "bgr": [...], "vertical"}, ...]
+    """
+    specs = []
+    for c in colors or []:
+        bgr = parse_color(c)
+        specs.append({"label": color_label(c), "kind": "solid", "bgr": [bgr]})
+    if gradient_colors:
+        if len(gradient_colors) != 2:
+            raise ValueError("gradient needs exactly 2 colors (start,end)")
+        bgrs = [parse_color(c) for c in gradient_colors]
+        label = "grad_" + "_".join(color_label(c) for c in gradient_colors) + ("" if vertical else "_h")
+        specs.append({"label": label, "kind": "gradient", "bgr": bgrs, "vertical": vertical})
+    if not specs:
+        raise ValueError("No background colors given")
+    return specs
+
+
+def build_background(spec: dict, h: int, w: int) -> np.ndarray:
+    """parse_backgrounds()의 spec 1개 → composite_many에 넣을 배경 배열"""
+    if spec["kind"] == "solid":
+        return solid(spec["bgr"][0])
+    start, end = spec["bgr"]
+    if spec.get("vertical", True):
+        return gradient(start, end, h, vertical=True)
+    return gradient(start, end, w, vertical=False)
+
+
+def _div255(x: np.ndarray) -> np.ndarray:
+    """uint16 x (0 ~ 255*255) / 255 반올림 (in-place)"""
+    x += 128
+    x += x >> 8
+    x >>= 8
+    return x
+
+
+def composite_many(bgr: np.ndarray, alpha_u8: np.ndarray, backgrounds: list[np.ndarray]) -> np.ndarray:
+    """
+    bgr: (H,W,3) uint8, alpha_u8: (H,W) uint8
+    backgrounds: solid() / gradient() 결과 (또는 (H,W,3)으로 broadcast 되는 uint8 배열) 목록
+    반환: (K,H,W,3) uint8. 모든 배경을 한 번의 broadcast 연산으로 합성한다.
+    """
+    h, w = bgr.shape[:2]
+    if alpha_u8.shape != (h, w):
+        raise ValueError(f"alpha shape {alpha_u8.shape} does not match image {(h, w)}")
+    if not backgrounds:
+        return np.empty((0, h, w, 3), dtype=np.uint8)
+
+    # 배경을 (K, Hb, Wb, 3)로 쌓는다. 그라디언트가 없으면 Hb = Wb = 1
+    bh = h if any(bg.shape[0] != 1 for bg in backgrounds) else 1
+    bw = w if any(bg.shape[1] != 1 for bg in backgrounds) else 1
+    bgs = np.stack([np.broadcast_to(bg, (bh, bw, 3)) for bg in backgrounds]).astype(np.uint16)
+
+    a = alpha_u8.astype(np.uint16)[..., None]  # (H,W,1)
+    fg = bgr.astype(np.uint16)
+    fg *= a  # fg * a 는 배경과 무관하므로 1번만 계산
+
+    a = 255 - a
+    out = bgs * a  # broadcast → (K,H,W,3)
+    out += fg
+    return _div255(out).astype(np.uint8)
+
+
+def composite(bgr: np.ndarray, alpha_u8: np.ndarray, background: np.ndarray) -> np.ndarray:
+    """배경 1개 합성. 반환: (H,W,3) uint8"""
+    return composite_many(bgr, alpha_u8, [background])[0]
+
+
+def composite_white(bgr: np.ndarray, alpha_u8: np.ndarray) -> np.ndarray:
+    return composite(bgr, alpha_u8, solid((255, 255, 255)))
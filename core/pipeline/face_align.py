@@ -1,39 +1,41 @@
+import threading
+
 import cv2
 import numpy as np
 import mediapipe as mp
 
-_mp_face_mesh = None
+from core.face.detect_proxy import make_detection_proxy
+from core.face.landmarks_store import landmarks_to_array
+
+# FaceMesh는 스레드 간 공유가 안전하지 않으므로 스레드마다 하나씩 만든다
+_local = threading.local()
 
 
 def _get_face_mesh():
-    """FaceMesh를 최초 사용 시점에 생성한다."""
-    global _mp_face_mesh
-    if _mp_face_mesh is None:
-        _mp_face_mesh = mp.solutions.face_mesh.FaceMesh(
+    """현재 스레드의 FaceMesh를 최초 사용 시점에 생성한다."""
+    fm = getattr(_local, "face_mesh", None)
+    if fm is None:
+        fm = mp.solutions.face_mesh.FaceMesh(
             static_image_mode=True,
             max_num_faces=1,
             refine_landmarks=True,
             min_detection_confidence=0.5,
         )
-    return _mp_face_mesh
+        _local.face_mesh = fm
+    return fm
 
 
 def _get_eye_centers(landmarks, image_w, image_h):
     """
     FaceMesh 랜드마크에서 왼쪽/오른쪽 눈의 중심점을 계산한다.
-    landmarks[i].x, landmarks[i].y 는 0~1 정규화 좌표이므로 픽셀로 변환한다.
+    landmarks: (N,3) 정규화 좌표 배열이므로 픽셀로 변환한다.
     """
     LEFT_EYE_IDX = [33, 133]
     RIGHT_EYE_IDX = [362, 263]
 
-    left_eye = np.mean(
-        [(landmarks[i].x * image_w, landmarks[i].y * image_h) for i in LEFT_EYE_IDX],
-        axis=0,
-    )
-    right_eye = np.mean(
-        [(landmarks[i].x * image_w, landmarks[i].y * image_h) for i in RIGHT_EYE_IDX],
-        axis=0,
-    )
+    scale = np.array([image_w, image_h], dtype=np.float64)
+    left_eye = np.mean(landmarks[LEFT_EYE_IDX, :2], axis=0) * scale
+    right_eye = np.mean(landmarks[RIGHT_EYE_IDX, :2], axis=0) * scale
     return left_eye, right_eye
 
 
@@ -41,76 +43,68 @@ def draw_landmarks(image_bgr, landmarks, radius=1):
     """디버깅용: 원본 이미지 위에 랜드마크 점을 찍어 저장할 때 사용"""
     h, w = image_bgr.shape[:2]
     out = image_bgr.copy()
-    for lm in landmarks:
-        x = int(lm.x * w)
-        y = int(lm.y * h)
+    for x_n, y_n in landmarks[:, :2]:
+        x = int(x_n * w)
+        y = int(y_n * h)
         cv2.circle(out, (x, y), radius, (0, 255, 0), -1)
     return out
 
 
-def frame_id_photo(
-    image_bgr,
-    *,
-    out_w=600,
-    out_h=800,
-    eye_y_ratio=0.35,
-    eye_dist_to_crop_w=2.3,
-):
+def detect_landmarks(image_bgr, image_rgb=None, max_side=None):
     """
-    Day-5: 증명사진 비율 고정 프레이밍(3:4)
-
-    반환:
-      (framed_bgr, landmarks) 또는 (None, None)
-
-    핵심 아이디어(중요):
-    - 눈 사이 거리(eye_distance)를 '얼굴 스케일 기준'으로 사용한다.
-    - 최종 사진에서 '눈 위치'를 항상 out_h의 eye_y_ratio 지점으로 고정한다.
-    - crop 영역은 3:4 비율(가로:세로=out_w:out_h)을 유지한다.
-
-    파라미터 설명:
-    - out_w/out_h: 최종 증명사진 픽셀 크기 (기본 600x800)
-    - eye_y_ratio: 최종 이미지에서 눈이 위치할 세로 비율 (0.35 = 위에서 35%)
-    - eye_dist_to_crop_w: crop 가로폭을 '눈 사이 거리'의 몇 배로 할지 (크면 얼굴 작아짐)
-      * 대략 2.1~2.6 사이에서 튜닝
+    FaceMesh로 대표 얼굴 1개의 (478,3) 정규화 랜드마크를 구한다. 없으면 None
+    탐지는 축소 프록시(DETECT_MAX_SIDE)에서 한다. 정규화 좌표라 원본에도 그대로 쓸 수 있다.
     """
-
-    if image_bgr is None:
-        return None, None
-
-    h, w = image_bgr.shape[:2]
-
-    # 1) 랜드마크 추출
-    image_rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
-    results = _get_face_mesh().process(image_rgb)
+    proxy_rgb, _ = make_detection_proxy(image_bgr, image_rgb, max_side)
+    results = _get_face_mesh().process(proxy_rgb)
     if not results.multi_face_landmarks:
-        return None, None
+        return None
+    return landmarks_to_array(results.multi_face_landmarks[0].landmark)
 
-    landmarks = results.multi_face_landmarks[0].landmark
 
-    # 2) 눈 좌표(픽셀) 계산 + 회전 각도 계산
+def _framing_transform(
+    landmarks,
+    w,
+    h,
+    *,
+    out_w,
+    out_h,
+    eye_y_ratio,
+    eye_dist_to_crop_w,
+):
+    """
+    프레이밍 기하 계산 (픽셀은 건드리지 않는다).
+
+    반환: (M_rot, crop, M_total) 또는 None
+      - M_rot: 눈 수평 맞추기 회전 (2x3)
+      - crop: 회전된 좌표계에서의 crop 영역 (x1, y1, crop_w, crop_h)
+      - M_total: 원본 픽셀 좌표 -> 결과 픽셀 좌표 (회전 -> crop 이동 -> 리사이즈, 2x3 float32)
+    """
+    # 1) 눈 좌표(픽셀) 계산 + 회전 각도 계산
     left_eye, right_eye = _get_eye_centers(landmarks, w, h)
     dy = right_eye[1] - left_eye[1]
     dx = right_eye[0] - left_eye[0]
     angle = np.degrees(np.arctan2(dy, dx))
 
-    # 3) 회전(눈 수평 맞추기)
+    # 2) 회전(눈 수평 맞추기) 행렬
     ex, ey = np.mean([left_eye, right_eye], axis=0)
     eyes_center = (int(ex), int(ey))
-    M = cv2.getRotationMatrix2D(eyes_center, float(angle), 1.0)
-    rotated = cv2.warpAffine(image_bgr, M, (w, h), flags=cv2.INTER_LINEAR)
+    M_rot = cv2.getRotationMatrix2D(eyes_center, float(angle), 1.0)
 
     # (중요) 여기서는 'rotated' 기준 랜드마크를 다시 계산하지 않는다(MVP).
     # 프레이밍은 눈 위치(eyes_center)와 눈 거리(eye_distance)를 기반으로 한다.
 
-    # 4) 프레이밍 crop 크기 결정
+    # 3) 프레이밍 crop 크기 결정
     eye_distance = float(np.linalg.norm(np.array(right_eye) - np.array(left_eye)))
     if eye_distance <= 1.0:
-        return None, None
+        return None
 
     crop_w = int(eye_distance * float(eye_dist_to_crop_w))
     crop_h = int(crop_w * (out_h / out_w))  # 3:4 유지
+    if crop_w <= 0 or crop_h <= 0:
+        return None
 
-    # 5) crop 중심 좌표 계산
+    # 4) crop 중심 좌표 계산
     # 눈이 최종 이미지에서 out_h * eye_y_ratio 위치에 오도록 한다.
     # 즉, crop의 top = eyes_center_y - crop_h * eye_y_ratio
     cx = int(eyes_center[0])
@@ -121,7 +115,7 @@ def frame_id_photo(
     x2 = x1 + crop_w
     y2 = y1 + crop_h
 
-    # 6) 이미지 밖으로 나가는 부분을 보정(클램프)
+    # 5) 이미지 밖으로 나가는 부분을 보정(클램프)
     #   - out of bounds가 있으면 crop 영역을 안쪽으로 밀어 넣는다.
     if x1 < 0:
         x2 += -x1
@@ -142,30 +136,90 @@ def frame_id_photo(
         if y1 < 0:
             y1 = 0
 
-    # 7) crop (패딩 포함: 항상 crop_h x crop_w 보장)
-    # 원하는 crop 영역: [x1:x2, y1:y2] (크기 crop_w x crop_h)
-    # rotated에서 실제로 겹치는 영역만 잘라서, 빈 캔버스에 붙인다.
-    canvas = np.zeros((crop_h, crop_w, 3), dtype=rotated.dtype)
+    # crop이 이미지와 아예 겹치지 않으면 실패
+    if min(w, x1 + crop_w) <= max(0, x1) or min(h, y1 + crop_h) <= max(0, y1):
+        return None
 
-    src_x1 = max(0, x1)
-    src_y1 = max(0, y1)
-    src_x2 = min(w, x2)
-    src_y2 = min(h, y2)
+    # 6) 원본 -> 결과 좌표 변환: 회전 -> crop 이동 -> 리사이즈(cv2.resize의 half-pixel 기준)
+    sx = out_w / crop_w
+    sy = out_h / crop_h
+    S = np.array([[sx, 0.0, 0.5 * sx - 0.5], [0.0, sy, 0.5 * sy - 0.5], [0.0, 0.0, 1.0]])
+    T = np.array([[1.0, 0.0, -x1], [0.0, 1.0, -y1], [0.0, 0.0, 1.0]])
+    R = np.vstack([M_rot, [0.0, 0.0, 1.0]])
+    M_total = (S @ T @ R)[:2].astype(np.float32)
 
-    # canvas에 붙일 위치(원래 좌표계 기준으로 이동)
-    dst_x1 = src_x1 - x1
-    dst_y1 = src_y1 - y1
-    dst_x2 = dst_x1 + (src_x2 - src_x1)
-    dst_y2 = dst_y1 + (src_y2 - src_y1)
+    return M_rot, (x1, y1, crop_w, crop_h), M_total
 
-    # 겹치는 영역이 아예 없으면 실패
-    if src_x2 <= src_x1 or src_y2 <= src_y1:
-        return None, None
 
-    canvas[dst_y1:dst_y2, dst_x1:dst_x2] = rotated[src_y1:src_y2, src_x1:src_x2]
-    face_crop = canvas  
+def frame_id_photo(
+    image_bgr,
+    *,
+    landmarks=None,
+    image_rgb=None,
+    out_w=600,
+    out_h=800,
+    eye_y_ratio=0.35,
+    eye_dist_to_crop_w=2.3,
+    border_mode=cv2.BORDER_CONSTANT,
+    border_value=(0, 0, 0),
+):
+    """
+    Day-5: 증명사진 비율 고정 프레이밍(3:4)
 
-    # 8) 최종 리사이즈 (600x800)
-    framed = cv2.resize(face_crop, (out_w, out_h))
+    반환:
+      (framed_bgr, landmarks, M) 또는 (None, None, None)
+      - landmarks: (478,3) 정규화 랜드마크
+      - M: 원본 픽셀 좌표 -> 프레이밍 결과 픽셀 좌표 affine (2x3)
+
+    핵심 아이디어(중요):
+    - 눈 사이 거리(eye_distance)를 '얼굴 스케일 기준'으로 사용한다.
+    - 최종 사진에서 '눈 위치'를 항상 out_h의 eye_y_ratio 지점으로 고정한다.
+    - crop 영역은 3:4 비율(가로:세로=out_w:out_h)을 유지한다.
+    - 회전 / crop(+클램프, 패딩) / 리사이즈를 affine 1개(M)로 합쳐서
+      원본에서 out_w x out_h 결과로 바로 warp한다. (원본 크기 중간 이미지를 만들지 않는다)
+
+    파라미터 설명:
+    - out_w/out_h: 최종 증명사진 픽셀 크기 (기본 600x800)
+    - eye_y_ratio: 최종 이미지에서 눈이 위치할 세로 비율 (0.35 = 위에서 35%)
+    - eye_dist_to_crop_w: crop 가로폭을 '눈 사이 거리'의 몇 배로 할지 (크면 얼굴 작아짐)
+      * 대략 2.1~2.6 사이에서 튜닝
+    - landmarks: create_job에서 미리 구한 (N,3) 정규화 랜드마크. 주면 FaceMesh를 다시 돌리지 않는다.
+    - image_rgb: 랜드마크를 새로 구해야 할 때 쓸 RGB (프레임 캐시에 있으면 cvtColor 생략)
+    - border_mode/border_value: 원본 밖 영역 채우기 (기본: 검정, 기존 zero canvas와 동일)
+    """
+
+    if image_bgr is None:
+        return None, None, None
+
+    h, w = image_bgr.shape[:2]
+
+    # 랜드마크 추출 (미리 구한 값이 있으면 재사용)
+    if landmarks is None:
+        landmarks = detect_landmarks(image_bgr, image_rgb)
+        if landmarks is None:
+            return None, None, None
+
+    geom = _framing_transform(
+        landmarks,
+        w,
+        h,
+        out_w=out_w,
+        out_h=out_h,
+        eye_y_ratio=eye_y_ratio,
+        eye_dist_to_crop_w=eye_dist_to_crop_w,
+    )
+    if geom is None:
+        return None, None, None
+    _, _, M_total = geom
+
+    # 원본 -> 결과 한 번에 warp
+    framed = cv2.warpAffine(
+        image_bgr,
+        M_total,
+        (out_w, out_h),
+        flags=cv2.INTER_LINEAR,
+        borderMode=border_mode,
+        borderValue=border_value,
+    )
 
-    return framed, landmarks
+    return framed, landmarks, M_total
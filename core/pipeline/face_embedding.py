@@ -1,11 +1,16 @@
 import os
 import json
-from typing import List, Dict, Tuple
+import time
+import threading
+from typing import Callable, List, Dict, Tuple
 
 import cv2
 import numpy as np
 import mediapipe as mp
 
+from core.face.landmarks_store import load_framing_transform, load_landmarks, project_points
+from core.pipeline.bg_outputs import ensure_artifact, resolve_profile, white_rel
+
 
 # ArcFace 112x112 5-point template (표준)
 _ARCFACE_DST = np.array(
@@ -20,29 +25,166 @@ _ARCFACE_DST = np.array(
 )
 
 
-def _cosine_sim(a: np.ndarray, b: np.ndarray) -> float:
-    a = a.astype(np.float32)
-    b = b.astype(np.float32)
-    a = a / (np.linalg.norm(a) + 1e-8)
-    b = b / (np.linalg.norm(b) + 1e-8)
-    return float(np.dot(a, b))
+# ArcFace ONNX Runtime 세션 설정 (0이면 ORT 기본값)
+ARCFACE_INTRA_OP_THREADS = int(os.environ.get("IDPHOTO_ARCFACE_INTRA_OP_THREADS", "0"))
+ARCFACE_INTER_OP_THREADS = int(os.environ.get("IDPHOTO_ARCFACE_INTER_OP_THREADS", "0"))
+ARCFACE_GRAPH_OPT_LEVEL = os.environ.get("IDPHOTO_ARCFACE_GRAPH_OPT_LEVEL", "all")
+ARCFACE_EXECUTION_MODE = os.environ.get("IDPHOTO_ARCFACE_EXECUTION_MODE", "sequential")
+ARCFACE_CACHE_OPTIMIZED = os.environ.get("IDPHOTO_ARCFACE_CACHE_OPTIMIZED", "1") == "1"
+# batch 차원이 고정(1)인 모델을 batch 차원만 "N"으로 바꾼 사본(*.dynbatch.onnx)으로 돌릴지
+ARCFACE_DYNAMIC_BATCH = os.environ.get("IDPHOTO_ARCFACE_DYNAMIC_BATCH", "1") == "1"
 
+# ArcFace 실행 장치: auto(ORT에 CUDA provider가 있으면 cuda) | cuda | cpu
+EMBEDDING_DEVICE = os.environ.get("IDPHOTO_EMBEDDING_DEVICE", "auto")
 
-def _list_background_white_images(job_path: str, report: dict) -> list[str]:
+
+def resolve_embedding_device(device: str | None = None) -> str:
+    """임베딩 장치 결정 ("auto"/None이면 ONNX Runtime provider로 판단)"""
+    device = (device or EMBEDDING_DEVICE).lower()
+    if device != "auto":
+        return device
+    try:
+        import onnxruntime as ort
+        return "cuda" if "CUDAExecutionProvider" in ort.get_available_providers() else "cpu"
+    except Exception:
+        return "cpu"
+
+# 동일인 필터 방식
+# "medoid" : 다른 사진들과의 평균 유사도가 가장 높은 사진(medoid)을 기준으로 sim_threshold 이상만 남긴다
+# "density": sim_threshold 이상인 이웃이 충분히 많은 사진(core)끼리 이어진 가장 큰 덩어리 + 그 이웃을 남긴다
+IDENTITY_METHOD = os.environ.get("IDPHOTO_IDENTITY_METHOD", "medoid")
+# density: core가 되려면 필요한 이웃 비율 (자기 자신 제외 N-1장 중)
+IDENTITY_MIN_NEIGHBORS = float(os.environ.get("IDPHOTO_IDENTITY_MIN_NEIGHBORS", "0.3"))
+
+
+def similarity_matrix(embeds: np.ndarray) -> np.ndarray:
+    """(N,D) 임베딩 → (N,N) cosine 유사도 (행 정규화 1번 + matmul 1번)"""
+    e = np.asarray(embeds, dtype=np.float32)
+    e = e / (np.linalg.norm(e, axis=1, keepdims=True) + 1e-8)
+    return e @ e.T
+
+
+def identity_filter(
+    embeds: np.ndarray,
+    sim_threshold: float,
+    *,
+    method: str | None = None,
+    min_neighbors: float | None = None,
+) -> dict:
+    """
+    NxN 유사도 행렬로 동일인 그룹을 고른다. (업로드 순서와 무관)
+
+    반환:
+      method, ref (기준 사진 index: medoid 또는 가장 큰 density 덩어리에서 이웃이 가장 많은 사진),
+      kept (N,) bool, sim_to_ref (N,), mean_sim (N,, 자기 자신 제외 평균), neighbors (N,, threshold 이상 이웃 수)
+    """
+    method = method or IDENTITY_METHOD
+    if method not in ("medoid", "density"):
+        raise ValueError(f"Unknown identity method: {method} (choose from medoid, density)")
+
+    S = similarity_matrix(embeds)
+    n = S.shape[0]
+    off_diag = ~np.eye(n, dtype=bool)
+
+    mean_sim = (S.sum(axis=1) - np.diag(S)) / max(n - 1, 1)
+    adj = (S >= sim_threshold) & off_diag
+    neighbors = adj.sum(axis=1)
+
+    if method == "medoid":
+        ref = int(np.argmax(mean_sim))
+        kept = S[ref] >= sim_threshold
+    else:
+        ratio = IDENTITY_MIN_NEIGHBORS if min_neighbors is None else min_neighbors
+        need = max(2, int(np.ceil(ratio * (n - 1))))
+        core = neighbors >= need
+        # 이웃 수가 많은 순 (동률이면 평균 유사도가 높은 쪽)
+        rank = np.lexsort((mean_sim, neighbors))[::-1]
+
+        # core끼리 이웃 관계로 이어진 덩어리(connected component)를 모두 구하고 가장 큰 것을 고른다
+        core_adj = adj & core[None, :]
+        best = None
+        unvisited = core.copy()
+        for seed in rank:
+            if not unvisited[seed]:
+                continue
+            comp = np.zeros(n, dtype=bool)
+            comp[seed] = True
+            frontier = comp.copy()
+            while frontier.any():
+                reached = core_adj[frontier].any(axis=0) & ~comp
+                comp |= reached
+                frontier = reached
+            unvisited &= ~comp
+            # 같은 크기면 먼저 찾은 덩어리 (이웃 수가 더 많은 사진이 있는 쪽)
+            if best is None or comp.sum() > best.sum():
+                best = comp
+
+        if best is not None:
+            # 덩어리 안에서 이웃이 가장 많은 사진을 기준으로, core의 이웃(border)까지 포함
+            ref = int(next(i for i in rank if best[i]))
+            kept = best | adj[best].any(axis=0)
+        else:
+            # core가 하나도 없으면 이웃이 가장 많은 사진과 그 이웃만
+            ref = int(rank[0])
+            kept = adj[ref].copy()
+            kept[ref] = True
+
+    return {
+        "method": method,
+        "ref": ref,
+        "kept": kept,
+        "sim_to_ref": S[ref],
+        "mean_sim": mean_sim,
+        "neighbors": neighbors,
+    }
+
+
+def _stored_src5(job_path: str, report: dict, aligner: "FaceMeshAligner") -> dict[str, np.ndarray]:
+    """
+    prepare_faces에서 저장한 랜드마크 + 프레이밍 변환으로
+    white 이미지(= 프레이밍 결과와 같은 좌표계)의 5점 좌표를 구한다.
+    반환: {흰 배경 결과 상대경로: (5,2)}
+    """
+    framing = report.get("idphoto_dataset", {}).get("framing", {})
     outputs = report.get("background", {}).get("outputs", [])
+
+    result = {}
+    for item in outputs:
+        face_name = os.path.basename(item.get("src", ""))
+        entry = framing.get(face_name)
+        white = white_rel(item)
+        if not entry or not white:
+            continue
+
+        landmarks = load_landmarks(job_path, entry.get("landmarks"))
+        M = load_framing_transform(job_path, entry.get("transform"))
+        if landmarks is None or M is None:
+            continue
+
+        result[white] = project_points(M, landmarks[aligner.five_point_indices])
+
+    return result
+
+
+def _list_background_white_images(job_path: str, report: dict) -> list[str]:
+    """
+    흰 배경 결과 목록. 출력 프로필에서 흰 배경을 저장하지 않은 경우
+    faces/ 원본 + 알파 마스크로 여기서 합성한다. (모델 추론 없음)
+    """
+    background = report.get("background", {})
+    outputs = background.get("outputs", [])
     if not outputs:
         return []
 
+    profile = background.get("profile") or resolve_profile()
+
     files = []
     for item in outputs:
-        rel = item.get("white_jpg")
-        if not rel:
+        try:
+            files.append(ensure_artifact(job_path, item, "white", profile))
+        except FileNotFoundError:
             continue
 
-        abs_path = os.path.join(job_path, rel)
-        if os.path.exists(abs_path):
-            files.append(rel)
-
     return files
 
 
@@ -57,6 +199,8 @@ class FaceMeshAligner:
             refine_landmarks=True,
             min_detection_confidence=0.5,
         )
+        # 레지스트리에서 공유되는 인스턴스라 FaceMesh 호출은 직렬화한다
+        self._lock = threading.Lock()
         # MediaPipe FaceMesh indices
         self.IDX_LEFT_EYE = 33
         self.IDX_RIGHT_EYE = 263
@@ -64,28 +208,40 @@ class FaceMeshAligner:
         self.IDX_MOUTH_L = 61
         self.IDX_MOUTH_R = 291
 
-    def align_112(self, bgr: np.ndarray) -> Tuple[np.ndarray | None, Dict | None]:
-        h, w = bgr.shape[:2]
-        rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
-        res = self.fm.process(rgb)
-        if not res.multi_face_landmarks:
-            return None, None
-
-        lm = res.multi_face_landmarks[0].landmark
-
-        def pt(i: int) -> np.ndarray:
-            return np.array([lm[i].x * w, lm[i].y * h], dtype=np.float32)
-
-        src = np.stack(
-            [
-                pt(self.IDX_LEFT_EYE),
-                pt(self.IDX_RIGHT_EYE),
-                pt(self.IDX_NOSE),
-                pt(self.IDX_MOUTH_L),
-                pt(self.IDX_MOUTH_R),
-            ],
-            axis=0,
-        )
+    @property
+    def five_point_indices(self) -> list[int]:
+        return [
+            self.IDX_LEFT_EYE,
+            self.IDX_RIGHT_EYE,
+            self.IDX_NOSE,
+            self.IDX_MOUTH_L,
+            self.IDX_MOUTH_R,
+        ]
+
+    def align_112(
+        self,
+        bgr: np.ndarray,
+        src5: np.ndarray | None = None,
+    ) -> Tuple[np.ndarray | None, Dict | None]:
+        """
+        src5: 이미 알고 있는 5점 픽셀 좌표 (5,2). 주면 FaceMesh를 돌리지 않는다.
+        """
+        if src5 is None:
+            h, w = bgr.shape[:2]
+            rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+            with self._lock:
+                res = self.fm.process(rgb)
+            if not res.multi_face_landmarks:
+                return None, None
+
+            lm = res.multi_face_landmarks[0].landmark
+
+            def pt(i: int) -> np.ndarray:
+                return np.array([lm[i].x * w, lm[i].y * h], dtype=np.float32)
+
+            src = np.stack([pt(i) for i in self.five_point_indices], axis=0)
+        else:
+            src = np.asarray(src5, dtype=np.float32)
 
         M, _ = cv2.estimateAffinePartial2D(src, _ARCFACE_DST, method=cv2.LMEDS)
         if M is None:
@@ -102,17 +258,110 @@ class FaceMeshAligner:
         return aligned, meta
 
 
+_GRAPH_OPT_LEVELS = {
+    "disable": "ORT_DISABLE_ALL",
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",
+}
+_EXECUTION_MODES = {
+    "sequential": "ORT_SEQUENTIAL",
+    "parallel": "ORT_PARALLEL",
+}
+
+
+def _dynamic_batch_model(model_path: str) -> str | None:
+    """
+    입력/출력의 batch 차원이 고정된 ONNX 모델을 batch 차원만 symbolic("N")으로 바꿔 모델 옆에 저장하고 경로를 반환한다.
+    (arcfaceresnet100-8은 batch 1 고정이라 그대로면 얼굴마다 session.run을 따로 해야 한다)
+    flatten 등 Reshape의 shape 상수가 고정 batch로 시작하면 0(입력 차원 그대로)으로 바꾼다.
+    이미 동적이거나 onnx 패키지가 없거나 변환에 실패하면 None (원래 모델을 쓴다)
+    """
+    stem, _ = os.path.splitext(model_path)
+    out_path = f"{stem}.dynbatch.onnx"
+    if os.path.exists(out_path) and os.path.getmtime(out_path) >= os.path.getmtime(model_path):
+        return out_path
+
+    try:
+        import onnx
+        from onnx import numpy_helper
+    except ImportError:
+        return None
+
+    try:
+        model = onnx.load(model_path)
+        graph = model.graph
+        initializers = {init.name for init in graph.initializer}
+        inputs = [i for i in graph.input if i.name not in initializers]
+        dims = [i.type.tensor_type.shape.dim for i in list(inputs) + list(graph.output)]
+        if not dims or not all(d and d[0].HasField("dim_value") for d in dims):
+            return None
+        fixed = dims[0][0].dim_value
+        for d in dims:
+            d[0].Clear()
+            d[0].dim_param = "N"
+
+        consts = {init.name: init for init in graph.initializer}
+        for node in graph.node:
+            if node.op_type != "Reshape" or len(node.input) < 2 or node.input[1] not in consts:
+                continue
+            init = consts[node.input[1]]
+            shape = numpy_helper.to_array(init).copy()
+            if shape.size and shape[0] == fixed:
+                shape[0] = 0
+                init.CopyFrom(numpy_helper.from_array(shape, init.name))
+
+        # 중간 value_info의 고정 shape는 지워서 shape 추론이 다시 하게 한다
+        del graph.value_info[:]
+        onnx.checker.check_model(model)
+
+        tmp_path = f"{out_path}.{os.getpid()}.tmp"
+        onnx.save(model, tmp_path)
+        os.replace(tmp_path, out_path)
+        return out_path
+    except Exception:
+        return None
+
+
 class ArcFaceONNXEmbedder:
     """
     ArcFace ONNX (arcfaceresnet100-8.onnx) 임베딩 추출기.
     - 입력: aligned 112x112 BGR
     - 출력: 512-d embedding (L2 normalized)
+
+    세션 옵션:
+    - intra_op_threads / inter_op_threads: 0이면 ONNX Runtime 기본값
+    - graph_opt_level: "disable" | "basic" | "extended" | "all"
+    - execution_mode: "sequential" | "parallel"
+    - cache_optimized: 최적화된 그래프를 모델 옆에 저장해두고,
+      다음 세션 생성 때는 그 파일을 읽어서 재최적화를 건너뛴다.
+    - dynamic_batch: batch 고정 모델이면 batch 차원만 symbolic으로 바꾼 사본으로 세션을 만든다
+      (N장을 session.run 1번에 처리. 최적화 그래프 캐시도 이 사본 기준)
     """
-    def __init__(self, model_path: str, prefer_gpu: bool = True):
+    def __init__(
+        self,
+        model_path: str,
+        prefer_gpu: bool = True,
+        *,
+        intra_op_threads: int = ARCFACE_INTRA_OP_THREADS,
+        inter_op_threads: int = ARCFACE_INTER_OP_THREADS,
+        graph_opt_level: str = ARCFACE_GRAPH_OPT_LEVEL,
+        execution_mode: str = ARCFACE_EXECUTION_MODE,
+        cache_optimized: bool = ARCFACE_CACHE_OPTIMIZED,
+        dynamic_batch: bool = ARCFACE_DYNAMIC_BATCH,
+    ):
         import onnxruntime as ort
 
         if not os.path.exists(model_path):
             raise FileNotFoundError(f"ArcFace ONNX not found: {model_path}")
+        self.model_path = model_path
+        if dynamic_batch:
+            model_path = _dynamic_batch_model(model_path) or model_path
+        self.session_model_path = model_path
+        if graph_opt_level not in _GRAPH_OPT_LEVELS:
+            raise ValueError(f"Unknown graph_opt_level: {graph_opt_level}")
+        if execution_mode not in _EXECUTION_MODES:
+            raise ValueError(f"Unknown execution_mode: {execution_mode}")
 
         providers = ort.get_available_providers()
         use_cuda = prefer_gpu and ("CUDAExecutionProvider" in providers)
@@ -123,33 +372,100 @@ class ArcFaceONNXEmbedder:
             else ["CPUExecutionProvider"]
         )
 
-        self.sess = ort.InferenceSession(model_path, providers=self.providers)
-        self.in_name = self.sess.get_inputs()[0].name
-        self.out_name = self.sess.get_outputs()[0].name
+        so = ort.SessionOptions()
+        if intra_op_threads > 0:
+            so.intra_op_num_threads = int(intra_op_threads)
+        if inter_op_threads > 0:
+            so.inter_op_num_threads = int(inter_op_threads)
+        so.execution_mode = getattr(ort.ExecutionMode, _EXECUTION_MODES[execution_mode])
+
+        opt_level = getattr(ort.GraphOptimizationLevel, _GRAPH_OPT_LEVELS[graph_opt_level])
+
+        # 최적화 그래프 캐시: provider별로 노드 구성이 달라질 수 있어 파일명에 포함
+        self.optimized_model_path = None
+        load_path = model_path
+        tmp_path = None
+        if cache_optimized and graph_opt_level != "disable":
+            stem, _ = os.path.splitext(model_path)
+            device_tag = "cuda" if use_cuda else "cpu"
+            self.optimized_model_path = f"{stem}.opt-{graph_opt_level}-{device_tag}.onnx"
+
+            if os.path.exists(self.optimized_model_path):
+                # 이미 최적화된 그래프 → 재최적화 생략
+                load_path = self.optimized_model_path
+                opt_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+            else:
+                tmp_path = f"{self.optimized_model_path}.{os.getpid()}.tmp"
+                so.optimized_model_filepath = tmp_path
 
-    def embed_aligned(self, aligned_bgr_112: np.ndarray) -> np.ndarray:
-        # BGR -> RGB
-        rgb = cv2.cvtColor(aligned_bgr_112, cv2.COLOR_BGR2RGB).astype(np.float32)
+        so.graph_optimization_level = opt_level
 
-        # ArcFace 관행 전처리: (img - 127.5) / 128.0
-        rgb = (rgb - 127.5) / 128.0
+        self.sess = ort.InferenceSession(load_path, sess_options=so, providers=self.providers)
 
-        x = np.transpose(rgb, (2, 0, 1))[None, ...].astype(np.float32)  # (1,3,112,112)
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.replace(tmp_path, self.optimized_model_path)
 
-        y = self.sess.run([self.out_name], {self.in_name: x})[0]  # (1,512) or similar
-        emb = y[0].astype(np.float32)
+        inp = self.sess.get_inputs()[0]
+        self.in_name = inp.name
+        self.out_name = self.sess.get_outputs()[0].name
 
-        # L2 normalize
-        emb = emb / (np.linalg.norm(emb) + 1e-8)
+        # 동적 batch 모델(또는 dynamic_batch로 바꾼 사본)이면 한 번에,
+        # batch가 고정된 채로 남았으면(onnx 패키지 없음 / 변환 실패) 행 단위로 나눠서 run 한다.
+        batch_dim = inp.shape[0] if inp.shape else None
+        self.fixed_batch = batch_dim if isinstance(batch_dim, int) and batch_dim > 0 else None
+
+    @staticmethod
+    def preprocess_batch(aligned_bgr_112: list[np.ndarray]) -> np.ndarray:
+        """
+        aligned 112x112 BGR 리스트 -> (N,3,112,112) float32
+        BGR -> RGB, ArcFace 관행 전처리: (img - 127.5) / 128.0
+        """
+        stack = np.stack(aligned_bgr_112, axis=0)  # (N,112,112,3) uint8
+        x = stack[..., ::-1].transpose(0, 3, 1, 2).astype(np.float32)
+        x -= 127.5
+        x *= 1.0 / 128.0
+        return np.ascontiguousarray(x)
+
+    def embed_batch(self, aligned_bgr_112: list[np.ndarray]) -> np.ndarray:
+        """
+        N장의 aligned crop -> (N,512) L2 normalized embedding
+        """
+        if len(aligned_bgr_112) == 0:
+            return np.zeros((0, 512), dtype=np.float32)
+
+        x = self.preprocess_batch(aligned_bgr_112)
+
+        if self.fixed_batch is None:
+            y = self.sess.run([self.out_name], {self.in_name: x})[0]
+        else:
+            step = self.fixed_batch
+            parts = []
+            for start in range(0, len(x), step):
+                chunk = x[start:start + step]
+                n = len(chunk)
+                if n < step:
+                    # 고정 batch에 맞춰 마지막 청크를 0으로 채운다
+                    chunk = np.concatenate([chunk, np.zeros((step - n,) + chunk.shape[1:], np.float32)])
+                parts.append(self.sess.run([self.out_name], {self.in_name: chunk})[0][:n])
+            y = np.concatenate(parts, axis=0)
+
+        emb = y.reshape(len(x), -1).astype(np.float32)
+
+        # L2 normalize (행 단위)
+        emb /= (np.linalg.norm(emb, axis=1, keepdims=True) + 1e-8)
         return emb
 
+    def embed_aligned(self, aligned_bgr_112: np.ndarray) -> np.ndarray:
+        return self.embed_batch([aligned_bgr_112])[0]
+
 
 def extract_identity_embeddings(
     job_path: str,
     report: dict,
     *,
-    device: str = "cuda",
+    device: str | None = None,
     sim_threshold: float = 0.38,
+    on_item: Callable[[], None] | None = None,
 ) -> Dict:
     """
     (InsightFace 대신) MediaPipe 정렬 + ArcFace ONNX로 임베딩을 뽑고, 동일인 체크(outlier 제거) 후 저장한다.
@@ -160,71 +476,145 @@ def extract_identity_embeddings(
         - identity_embedding.npy (512,)
         - meta.json
         - identity_ref.jpg
+
+    on_item: 이미지 1장 처리마다 호출 (진행률 / 취소 확인용)
     """
     rel_paths = _list_background_white_images(job_path, report)
     if not rel_paths:
         raise RuntimeError("No background white images found. Run /background first.")
 
-    prefer_gpu = (device.lower() == "cuda")
-    arcface_path = os.path.join("third_party", "BiRefNet", "weights", "arcfaceresnet100-8.onnx")
+    from core.io.frame_cache import get_frame_cache
+    from core.pipeline.model_registry import get_arcface_embedder, get_face_mesh_aligner
+
+    device = resolve_embedding_device(device)
+    prefer_gpu = (device == "cuda")
 
-    aligner = FaceMeshAligner()
-    embedder = ArcFaceONNXEmbedder(arcface_path, prefer_gpu=prefer_gpu)
+    # 레지스트리의 공유 인스턴스 사용 (요청마다 InferenceSession / FaceMesh 재생성 방지)
+    aligner = get_face_mesh_aligner()
+    embedder = get_arcface_embedder(prefer_gpu=prefer_gpu)
+
+    # 저장된 랜드마크가 있으면 FaceMesh 재탐지 없이 5점 좌표를 바로 쓴다
+    stored_src5 = _stored_src5(job_path, report, aligner)
+
+    # background 단계가 캐시에 넣어둔 흰 배경 결과를 재사용
+    frame_cache = get_frame_cache()
 
     items = []
+    aligned_crops = []
+    aligned_items = []
     for rel in rel_paths:
-        abs_path = os.path.join(job_path, rel)
-        img = cv2.imread(abs_path)
+        img = frame_cache.get_bgr(job_path, rel)
         if img is None:
             items.append({"src": rel, "ok": False, "reason": "Failed to read image"})
-            continue
+        else:
+            src5 = stored_src5.get(rel)
+            aligned, a_meta = aligner.align_112(img, src5=src5)
+            if a_meta is not None:
+                a_meta["landmark_source"] = "stored" if src5 is not None else "facemesh"
+            if aligned is None:
+                items.append({"src": rel, "ok": False, "reason": "Face alignment failed (FaceMesh/affine)"})
+            else:
+                item = {"src": rel, "ok": True, "align": a_meta}
+                items.append(item)
+                aligned_crops.append(aligned)
+                aligned_items.append(item)
+
+        if on_item is not None:
+            on_item()
+
+    return finalize_identity(
+        job_path,
+        items,
+        aligned_items,
+        aligned_crops,
+        embedder=embedder,
+        inputs=rel_paths,
+        device=device,
+        sim_threshold=sim_threshold,
+    )
+
+
+def _embed_with_cache(embedder: "ArcFaceONNXEmbedder", crops: list[np.ndarray]) -> tuple[np.ndarray, int]:
+    """
+    job 간 결과 캐시(core/io/result_cache.py)를 먼저 찾고, 없는 crop만 배치 임베딩한다.
+    key: 정렬된 112x112 crop 픽셀 내용 + ArcFace 모델 파일 (INT8이면 다른 파일명)
+    반환: ((N,512) embedding, cache hit 수)
+    """
+    from core.io.result_cache import array_to_bytes, bytes_to_array, cache_key, get_result_cache, sha256_bytes
 
-        aligned, a_meta = aligner.align_112(img)
-        if aligned is None:
-            items.append({"src": rel, "ok": False, "reason": "Face alignment failed (FaceMesh/affine)"})
-            continue
+    cache = get_result_cache()
+    if not cache.enabled or not crops:
+        return embedder.embed_batch(crops), 0
+
+    params = {"model": os.path.basename(getattr(embedder, "model_path", "arcface"))}
+    keys = [cache_key(sha256_bytes(np.ascontiguousarray(c).tobytes()), params) for c in crops]
+
+    embeds = np.zeros((len(crops), 512), dtype=np.float32)
+    missing = []
+    for i, key in enumerate(keys):
+        files = cache.get("embedding", key)
+        if files is None:
+            missing.append(i)
+        else:
+            embeds[i] = bytes_to_array(files["embedding.npy"])
+
+    if missing:
+        fresh = embedder.embed_batch([crops[i] for i in missing])
+        for i, emb in zip(missing, fresh):
+            embeds[i] = emb
+            cache.put("embedding", keys[i], {"embedding.npy": array_to_bytes(emb)})
+
+    return embeds, len(crops) - len(missing)
 
-        try:
-            emb = embedder.embed_aligned(aligned)
-        except Exception as e:
-            items.append({"src": rel, "ok": False, "reason": f"ONNX infer error: {type(e).__name__}: {e}"})
-            continue
 
-        items.append({
-            "src": rel,
-            "ok": True,
-            "embedding": emb.astype(np.float32),
-            "align": a_meta,
-        })
+def finalize_identity(
+    job_path: str,
+    items: list[dict],
+    aligned_items: list[dict],
+    aligned_crops: list[np.ndarray],
+    *,
+    embedder: "ArcFaceONNXEmbedder",
+    inputs: list[str],
+    device: str,
+    sim_threshold: float,
+) -> Dict:
+    """
+    정렬된 crop들을 배치 임베딩 → 동일인 필터 → embeddings/ 저장.
+    extract_identity_embeddings(파일 기반)과 /run(메모리 기반)이 같이 쓴다.
+
+    items: 전체 항목 (실패 포함, "src" 키 필수)
+    aligned_items / aligned_crops: 정렬에 성공한 항목과 그 112x112 crop (같은 순서)
+    """
+    from core.pipeline.model_registry import quantized_model_info
+
+    # 정렬된 crop 전체를 (N,3,112,112) 한 번으로 추론 (job 간 결과 캐시에 있는 crop은 제외)
+    try:
+        embeds_all, cache_hits = _embed_with_cache(embedder, aligned_crops)
+    except Exception as e:
+        cache_hits = 0
+        for item in aligned_items:
+            item["ok"] = False
+            item["reason"] = f"ONNX infer error: {type(e).__name__}: {e}"
+    else:
+        for item, emb in zip(aligned_items, embeds_all):
+            item["embedding"] = emb
 
     ok_items = [x for x in items if x.get("ok")]
     if len(ok_items) < 3:
         raise RuntimeError(f"Too few embeddings extracted: {len(ok_items)} (need >= 3)")
 
-    # reference: 첫 ok를 ref로
-    ref_emb = ok_items[0]["embedding"]
+    # 전체 NxN 유사도로 기준(medoid / density 덩어리의 기준 사진)을 고른다 → 첫 번째 사진이 다른 사람이어도 흔들리지 않음
+    t0 = time.perf_counter()
+    filt = identity_filter(np.stack([x["embedding"] for x in ok_items], axis=0), sim_threshold)
+    filter_ms = round((time.perf_counter() - t0) * 1000.0, 2)
 
     kept, dropped = [], []
-    for x in ok_items:
-        sim = _cosine_sim(x["embedding"], ref_emb)
-        x["sim_to_ref"] = sim
-        if sim >= sim_threshold:
-            kept.append(x)
-        else:
-            dropped.append(x)
-
-    # fallback: 평균 임베딩 기준으로 한 번 더
-    if len(kept) < 3:
-        mean_emb = np.mean([x["embedding"] for x in ok_items], axis=0).astype(np.float32)
-        mean_emb = mean_emb / (np.linalg.norm(mean_emb) + 1e-8)
-        kept, dropped = [], []
-        for x in ok_items:
-            sim = _cosine_sim(x["embedding"], mean_emb)
-            x["sim_to_ref"] = sim
-            if sim >= sim_threshold:
-                kept.append(x)
-            else:
-                dropped.append(x)
+    for i, x in enumerate(ok_items):
+        x["sim_to_ref"] = round(float(filt["sim_to_ref"][i]), 4)
+        x["mean_sim"] = round(float(filt["mean_sim"][i]), 4)
+        x["neighbors"] = int(filt["neighbors"][i])
+        (kept if filt["kept"][i] else dropped).append(x)
+    ref_item = ok_items[filt["ref"]]
 
     if len(kept) < 3:
         raise RuntimeError(f"Identity check failed: kept={len(kept)} (<3). Try lowering sim_threshold.")
@@ -249,8 +639,8 @@ def extract_identity_embeddings(
     with open(os.path.join(emb_dir, "meta.json"), "w", encoding="utf-8") as f:
         json.dump(meta, f, ensure_ascii=False, indent=2)
 
-    # 대표 이미지 저장(kept 첫 번째)
-    ref_rel = kept[0]["src"]
+    # 대표 이미지 저장 (medoid / density 덩어리의 기준 사진)
+    ref_rel = ref_item["src"]
     ref_img = cv2.imread(os.path.join(job_path, ref_rel))
     if ref_img is not None:
         cv2.imwrite(os.path.join(emb_dir, "identity_ref.jpg"), ref_img)
@@ -260,9 +650,23 @@ def extract_identity_embeddings(
         "device": device,
         "providers": getattr(embedder, "providers", []),
         "sim_threshold": sim_threshold,
-        "inputs": rel_paths,
+        "filter": {"method": filt["method"], "reference": ref_rel, "ms": filter_ms},
+        "inputs": inputs,
         "kept": [x["src"] for x in kept],
         "dropped": [x["src"] for x in dropped],
+        "scores": [
+            {
+                "src": x["src"],
+                "sim_to_ref": x["sim_to_ref"],
+                "mean_sim": x["mean_sim"],
+                "neighbors": x["neighbors"],
+                "kept": x["src"] in kept_set,
+            }
+            for x in ok_items
+        ],
+        "cache_hits": cache_hits,
+        # INT8 ArcFace면 양자화 때 기록한 fp32 대비 cosine drift (아니면 None)
+        "quantized": quantized_model_info().get("arcface"),
         "saved": {
             "embeddings_npy": "embeddings/face_embeds.npy",
             "identity_embedding_npy": "embeddings/identity_embedding.npy",
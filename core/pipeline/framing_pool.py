@@ -0,0 +1,334 @@
+# prepare_faces 병렬 프레이밍 실행기
+# 12MP 원본에 대한 warpAffine / crop / resize (+ 필요 시 FaceMesh)는 CPU를 많이 쓰므로
+# 사진 단위로 여러 프로세스에 나눠서 처리한다. 결과는 항상 입력(index) 순서로 돌려준다.
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable
+
+# 프레이밍 워커 수
+FRAMING_WORKERS = int(os.environ.get("IDPHOTO_FRAMING_WORKERS", str(os.cpu_count() or 1)))
+
+# "process": 워커 프로세스 (GIL 영향 없음, 품질 검사가 캐시에 둔 원본 프레임은 같이 넘기고 없으면 다시 디코딩)
+# "thread" : 서버 프로세스 안의 스레드 (프레임 캐시의 디코딩 결과를 재사용, 결과도 캐시에 넣음)
+FRAMING_EXECUTOR = os.environ.get("IDPHOTO_FRAMING_EXECUTOR", "process")
+
+
+def _init_worker() -> None:
+    # 워커 여러 개가 동시에 도니까 OpenCV 내부 스레드는 1개로 제한 (oversubscription 방지)
+    import cv2
+    cv2.setNumThreads(1)
+
+
+def frame_one(task: dict) -> dict:
+    """
+    워커 프로세스에서 사진 1장을 프레이밍한다. (pickle 가능한 최상위 함수)
+
+    task:
+      job_path, idx, filename, landmarks (저장된 랜드마크 상대경로 또는 None),
+      params (frame_id_photo 인자), write_debug (랜드마크 디버그 이미지 저장 여부),
+      use_cache (프레임 캐시 사용 여부, thread 모드에서만 True),
+      image (process 모드에서 서버 프로세스의 프레임 캐시에 있던 원본 BGR, 없으면 None → 디코딩)
+    반환:
+      idx, filename, out_name(실패 시 None), reason, framing(dict), timings_ms(dict)
+    """
+    import cv2
+    from core.face.landmarks_store import (
+        load_landmarks,
+        normalized_transform,
+        save_framing_transform,
+        save_landmarks,
+    )
+    from core.pipeline.face_align import draw_landmarks, frame_id_photo
+    from core.face.detect_proxy import DETECT_MAX_SIDE
+
+    t_start = time.perf_counter()
+    job_path = task["job_path"]
+    idx = task["idx"]
+    filename = task["filename"]
+    result = {
+        "idx": idx,
+        "filename": filename,
+        "out_name": None,
+        "reason": None,
+        "framing": None,
+        "timings_ms": {},
+    }
+    timings = result["timings_ms"]
+
+    # create_job에서 저장한 랜드마크 재사용 (없으면 frame_id_photo가 FaceMesh를 돌린다)
+    landmarks_rel = task.get("landmarks")
+    stored_landmarks = load_landmarks(job_path, landmarks_rel)
+
+    use_cache = task.get("use_cache", False)
+    upload_rel = os.path.join("uploads", filename)
+
+    t0 = time.perf_counter()
+    image_rgb = None
+    if task.get("image") is not None:
+        image = task["image"]
+    elif use_cache:
+        from core.io.frame_cache import get_frame_cache
+
+        cache = get_frame_cache()
+        if stored_landmarks is None and DETECT_MAX_SIDE <= 0:
+            image, image_rgb = cache.get_rgb(job_path, upload_rel)
+        else:
+            image = cache.get_bgr(job_path, upload_rel)
+    else:
+        image = cv2.imread(os.path.join(job_path, upload_rel))
+    timings["decode"] = round((time.perf_counter() - t0) * 1000.0, 1)
+    if image is None:
+        result["reason"] = "Failed to read image"
+        return result
+
+    t0 = time.perf_counter()
+    try:
+        framed, landmarks, M = frame_id_photo(
+            image, landmarks=stored_landmarks, image_rgb=image_rgb, **task["params"]
+        )
+    except Exception as e:
+        result["reason"] = f"align error: {type(e).__name__}: {e}"
+        return result
+    finally:
+        timings["frame"] = round((time.perf_counter() - t0) * 1000.0, 1)
+
+    if framed is None:
+        result["reason"] = "Framing failed"
+        return result
+
+    faces_dir = os.path.join(job_path, "faces")
+    out_name = f"idphoto_{idx:02d}_{filename}"
+
+    t0 = time.perf_counter()
+    cv2.imwrite(os.path.join(faces_dir, out_name), framed)
+    if use_cache:
+        # background 단계가 idphoto를 다시 디코딩하지 않도록 (PNG 등 무손실 저장일 때만 캐시에 들어간다)
+        cache.put(job_path, os.path.join("faces", out_name), framed)
+
+    # 랜드마크 + 프레이밍 변환 저장 → embedding 단계에서 재탐지 없이 5점 좌표를 구한다
+    if stored_landmarks is None:
+        landmarks_rel = save_landmarks(job_path, filename, landmarks)
+    h, w = image.shape[:2]
+    transform_rel = save_framing_transform(job_path, out_name, normalized_transform(M, w, h))
+
+    # 디버깅: 원본에 랜드마크 표기 저장(확인용)
+    if task.get("write_debug", True):
+        landmark_img = draw_landmarks(image, landmarks)
+        landmark_name = f"landmark_{idx:02d}_{filename}"
+        cv2.imwrite(os.path.join(faces_dir, landmark_name), landmark_img)
+    timings["encode"] = round((time.perf_counter() - t0) * 1000.0, 1)
+
+    result["out_name"] = out_name
+    result["framing"] = {
+        "source": filename,
+        "landmarks": landmarks_rel,
+        "transform": transform_rel,
+    }
+    timings["total"] = round((time.perf_counter() - t_start) * 1000.0, 1)
+    return result
+
+
+_pool: Executor | None = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> Executor:
+    """
+    풀은 한 번 만들어 재사용한다. (워커별 FaceMesh도 그대로 유지됨)
+    process 모드는 torch / 브로커 스레드가 떠 있는 서버 프로세스를 fork하지 않도록 spawn을 쓴다.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                if FRAMING_EXECUTOR == "thread":
+                    _pool = ThreadPoolExecutor(
+                        max_workers=max(1, FRAMING_WORKERS),
+                        thread_name_prefix="framing",
+                    )
+                else:
+                    _pool = ProcessPoolExecutor(
+                        max_workers=max(1, FRAMING_WORKERS),
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_init_worker,
+                    )
+    return _pool
+
+
+def _framing_cache_key(upload_sha: str | None, params: dict) -> str | None:
+    """업로드 해시 + 프레이밍 파라미터 + 랜드마크 탐지 설정 → 결과 캐시 key"""
+    from core.face.detect_mp import FACE_DETECTOR_BACKEND
+    from core.face.detect_proxy import DETECT_MAX_SIDE
+    from core.io.result_cache import cache_key
+
+    if not upload_sha:
+        return None
+    return cache_key(upload_sha, {
+        **params,
+        "detector": FACE_DETECTOR_BACKEND,
+        "detect_max_side": DETECT_MAX_SIDE,
+    })
+
+
+def framing_fingerprint(upload_sha: str | None, params: dict, idx: int, landmarks_rel: str | None) -> str | None:
+    """job 안 사진 1장의 프레이밍 fingerprint (결과 파일명이 idx에 따라 바뀌므로 idx도 포함)"""
+    from core.report.checkpoints import fingerprint
+
+    key = _framing_cache_key(upload_sha, params)
+    if key is None:
+        return None
+    return fingerprint(framing=key, idx=idx, landmarks=landmarks_rel)
+
+
+def _restore_cached(task: dict, files: dict[str, bytes]) -> dict:
+    """결과 캐시 항목으로 frame_one과 같은 결과를 만든다 (디코딩 / FaceMesh / warp 없음)"""
+    from core.face.landmarks_store import load_landmarks, save_framing_transform, save_landmarks
+    from core.io.result_cache import bytes_to_array
+
+    t_start = time.perf_counter()
+    job_path = task["job_path"]
+    filename = task["filename"]
+    out_name = f"idphoto_{task['idx']:02d}_{filename}"
+
+    with open(os.path.join(job_path, "faces", out_name), "wb") as f:
+        f.write(files["face.jpg"])
+
+    landmarks_rel = task.get("landmarks")
+    if load_landmarks(job_path, landmarks_rel) is None:
+        landmarks_rel = save_landmarks(job_path, filename, bytes_to_array(files["landmarks.npy"]))
+    transform_rel = save_framing_transform(job_path, out_name, bytes_to_array(files["transform.npy"]))
+
+    return {
+        "idx": task["idx"],
+        "filename": filename,
+        "out_name": out_name,
+        "reason": None,
+        "framing": {
+            "source": filename,
+            "landmarks": landmarks_rel,
+            "transform": transform_rel,
+        },
+        "cached": True,
+        "timings_ms": {"total": round((time.perf_counter() - t_start) * 1000.0, 1)},
+    }
+
+
+def _store_cached(job_path: str, key: str, result: dict) -> None:
+    """새로 프레이밍한 결과(프레이밍 이미지 / 랜드마크 / 변환)를 결과 캐시에 넣는다"""
+    from core.io.result_cache import get_result_cache
+
+    framing = result["framing"]
+    files = {}
+    for name, rel in (
+        ("face.jpg", os.path.join("faces", result["out_name"])),
+        ("landmarks.npy", framing["landmarks"]),
+        ("transform.npy", framing["transform"]),
+    ):
+        try:
+            with open(os.path.join(job_path, rel), "rb") as f:
+                files[name] = f.read()
+        except (OSError, TypeError):
+            return
+    get_result_cache().put("framing", key, files)
+
+
+def frame_faces(
+    job_path: str,
+    passed: list[dict],
+    params: dict,
+    *,
+    write_debug: bool = True,
+    upload_hashes: dict[str, str] | None = None,
+    reuse: dict[str, dict] | None = None,
+    on_result: Callable[[dict], None] | None = None,
+    on_item: Callable[[], None] | None = None,
+) -> list[dict]:
+    """
+    quality_check.passed 목록을 병렬로 프레이밍한다.
+    upload_hashes: {업로드 파일명: sha256}. 주면 job 간 결과 캐시(core/io/result_cache.py)를 먼저 찾고,
+      hit이면 워커에 넘기지 않는다 (결과에 "cached": True, 랜드마크 디버그 이미지는 만들지 않음)
+    reuse: {업로드 파일명: 이전 실행 결과}. 이 job의 파일이 그대로 남아 있는 사진 (checkpoint, 결과에 "reused": True)
+    on_result: 새로 만든 결과 1장마다 바로 호출 (checkpoint 기록용, reuse 항목은 호출하지 않음)
+    반환: frame_one 결과 리스트 (passed 순서 = idx 순서)
+    """
+    from core.io.result_cache import get_result_cache
+
+    os.makedirs(os.path.join(job_path, "faces"), exist_ok=True)
+    result_cache = get_result_cache()
+    upload_hashes = upload_hashes if result_cache.enabled else None
+
+    tasks = [
+        {
+            "job_path": job_path,
+            "idx": idx,
+            "filename": item["filename"],
+            "landmarks": item.get("landmarks"),
+            "params": params,
+            "write_debug": write_debug,
+            "use_cache": FRAMING_EXECUTOR == "thread",
+        }
+        for idx, item in enumerate(passed, start=1)
+    ]
+
+    if FRAMING_EXECUTOR != "thread":
+        from core.io.frame_cache import get_frame_cache
+
+        # 품질 검사가 디코딩해둔 원본 프레임이 있으면 워커 프로세스로 같이 보낸다 (JPEG 디코딩보다 복사가 싸다)
+        frame_cache = get_frame_cache()
+    else:
+        frame_cache = None
+
+    pool = _get_pool()
+    keys = [_framing_cache_key((upload_hashes or {}).get(t["filename"]), params) for t in tasks]
+    futures = []
+    for task, key in zip(tasks, keys):
+        prev = (reuse or {}).get(task["filename"])
+        if prev is not None:
+            done = Future()
+            done.set_result({**prev, "reused": True, "timings_ms": {}})
+            futures.append(done)
+            continue
+        files = result_cache.get("framing", key) if key else None
+        if files is not None:
+            done = Future()
+            done.set_result(_restore_cached(task, files))
+            futures.append(done)
+        else:
+            if frame_cache is not None:
+                task["image"] = frame_cache.peek_bgr(job_path, os.path.join("uploads", task["filename"]))
+            futures.append(pool.submit(frame_one, task))
+
+    results = []
+    try:
+        for fut, key in zip(futures, keys):
+            res = fut.result()
+            if res.get("reused"):
+                results.append(res)
+                if on_item is not None:
+                    on_item()
+                continue
+            if key and res["out_name"] is not None and not res.get("cached"):
+                _store_cached(job_path, key, res)
+            if on_result is not None:
+                on_result(res)
+            results.append(res)
+            if on_item is not None:
+                on_item()
+    except BaseException:
+        # 취소/실패 시 아직 시작 안 한 사진은 버린다
+        for fut in futures:
+            fut.cancel()
+        raise
+
+    return results
+
+
+def shutdown_framing_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
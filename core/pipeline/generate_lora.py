@@ -1,10 +1,17 @@
 import os
 import hashlib
-from typing import Any
+import threading
+from typing import Any, Callable
 
 import numpy as np
 from PIL import Image, ImageDraw
 
+from core.pipeline.job_runner import StageCancelled
+
+
+# 공유 SD 파이프라인에 LoRA를 붙이는 동안 다른 요청이 끼어들지 않도록 잠금
+_sd_pipeline_lock = threading.Lock()
+
 
 def _resolve_device(device: str | None) -> str:
     if device:
@@ -25,6 +32,7 @@ def _mock_generate(
     width: int,
     height: int,
     seed: int | None,
+    on_item: Callable[[], None] | None = None,
 ) -> dict[str, Any]:
     os.makedirs(out_dir, exist_ok=True)
 
@@ -49,6 +57,9 @@ def _mock_generate(
         img.save(out_path)
         outputs.append(f"generated/{out_name}")
 
+        if on_item is not None:
+            on_item()
+
     return {
         "method": "mock_fallback",
         "warning": "diffusers is not installed; mock images were generated for pipeline validation.",
@@ -70,28 +81,26 @@ def generate_with_lora(
     height: int = 768,
     seed: int | None = None,
     device: str | None = None,
+    on_item: Callable[[], None] | None = None,
 ) -> dict[str, Any]:
     """
     LoRA 이미지 생성 진입점.
 
     - diffusers가 설치된 환경에서는 Stable Diffusion + LoRA 로 실제 생성 시도
     - 미설치 환경에서는 API 파이프라인 검증용 mock 이미지를 생성
+    - on_item: 이미지 1장 생성마다 호출 (진행률 / 취소 확인용)
     """
     out_dir = os.path.join(job_path, "generated")
     runtime_device = _resolve_device(device)
 
     try:
         import torch
-        from diffusers import StableDiffusionPipeline
+        from core.pipeline.model_registry import get_sd_pipeline
 
         dtype = torch.float16 if runtime_device == "cuda" else torch.float32
 
-        pipe = StableDiffusionPipeline.from_single_file(base_model, torch_dtype=dtype)
-        pipe = pipe.to(runtime_device)
-        pipe.load_lora_weights(os.path.dirname(lora_path), weight_name=os.path.basename(lora_path))
-
-        if runtime_device == "cuda":
-            pipe.enable_xformers_memory_efficient_attention()
+        # 베이스 파이프라인은 레지스트리에서 공유하고, LoRA만 요청마다 붙였다 뗀다
+        pipe = get_sd_pipeline(base_model, runtime_device, dtype)
 
         os.makedirs(out_dir, exist_ok=True)
         outputs: list[str] = []
@@ -100,21 +109,29 @@ def generate_with_lora(
         if seed is not None:
             gen = gen.manual_seed(seed)
 
-        for i in range(num_images):
-            image = pipe(
-                prompt=prompt,
-                negative_prompt=negative_prompt,
-                num_inference_steps=steps,
-                guidance_scale=guidance_scale,
-                width=width,
-                height=height,
-                generator=gen,
-            ).images[0]
-
-            out_name = f"gen_{i+1:02d}.png"
-            out_path = os.path.join(out_dir, out_name)
-            image.save(out_path)
-            outputs.append(f"generated/{out_name}")
+        with _sd_pipeline_lock:
+            pipe.load_lora_weights(os.path.dirname(lora_path), weight_name=os.path.basename(lora_path))
+            try:
+                for i in range(num_images):
+                    image = pipe(
+                        prompt=prompt,
+                        negative_prompt=negative_prompt,
+                        num_inference_steps=steps,
+                        guidance_scale=guidance_scale,
+                        width=width,
+                        height=height,
+                        generator=gen,
+                    ).images[0]
+
+                    out_name = f"gen_{i+1:02d}.png"
+                    out_path = os.path.join(out_dir, out_name)
+                    image.save(out_path)
+                    outputs.append(f"generated/{out_name}")
+
+                    if on_item is not None:
+                        on_item()
+            finally:
+                pipe.unload_lora_weights()
 
         return {
             "method": "diffusers_stable_diffusion_lora",
@@ -132,6 +149,8 @@ def generate_with_lora(
             "outputs": outputs,
         }
 
+    except StageCancelled:
+        raise
     except Exception:
         mock = _mock_generate(
             out_dir=out_dir,
@@ -141,6 +160,7 @@ def generate_with_lora(
             width=width,
             height=height,
             seed=seed,
+            on_item=on_item,
         )
         mock.update({
             "device": runtime_device,
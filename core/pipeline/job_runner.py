@@ -0,0 +1,224 @@
+# Job 단계(stage) 비동기 실행기
+# MediaPipe / torch / ONNX 같은 blocking 작업을 이벤트 루프에서 직접 돌리지 않고
+# 단계별 워커 풀(ThreadPoolExecutor)에 넘긴 뒤, 상태/진행률을 폴링할 수 있게 한다.
+import os
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+# 단계별 워커 수 (환경변수 IDPHOTO_WORKERS_<STAGE> 로 덮어쓰기 가능)
+# (사진 단위 병렬화는 각 단계 안의 풀에서 하므로 여기 값은 동시에 처리할 job 수)
+_DEFAULT_STAGE_WORKERS = {
+    "quality_check": 2,
+    "prepare_faces": 1,
+    "background": 2,
+    "embedding": 1,
+    "generate": 1,
+    # /run 전체 파이프라인 (job 하나가 단계를 차례로 돈다)
+    "run": 2,
+}
+
+# 끝난 단계 기록(결과 포함)을 얼마나 보관할지. 넘으면 오래된 것부터 지운다 (결과는 report에 남아 있음)
+FINISHED_RUN_TTL_S = float(os.environ.get("IDPHOTO_FINISHED_RUN_TTL_S", "3600"))
+MAX_FINISHED_RUNS = int(os.environ.get("IDPHOTO_MAX_FINISHED_RUNS", "256"))
+
+
+def _stage_workers(stage: str) -> int:
+    default = _DEFAULT_STAGE_WORKERS.get(stage, 1)
+    return max(1, int(os.environ.get(f"IDPHOTO_WORKERS_{stage.upper()}", str(default))))
+
+
+class StageCancelled(Exception):
+    """실행 중인 단계가 취소 요청을 받았을 때 StageContext가 던진다."""
+
+
+class StageAlreadyRunning(Exception):
+    """같은 job의 같은 단계가 이미 대기/실행 중일 때"""
+
+
+class StageContext:
+    """
+    단계 함수에 넘겨주는 실행 컨텍스트.
+    - set_total(n): 처리할 전체 개수
+    - step(): 1개 처리 완료 (취소 요청이 있으면 StageCancelled)
+    - check_cancelled(): 취소 여부만 확인
+    """
+
+    def __init__(self, job_id: str, stage: str):
+        self.job_id = job_id
+        self.stage = stage
+        self.cancel_event = threading.Event()
+        self.done = 0
+        self.total = 0
+
+    def set_total(self, total: int) -> None:
+        self.total = int(total)
+        self.check_cancelled()
+
+    def step(self, n: int = 1) -> None:
+        self.done += n
+        self.check_cancelled()
+
+    def check_cancelled(self) -> None:
+        if self.cancel_event.is_set():
+            raise StageCancelled(f"{self.stage} cancelled")
+
+
+class _StageRun:
+    def __init__(self, ctx: StageContext):
+        self.ctx = ctx
+        self.state = "queued"
+        self.submitted_at = time.time()
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self.error: str | None = None
+        self.result: Any = None
+        self.future: Future | None = None
+
+    def to_dict(self) -> dict:
+        return {
+            "state": self.state,
+            "progress": {"done": self.ctx.done, "total": self.ctx.total},
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+            "result": self.result,
+        }
+
+
+_ACTIVE_STATES = ("queued", "running")
+
+
+class JobRunner:
+    """
+    단계별 워커 풀 + (job_id, stage) 상태 테이블.
+
+    submit(job_id, stage, fn, *args) 로 등록하면 fn(ctx, *args)가 워커에서 실행된다.
+    """
+
+    def __init__(self):
+        self._executors: dict[str, ThreadPoolExecutor] = {}
+        self._runs: dict[tuple[str, str], _StageRun] = {}
+        self._lock = threading.Lock()
+
+    def _executor(self, stage: str) -> ThreadPoolExecutor:
+        ex = self._executors.get(stage)
+        if ex is None:
+            ex = ThreadPoolExecutor(
+                max_workers=_stage_workers(stage),
+                thread_name_prefix=f"stage-{stage}",
+            )
+            self._executors[stage] = ex
+        return ex
+
+    def _evict_finished(self) -> None:
+        """TTL이 지났거나 개수 제한을 넘은 끝난 단계 기록을 지운다 (self._lock 안에서 호출)"""
+        finished = sorted(
+            (run.finished_at, key)
+            for key, run in self._runs.items()
+            if run.state not in _ACTIVE_STATES and run.finished_at is not None
+        )
+        cutoff = time.time() - FINISHED_RUN_TTL_S
+        excess = len(finished) - max(0, MAX_FINISHED_RUNS)
+        for i, (finished_at, key) in enumerate(finished):
+            if i < excess or finished_at < cutoff:
+                del self._runs[key]
+
+    def submit(self, job_id: str, stage: str, fn: Callable[..., Any], *args, **kwargs) -> dict:
+        with self._lock:
+            self._evict_finished()
+            prev = self._runs.get((job_id, stage))
+            if prev is not None and prev.state in _ACTIVE_STATES:
+                raise StageAlreadyRunning(f"{stage} is already {prev.state} for job {job_id}")
+
+            run = _StageRun(StageContext(job_id, stage))
+            self._runs[(job_id, stage)] = run
+            run.future = self._executor(stage).submit(self._execute, run, fn, args, kwargs)
+
+        return self.handle(job_id, stage)
+
+    def _execute(self, run: _StageRun, fn, args, kwargs) -> None:
+        ctx = run.ctx
+        if ctx.cancel_event.is_set():
+            run.state = "cancelled"
+            run.finished_at = time.time()
+            return
+
+        run.state = "running"
+        run.started_at = time.time()
+        try:
+            run.result = fn(ctx, *args, **kwargs)
+            run.state = "done"
+        except StageCancelled:
+            run.state = "cancelled"
+        except Exception as e:
+            run.state = "failed"
+            # HTTPException 같은 경우 detail에 원인이 들어있다
+            detail = getattr(e, "detail", None)
+            run.error = f"{type(e).__name__}: {detail if detail is not None else e}"
+        finally:
+            run.finished_at = time.time()
+
+    def handle(self, job_id: str, stage: str) -> dict:
+        run = self._runs.get((job_id, stage))
+        return {
+            "job_id": job_id,
+            "stage": stage,
+            "state": run.state if run else None,
+            "status_url": f"/api/jobs/{job_id}/status",
+        }
+
+    def status(self, job_id: str) -> dict:
+        with self._lock:
+            self._evict_finished()
+            return {
+                stage: run.to_dict()
+                for (jid, stage), run in self._runs.items()
+                if jid == job_id
+            }
+
+    def cancel(self, job_id: str, stage: str) -> bool:
+        """대기 중이면 바로 취소, 실행 중이면 다음 step()에서 멈추도록 표시"""
+        with self._lock:
+            run = self._runs.get((job_id, stage))
+            if run is None or run.state not in _ACTIVE_STATES:
+                return False
+            run.ctx.cancel_event.set()
+            if run.future is not None and run.future.cancel():
+                run.state = "cancelled"
+                run.finished_at = time.time()
+            return True
+
+    def shutdown(self) -> None:
+        with self._lock:
+            for run in self._runs.values():
+                if run.state in _ACTIVE_STATES:
+                    run.ctx.cancel_event.set()
+            executors = list(self._executors.values())
+            self._executors.clear()
+
+        for ex in executors:
+            ex.shutdown(wait=False, cancel_futures=True)
+
+
+_runner: JobRunner | None = None
+_runner_lock = threading.Lock()
+
+
+def get_job_runner() -> JobRunner:
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                _runner = JobRunner()
+    return _runner
+
+
+def shutdown_job_runner() -> None:
+    global _runner
+    with _runner_lock:
+        if _runner is not None:
+            _runner.shutdown()
+            _runner = None
@@ -0,0 +1,261 @@
+# 요청 간 동적 배칭(dynamic batching) 매팅 브로커
+# 여러 job이 동시에 /background 를 호출해도 각자 forward를 돌리지 않고,
+# 한 장 단위 요청을 큐에 모아 max_batch 장이 차거나 max_wait_ms 가 지나면 한 번에 추론한다.
+# 호출자는 Future로 자기 이미지의 alpha만 돌려받는다.
+import os
+import time
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable
+
+import numpy as np
+
+from core.pipeline.background_birefnet import MATTING_MAX_BATCH, MATTING_TIER, tier_min_hw
+
+# 첫 요청이 들어온 뒤 배치를 채우기 위해 최대 얼마나 기다릴지 (ms)
+BROKER_MAX_WAIT_MS = float(os.environ.get("IDPHOTO_MATTING_MAX_WAIT_MS", "10"))
+
+# 통계용으로 보관할 최근 대기시간 샘플 수
+_STATS_WINDOW = 1024
+
+
+class _Request:
+    __slots__ = ("bgr", "future", "enqueued_at")
+
+    def __init__(self, bgr: np.ndarray):
+        self.bgr = bgr
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+def _percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    return float(np.percentile(np.asarray(values, dtype=np.float64), q))
+
+
+class MattingBroker:
+    """
+    BiRefNetMatting 앞단의 in-process 추론 브로커.
+
+    - submit(bgr) -> Future[alpha]
+    - predict_alpha / predict_alpha_batch 를 제공하므로
+      remove_bg_and_compose_white(_batch) 에 matting 대신 그대로 넘길 수 있다.
+    - matting_provider는 배치마다 1번, 요청을 모으기 전에 호출된다. (레지스트리가 모델을 내렸다가 다시 올려도 안전)
+    - tier: 매팅 해상도 단계. 브로커 1개는 한 단계만 처리한다 (배치 안의 입력 크기를 맞추기 위해)
+    """
+
+    def __init__(
+        self,
+        matting_provider: Callable[[], object],
+        *,
+        max_batch: int = MATTING_MAX_BATCH,
+        max_wait_ms: float = BROKER_MAX_WAIT_MS,
+        tier: str = MATTING_TIER,
+    ):
+        self.matting_provider = matting_provider
+        self.tier = tier
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait_s = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self._stop = threading.Event()
+        # submit의 closed 확인 + enqueue와 close의 closed 표시를 직렬화 (close 이후에 들어간 Future가 남지 않게)
+        self._submit_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+        self._batches = 0
+        self._items = 0
+        self._slots = 0
+        self._wait_ms: deque = deque(maxlen=_STATS_WINDOW)
+        self._infer_ms: deque = deque(maxlen=_STATS_WINDOW)
+
+        self._worker = threading.Thread(target=self._run, name="matting-broker", daemon=True)
+        self._worker.start()
+
+    # --------------------------------------------------------
+    # 호출자 API
+    # --------------------------------------------------------
+
+    def submit(self, bgr: np.ndarray) -> Future:
+        req = _Request(bgr)
+        with self._submit_lock:
+            if self._stop.is_set():
+                raise RuntimeError("MattingBroker is closed")
+            self._queue.put(req)
+        return req.future
+
+    def predict_alpha(self, bgr: np.ndarray) -> np.ndarray:
+        return self.submit(bgr).result()
+
+    def predict_alpha_batch(self, bgrs: list[np.ndarray], batch_size: int | None = None) -> list[np.ndarray]:
+        # batch_size는 브로커가 정하므로 무시 (matting 인터페이스 호환용)
+        futures = [self.submit(b) for b in bgrs]
+        return [f.result() for f in futures]
+
+    def close(self, timeout: float | None = 5.0) -> None:
+        with self._submit_lock:
+            self._stop.set()
+        self._worker.join(timeout=timeout)
+
+        # 남은 요청은 실패로 돌려준다 (close 이후에는 submit이 들어오지 않으므로 여기서 비우면 끝)
+        while True:
+            try:
+                req = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if req.future.set_running_or_notify_cancel():
+                req.future.set_exception(RuntimeError("MattingBroker closed before processing"))
+
+    # --------------------------------------------------------
+    # 워커
+    # --------------------------------------------------------
+
+    def _batch_limit(self, matting) -> int:
+        """이번 배치 최대 장수. 메모리(auto_batch_size)로 max_batch보다 줄어들 수 있다"""
+        limit = self.max_batch
+        auto = getattr(matting, "auto_batch_size", None)
+        if callable(auto):
+            try:
+                limit = max(1, min(limit, auto(*tier_min_hw(self.tier))))
+            except Exception:
+                pass
+        return limit
+
+    def _collect(self, first: _Request, limit: int) -> list[_Request]:
+        """첫 요청 기준 deadline까지 limit장을 채운다 (모델 로딩 등으로 이미 지났으면 큐에 있는 것만)"""
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait_s
+        while len(batch) < limit:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            # 모델은 배치마다 1번, 모으기 전에 가져온다 (레지스트리가 내렸다가 다시 올려도 안전)
+            try:
+                matting = self.matting_provider()
+            except Exception as e:
+                if first.future.set_running_or_notify_cancel():
+                    first.future.set_exception(e)
+                continue
+
+            limit = self._batch_limit(matting)
+            batch = self._collect(first, limit)
+
+            # 취소된 Future는 건너뛴다
+            batch = [r for r in batch if r.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            waits = [(started - r.enqueued_at) * 1000.0 for r in batch]
+
+            try:
+                alphas = matting.predict_alpha_batch(
+                    [r.bgr for r in batch], batch_size=len(batch), tier=self.tier
+                )
+                for r, alpha in zip(batch, alphas):
+                    r.future.set_result(alpha)
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0].future.set_exception(e)
+                else:
+                    # 어느 이미지가 문제인지 가리기 위해 한 장씩 다시 시도
+                    for r in batch:
+                        try:
+                            r.future.set_result(matting.predict_alpha(r.bgr, tier=self.tier))
+                        except Exception as e1:
+                            r.future.set_exception(e1)
+
+            infer_ms = (time.perf_counter() - started) * 1000.0
+
+            with self._stats_lock:
+                self._batches += 1
+                self._items += len(batch)
+                # 채울 수 있었던 자리만 센다 (auto_batch_size로 줄어든 경우 포함)
+                self._slots += limit
+                self._wait_ms.extend(waits)
+                self._infer_ms.append(infer_ms)
+
+    # --------------------------------------------------------
+    # 통계
+    # --------------------------------------------------------
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            waits = list(self._wait_ms)
+            infers = list(self._infer_ms)
+            return {
+                "tier": self.tier,
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait_s * 1000.0,
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batches,
+                "items": self._items,
+                "mean_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+                "fill_ratio": round(self._items / self._slots, 3) if self._slots else 0.0,
+                "wait_ms": {
+                    "p50": round(_percentile(waits, 50), 2),
+                    "p95": round(_percentile(waits, 95), 2),
+                    "max": round(max(waits), 2) if waits else 0.0,
+                },
+                "infer_ms": {
+                    "p50": round(_percentile(infers, 50), 2),
+                    "p95": round(_percentile(infers, 95), 2),
+                },
+            }
+
+
+_brokers: dict[str, MattingBroker] = {}
+_broker_lock = threading.Lock()
+
+
+def get_matting_broker(tier: str | None = None) -> MattingBroker:
+    """
+    레지스트리의 공유 BiRefNet 앞에 붙는 프로세스 전역 브로커 (해상도 단계별 1개)
+    tier가 잘못된 이름이면 ValueError
+    """
+    from core.pipeline.background_birefnet import tier_scale
+
+    tier = tier or MATTING_TIER
+    tier_scale(tier)
+
+    broker = _brokers.get(tier)
+    if broker is None:
+        with _broker_lock:
+            broker = _brokers.get(tier)
+            if broker is None:
+                from core.pipeline.model_registry import get_birefnet_matting
+
+                broker = MattingBroker(get_birefnet_matting, tier=tier)
+                _brokers[tier] = broker
+    return broker
+
+
+def matting_broker_stats() -> dict:
+    """만들어진 브로커들의 통계 {tier: stats}"""
+    with _broker_lock:
+        brokers = dict(_brokers)
+    return {tier: b.stats() for tier, b in brokers.items()}
+
+
+def shutdown_matting_broker() -> None:
+    with _broker_lock:
+        for broker in _brokers.values():
+            broker.close()
+        _brokers.clear()
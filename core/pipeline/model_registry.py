@@ -0,0 +1,396 @@
+# 프로세스 전역 모델 레지스트리
+# BiRefNet / ArcFace / FaceMesh / Stable Diffusion 같은 무거운 모델을 한 번만 로딩해서
+# 여러 요청(job)이 같은 인스턴스를 공유하도록 한다.
+# - 서버 시작 시(lifespan) 설정된 모델을 미리 로딩(warm preload)
+# - RAM 예산을 넘으면 가장 오래 안 쓴 모델부터 내린다(LRU eviction)
+# - 모델별 로딩 시간 / 상주 메모리 크기를 기록한다
+import os
+import gc
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable
+
+# 모델 파일 기본 경로 (api_routes / face_embedding 에서 쓰던 경로와 동일)
+BIREFNET_WEIGHT_PATH = os.path.join("third_party", "BiRefNet", "weights", "model.safetensors")
+ARCFACE_MODEL_PATH = os.path.join("third_party", "BiRefNet", "weights", "arcfaceresnet100-8.onnx")
+
+# INT8 변환 모델을 로딩할 모델 목록 (콤마 구분, scripts/quantize_models.py로 미리 만들어 둬야 한다)
+# 예: IDPHOTO_QUANTIZED_MODELS="arcface,birefnet"
+QUANTIZED_MODELS = [
+    x.strip()
+    for x in os.environ.get("IDPHOTO_QUANTIZED_MODELS", "").split(",")
+    if x.strip()
+]
+
+# 모델 상주 메모리 예산 (MB). 넘으면 LRU 순서로 내린다.
+MODEL_RAM_BUDGET_MB = int(os.environ.get("IDPHOTO_MODEL_RAM_BUDGET_MB", "8192"))
+
+# 서버 시작 시 미리 로딩할 모델 목록 (콤마 구분)
+# 예: IDPHOTO_PRELOAD_MODELS="birefnet,arcface,facemesh_aligner"
+PRELOAD_MODELS = [
+    x.strip()
+    for x in os.environ.get("IDPHOTO_PRELOAD_MODELS", "birefnet,arcface,facemesh_aligner").split(",")
+    if x.strip()
+]
+
+
+def quantized_path(model_path: str) -> str:
+    """fp32 ONNX 경로 → INT8 ONNX 경로 (같은 폴더)"""
+    stem, _ = os.path.splitext(model_path)
+    return f"{stem}.int8.onnx"
+
+
+def _rss_bytes() -> int | None:
+    """현재 프로세스 RSS(바이트). psutil이 없으면 None"""
+    try:
+        import psutil
+    except Exception:
+        return None
+    return int(psutil.Process(os.getpid()).memory_info().rss)
+
+
+def _torch_module_nbytes(module) -> int:
+    total = 0
+    for p in module.parameters():
+        total += p.numel() * p.element_size()
+    for b in module.buffers():
+        total += b.numel() * b.element_size()
+    return total
+
+
+def estimate_model_nbytes(obj: Any) -> int | None:
+    """
+    모델 객체의 상주 메모리 크기를 추정한다.
+    - torch nn.Module: 파라미터 + 버퍼 크기
+    - diffusers 파이프라인: components 안의 nn.Module 합
+    - 래퍼 객체: .model 속성을 따라가서 계산
+    추정 불가하면 None (이 경우 로딩 전후 RSS 차이를 쓴다)
+    """
+    if hasattr(obj, "parameters") and hasattr(obj, "buffers"):
+        return _torch_module_nbytes(obj)
+
+    components = getattr(obj, "components", None)
+    if isinstance(components, dict):
+        total = 0
+        for comp in components.values():
+            if comp is not None and hasattr(comp, "parameters") and hasattr(comp, "buffers"):
+                total += _torch_module_nbytes(comp)
+        return total
+
+    inner = getattr(obj, "model", None)
+    if inner is not None and inner is not obj:
+        return estimate_model_nbytes(inner)
+
+    return None
+
+
+class _Entry:
+    def __init__(self, key: str, value: Any, load_time_s: float, nbytes: int):
+        self.key = key
+        self.value = value
+        self.load_time_s = load_time_s
+        self.nbytes = nbytes
+        self.hits = 0
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+
+
+class ModelRegistry:
+    """
+    key -> 모델 인스턴스를 관리하는 LRU 레지스트리.
+
+    get(key, loader)로 요청하면:
+      - 이미 로딩돼 있으면 그대로 반환(hit)
+      - 없으면 loader()로 로딩하고, 예산 초과 시 오래된 모델부터 내린다
+    """
+
+    def __init__(self, ram_budget_bytes: int):
+        self.ram_budget_bytes = int(ram_budget_bytes)
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: dict[str, threading.Lock] = {}
+        self.evictions = 0
+
+    def _load_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            lock = self._load_locks.get(key)
+            if lock is None:
+                lock = threading.Lock()
+                self._load_locks[key] = lock
+            return lock
+
+    def _touch(self, key: str) -> Any | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry.hits += 1
+            entry.last_used = time.time()
+            self._entries.move_to_end(key)
+            return entry.value
+
+    def get(
+        self,
+        key: str,
+        loader: Callable[[], Any],
+        *,
+        size_fn: Callable[[Any], int | None] | None = None,
+    ) -> Any:
+        value = self._touch(key)
+        if value is not None:
+            return value
+
+        # 같은 모델을 여러 스레드가 동시에 로딩하지 않도록 key별 잠금
+        with self._load_lock(key):
+            value = self._touch(key)
+            if value is not None:
+                return value
+
+            rss_before = _rss_bytes()
+            t0 = time.perf_counter()
+            value = loader()
+            load_time_s = time.perf_counter() - t0
+
+            nbytes = (size_fn or estimate_model_nbytes)(value)
+            if nbytes is None:
+                rss_after = _rss_bytes()
+                if rss_before is not None and rss_after is not None:
+                    nbytes = max(0, rss_after - rss_before)
+                else:
+                    nbytes = 0
+
+            with self._lock:
+                self._entries[key] = _Entry(key, value, load_time_s, int(nbytes))
+                self._entries.move_to_end(key)
+                self._evict_over_budget(keep=key)
+
+            return value
+
+    def _evict_over_budget(self, keep: str) -> None:
+        """(lock 보유 상태에서 호출) 예산을 넘는 동안 LRU 모델을 내린다. 방금 로딩한 모델은 유지."""
+        evicted = False
+        while self.resident_bytes() > self.ram_budget_bytes:
+            victim = next((k for k in self._entries if k != keep), None)
+            if victim is None:
+                break
+            del self._entries[victim]
+            self.evictions += 1
+            evicted = True
+
+        if evicted:
+            _release_memory()
+
+    def evict(self, key: str) -> bool:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self.evictions += 1
+        _release_memory()
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        _release_memory()
+
+    def resident_bytes(self) -> int:
+        return sum(e.nbytes for e in self._entries.values())
+
+    def stats(self) -> dict:
+        with self._lock:
+            models = [
+                {
+                    "key": e.key,
+                    "load_time_s": round(e.load_time_s, 3),
+                    "resident_mb": round(e.nbytes / (1024 * 1024), 1),
+                    "hits": e.hits,
+                    "loaded_at": e.loaded_at,
+                    "last_used": e.last_used,
+                }
+                for e in self._entries.values()
+            ]
+            return {
+                "ram_budget_mb": round(self.ram_budget_bytes / (1024 * 1024), 1),
+                "resident_mb": round(self.resident_bytes() / (1024 * 1024), 1),
+                "evictions": self.evictions,
+                "models": models,
+            }
+
+
+def _release_memory() -> None:
+    gc.collect()
+    try:
+        import torch
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except Exception:
+        pass
+
+
+_registry: ModelRegistry | None = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ModelRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry(MODEL_RAM_BUDGET_MB * 1024 * 1024)
+    return _registry
+
+
+# ------------------------------------------------------------
+# 모델별 getter (core/pipeline/* 에서 공유 인스턴스를 받아갈 때 사용)
+# ------------------------------------------------------------
+
+def get_birefnet_matting(
+    weight_path: str = BIREFNET_WEIGHT_PATH,
+    device: str | None = None,
+    engine: str | None = None,
+):
+    from core.pipeline.background_birefnet import (
+        MATTING_CHANNELS_LAST,
+        MATTING_DTYPE,
+        MATTING_ENGINE,
+        create_matting,
+        onnx_export_path,
+    )
+
+    if not os.path.exists(weight_path):
+        raise FileNotFoundError(f"BiRefNet weight not found: {weight_path}")
+
+    if "birefnet" in QUANTIZED_MODELS:
+        # INT8 모델은 ONNX Runtime CPU 엔진으로만 돌린다
+        int8_path = quantized_path(onnx_export_path(weight_path))
+        if not os.path.exists(int8_path):
+            raise FileNotFoundError(f"BiRefNet INT8 model not found: {int8_path} (run scripts/quantize_models.py)")
+        key = f"birefnet:{os.path.abspath(int8_path)}:cpu:onnx-int8"
+        return get_registry().get(key, lambda: create_matting(weight_path, engine="onnx", onnx_path=int8_path))
+
+    engine = engine or MATTING_ENGINE
+    if engine == "torch":
+        variant = f"{MATTING_DTYPE}{'-cl' if MATTING_CHANNELS_LAST else ''}"
+        key = f"birefnet:{os.path.abspath(weight_path)}:{device or 'auto'}:torch-{variant}"
+    else:
+        key = f"birefnet:{os.path.abspath(weight_path)}:cpu:{engine}"
+    return get_registry().get(key, lambda: create_matting(weight_path, engine=engine, device=device))
+
+
+def birefnet_variant(engine: str | None = None) -> str:
+    """
+    현재 설정으로 로딩되는 BiRefNet 변형 이름 (결과 캐시 key 등에 사용)
+    예: "torch-fp32", "torch-bf16-cl", "onnx", "onnx-int8"
+    """
+    from core.pipeline.background_birefnet import MATTING_CHANNELS_LAST, MATTING_DTYPE, MATTING_ENGINE
+
+    if "birefnet" in QUANTIZED_MODELS:
+        return "onnx-int8"
+    engine = engine or MATTING_ENGINE
+    if engine == "torch":
+        return f"torch-{MATTING_DTYPE}{'-cl' if MATTING_CHANNELS_LAST else ''}"
+    return engine
+
+
+def resolve_matting_tier(requested: str | None = None) -> tuple[str, str]:
+    """
+    요청한 매팅 tier를 검증하고(잘못된 이름이면 ValueError) (요청 tier, 실제로 쓸 tier)를 돌려준다.
+    INT8 BiRefNet은 입력 크기가 export한 800x640으로 고정이라 medium / low로 줄여도 다시 full 크기로 추론하게 되므로
+    (guided upsampling까지 더해져 full보다 느리다) full로 내린다.
+    """
+    from core.pipeline.background_birefnet import MATTING_TIER, tier_scale
+
+    requested = requested or MATTING_TIER
+    tier_scale(requested)
+    if "birefnet" in QUANTIZED_MODELS:
+        return requested, "full"
+    return requested, requested
+
+
+def quantized_model_info() -> dict[str, dict]:
+    """
+    IDPHOTO_QUANTIZED_MODELS로 켠 모델별 INT8 파일 경로 + 양자화 때 기록한 정확도(*.int8.onnx.json)
+    반환: {"arcface" | "birefnet": {"int8_model", "accuracy"(없으면 None)}}
+    """
+    from core.pipeline.quantize import load_metrics
+
+    paths = {}
+    if "arcface" in QUANTIZED_MODELS:
+        paths["arcface"] = quantized_path(ARCFACE_MODEL_PATH)
+    if "birefnet" in QUANTIZED_MODELS:
+        from core.pipeline.background_birefnet import onnx_export_path
+
+        paths["birefnet"] = quantized_path(onnx_export_path(BIREFNET_WEIGHT_PATH))
+    return {name: {"int8_model": path, "accuracy": load_metrics(path)} for name, path in paths.items()}
+
+
+def get_arcface_embedder(model_path: str = ARCFACE_MODEL_PATH, prefer_gpu: bool | None = None):
+    from core.pipeline.face_embedding import ArcFaceONNXEmbedder, resolve_embedding_device
+
+    if prefer_gpu is None:
+        prefer_gpu = resolve_embedding_device() == "cuda"
+
+    if "arcface" in QUANTIZED_MODELS:
+        model_path = quantized_path(model_path)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"ArcFace INT8 model not found: {model_path} (run scripts/quantize_models.py)")
+
+    key = f"arcface:{os.path.abspath(model_path)}:{'gpu' if prefer_gpu else 'cpu'}"
+    return get_registry().get(
+        key,
+        lambda: ArcFaceONNXEmbedder(model_path, prefer_gpu=prefer_gpu),
+        size_fn=lambda _: os.path.getsize(model_path),
+    )
+
+
+def get_face_mesh_aligner():
+    from core.pipeline.face_embedding import FaceMeshAligner
+
+    return get_registry().get("facemesh_aligner", FaceMeshAligner)
+
+
+def get_sd_pipeline(base_model: str, device: str, dtype):
+    """Stable Diffusion 베이스 파이프라인 (LoRA는 호출 측에서 load/unload)"""
+    from diffusers import StableDiffusionPipeline
+
+    key = f"sd:{os.path.abspath(base_model)}:{device}:{dtype}"
+
+    def _load():
+        pipe = StableDiffusionPipeline.from_single_file(base_model, torch_dtype=dtype)
+        pipe = pipe.to(device)
+        if device == "cuda":
+            pipe.enable_xformers_memory_efficient_attention()
+        return pipe
+
+    return get_registry().get(key, _load)
+
+
+_PRELOADERS: dict[str, Callable[[], Any]] = {
+    "birefnet": get_birefnet_matting,
+    "arcface": get_arcface_embedder,
+    "facemesh_aligner": get_face_mesh_aligner,
+}
+
+
+def preload_models(names: list[str] | None = None) -> dict:
+    """
+    서버 시작 시 호출. 설정된 모델들을 미리 로딩한다.
+    모델 파일이 없는 등 로딩에 실패해도 서버는 뜨도록 에러만 기록한다.
+    """
+    names = PRELOAD_MODELS if names is None else names
+    result = {"loaded": [], "failed": []}
+
+    for name in names:
+        fn = _PRELOADERS.get(name)
+        if fn is None:
+            result["failed"].append({"name": name, "reason": "Unknown model name"})
+            continue
+        try:
+            fn()
+            result["loaded"].append(name)
+        except Exception as e:
+            result["failed"].append({"name": name, "reason": f"{type(e).__name__}: {e}"})
+
+    return result
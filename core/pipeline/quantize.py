@@ -0,0 +1,164 @@
+# CPU 배포용 INT8 양자화 (ONNX Runtime static quantization)
+# job 하나의 실제 입력(ArcFace: 정렬된 112x112 crop, BiRefNet: 프레이밍된 얼굴)으로 calibration 해서
+# 모델 옆에 *.int8.onnx 를 만들고, fp32 대비 정확도 차이를 같이 기록한다.
+#   - ArcFace : 임베딩 cosine drift (fp32 임베딩과의 cosine, 1에 가까울수록 좋음)
+#   - BiRefNet: alpha IoU (0.5 이진화) / 평균 절대 차이
+# 런타임에서는 IDPHOTO_QUANTIZED_MODELS 에 들어 있는 모델만 INT8 파일을 로딩한다 (model_registry.py).
+import os
+import json
+import tempfile
+
+import numpy as np
+
+from core.pipeline.background_birefnet import (
+    BiRefNetONNXMatting,
+    _prepare_batch,
+    export_birefnet_onnx,
+)
+from core.pipeline.face_embedding import ArcFaceONNXEmbedder
+from core.pipeline.model_registry import quantized_path
+
+
+class _ArrayReader:
+    """onnxruntime.quantization CalibrationDataReader (입력 배열 목록을 1장씩 넘긴다)"""
+
+    def __init__(self, input_name: str, arrays: list[np.ndarray]):
+        self.input_name = input_name
+        self._it = iter(arrays)
+
+    def get_next(self):
+        x = next(self._it, None)
+        return None if x is None else {self.input_name: x}
+
+
+def _quantize_static(fp32_path: str, int8_path: str, input_name: str, arrays: list[np.ndarray], *, per_channel: bool) -> None:
+    """shape inference 전처리 → QDQ static quantization. 완성된 파일만 int8_path에 남긴다."""
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    out_dir = os.path.dirname(os.path.abspath(int8_path))
+    with tempfile.TemporaryDirectory(dir=out_dir) as tmp:
+        pre_path = os.path.join(tmp, "pre.onnx")
+        quant_pre_process(fp32_path, pre_path)
+
+        tmp_out = os.path.join(tmp, "int8.onnx")
+        quantize_static(
+            pre_path,
+            tmp_out,
+            _ArrayReader(input_name, arrays),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=per_channel,
+            calibrate_method=CalibrationMethod.MinMax,
+        )
+        os.replace(tmp_out, int8_path)
+
+
+def _write_metrics(int8_path: str, metrics: dict) -> None:
+    with open(f"{int8_path}.json", "w", encoding="utf-8") as f:
+        json.dump(metrics, f, ensure_ascii=False, indent=2)
+
+
+def load_metrics(int8_path: str) -> dict | None:
+    """quantize_*()가 남긴 정확도 기록 (없으면 None)"""
+    try:
+        with open(f"{int8_path}.json", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def quantize_arcface(
+    model_path: str,
+    calib_crops: list[np.ndarray],
+    eval_crops: list[np.ndarray] | None = None,
+    *,
+    int8_path: str | None = None,
+) -> dict:
+    """
+    ArcFace INT8 변환 + cosine drift 측정
+    calib_crops / eval_crops: 정렬된 112x112 BGR crop (eval이 없으면 calibration 세트로 평가)
+    반환: {"model", "int8_model", "calib_images", "eval_images", "cosine": {mean, min, p05}, "identity_cosine"}
+    """
+    if not calib_crops:
+        raise ValueError("No aligned crops for calibration")
+    int8_path = int8_path or quantized_path(model_path)
+
+    fp32 = ArcFaceONNXEmbedder(model_path, prefer_gpu=False, cache_optimized=False)
+    arrays = [ArcFaceONNXEmbedder.preprocess_batch([c]) for c in calib_crops]
+    _quantize_static(model_path, int8_path, fp32.in_name, arrays, per_channel=True)
+
+    int8 = ArcFaceONNXEmbedder(int8_path, prefer_gpu=False, cache_optimized=False)
+    crops = eval_crops or calib_crops
+    e32 = fp32.embed_batch(crops)
+    e8 = int8.embed_batch(crops)
+    cos = np.sum(e32 * e8, axis=1)  # 둘 다 L2 normalized
+
+    # job 단위 identity 임베딩(평균)이 얼마나 바뀌는지
+    m32, m8 = e32.mean(axis=0), e8.mean(axis=0)
+    identity_cos = float(np.dot(m32, m8) / (np.linalg.norm(m32) * np.linalg.norm(m8) + 1e-8))
+
+    metrics = {
+        "model": model_path,
+        "int8_model": int8_path,
+        "calib_images": len(calib_crops),
+        "eval_images": len(crops),
+        "cosine": {
+            "mean": round(float(cos.mean()), 5),
+            "min": round(float(cos.min()), 5),
+            "p05": round(float(np.percentile(cos, 5)), 5),
+        },
+        "identity_cosine": round(identity_cos, 5),
+    }
+    _write_metrics(int8_path, metrics)
+    return metrics
+
+
+def quantize_birefnet(
+    weight_path: str,
+    calib_faces: list[np.ndarray],
+    eval_faces: list[np.ndarray] | None = None,
+    *,
+    int8_path: str | None = None,
+    height: int = 800,
+    width: int = 640,
+) -> dict:
+    """
+    BiRefNet INT8 변환 (ONNX export가 없으면 먼저 export) + alpha IoU 측정
+    calib_faces / eval_faces: 프레이밍된 얼굴 BGR (600x800)
+    반환: {"model", "int8_model", "calib_images", "eval_images", "iou": {mean, min}, "mad": {mean, max}}
+    """
+    if not calib_faces:
+        raise ValueError("No framed faces for calibration")
+
+    fp32_path = export_birefnet_onnx(weight_path, height=height, width=width)
+    int8_path = int8_path or quantized_path(fp32_path)
+
+    fp32 = BiRefNetONNXMatting(weight_path, onnx_path=fp32_path, height=height, width=width)
+    arrays = [_prepare_batch([bgr], height, width)[0] for bgr in calib_faces]
+    # conv 가중치가 많은 모델이라 per-channel로 정확도를 지킨다
+    _quantize_static(fp32_path, int8_path, fp32.in_name, arrays, per_channel=True)
+
+    int8 = BiRefNetONNXMatting(weight_path, onnx_path=int8_path, height=height, width=width)
+    faces = eval_faces or calib_faces
+    a32 = fp32.predict_alpha_batch(faces, batch_size=1)
+    a8 = int8.predict_alpha_batch(faces, batch_size=1)
+
+    ious, mads = [], []
+    for x, y in zip(a32, a8):
+        mx, my = x >= 0.5, y >= 0.5
+        union = np.logical_or(mx, my).sum()
+        ious.append(float(np.logical_and(mx, my).sum() / union) if union else 1.0)
+        mads.append(float(np.abs(x - y).mean()))
+
+    metrics = {
+        "model": fp32_path,
+        "int8_model": int8_path,
+        "calib_images": len(calib_faces),
+        "eval_images": len(faces),
+        "iou": {"mean": round(float(np.mean(ious)), 5), "min": round(float(np.min(ious)), 5)},
+        "mad": {"mean": round(float(np.mean(mads)), 5), "max": round(float(np.max(mads)), 5)},
+    }
+    _write_metrics(int8_path, metrics)
+    return metrics
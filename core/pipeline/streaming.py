@@ -0,0 +1,225 @@
+# 한 번에 끝나는 스트리밍 파이프라인 (/api/jobs/{job_id}/run)
+# 업로드 전체를 품질 검사(+ 중복 제거)한 뒤, 남은 사진 1장씩 frame -> matte -> embed 순서로 메모리 안에서 흘려보낸다.
+# 단계별 실행과 달리 중간 결과를 디스크에 쓰고 다시 디코딩하지 않으며,
+# 최종 산출물(증명사진, 배경 제거 결과, 임베딩)만 인코딩해서 저장한다.
+# (품질 검사 preview, 랜드마크 디버그 이미지는 만들지 않는다)
+import os
+from collections import deque
+from typing import Callable, Iterable, Iterator
+
+import cv2
+
+from core.face.landmarks_store import (
+    normalized_transform,
+    project_points,
+    save_framing_transform,
+    save_landmarks,
+)
+from core.face.dedupe import dedupe_passed
+from core.face.quality import iter_check_uploads
+from core.pipeline.bg_outputs import write_outputs
+from core.pipeline.face_align import frame_id_photo
+
+
+def _iter_checked(
+    job_path: str,
+    filenames: list[str],
+    detect_fn,
+    results: dict,
+    on_item: Callable[[], None],
+) -> Iterator[dict]:
+    """
+    1) 디코딩 + 얼굴 품질 검사 (워커 풀 병렬, 순서 유지). 통과한 사진만 다음 단계로 넘긴다.
+    중복은 단계별 실행(create_job)과 같은 규칙(dedupe_passed: 그룹마다 가장 선명한 1장)으로 고르므로
+    모든 사진의 검사가 끝난 뒤에 내보낸다. 이미지는 들고 있지 않고, 남긴 사진만 프레임 캐시에서 다시 꺼낸다.
+    """
+    from core.io.frame_cache import get_frame_cache
+
+    passed = []
+    landmarks = {}
+    for entry, main_face, _ in iter_check_uploads(job_path, filenames, detect_fn, write_preview=False):
+        if "reason" in entry:
+            results["rejected"].append(entry)
+            on_item()
+            continue
+        passed.append(entry)
+        landmarks[entry["filename"]] = main_face.get("landmarks")
+
+    kept, duplicates = dedupe_passed(passed)
+    results["passed"].extend(kept)
+    results["duplicates"].extend(duplicates)
+    for _ in duplicates:
+        on_item()
+
+    frame_cache = get_frame_cache()
+    for entry in kept:
+        filename = entry["filename"]
+        image = frame_cache.get_bgr(job_path, os.path.join("uploads", filename))
+        if image is None:
+            results["framing_failed"].append({"filename": filename, "reason": "Failed to read image"})
+            on_item()
+            continue
+        yield {
+            "filename": filename,
+            "image": image,
+            "landmarks": landmarks[filename],
+            "landmarks_rel": entry.get("landmarks"),
+        }
+
+
+def _iter_framed(
+    items: Iterable[dict],
+    job_path: str,
+    frame_params: dict,
+    results: dict,
+    on_item: Callable[[], None],
+) -> Iterator[dict]:
+    """2) 증명사진 프레이밍. 결과(idphoto_*.jpg)는 최종 산출물이므로 저장한다."""
+    faces_dir = os.path.join(job_path, "faces")
+    os.makedirs(faces_dir, exist_ok=True)
+
+    for idx, item in enumerate(items, start=1):
+        filename = item["filename"]
+        image = item.pop("image")
+
+        try:
+            framed, landmarks, M = frame_id_photo(image, landmarks=item["landmarks"], **frame_params)
+        except Exception as e:
+            results["framing_failed"].append({
+                "filename": filename,
+                "reason": f"align error: {type(e).__name__}: {e}"
+            })
+            on_item()
+            continue
+
+        if framed is None:
+            results["framing_failed"].append({"filename": filename, "reason": "Framing failed"})
+            on_item()
+            continue
+
+        out_name = f"idphoto_{idx:02d}_{filename}"
+        cv2.imwrite(os.path.join(faces_dir, out_name), framed)
+        results["prepared_faces"].append(out_name)
+
+        landmarks_rel = item["landmarks_rel"]
+        if landmarks_rel is None:
+            landmarks_rel = save_landmarks(job_path, filename, landmarks)
+
+        h, w = image.shape[:2]
+        M_norm = normalized_transform(M, w, h)
+        results["framing"][out_name] = {
+            "source": filename,
+            "landmarks": landmarks_rel,
+            "transform": save_framing_transform(job_path, out_name, M_norm),
+        }
+
+        yield {
+            "name": out_name,
+            "framed": framed,
+            "landmarks": landmarks,
+            "M_norm": M_norm,
+        }
+
+
+def _iter_matted(items: Iterable[dict], broker, window: int, submitted: list) -> Iterator[dict]:
+    """
+    3) 매팅 요청을 브로커에 바로 넣고, 최대 window장까지 미리 보내둔 상태로 순서대로 내보낸다.
+    (앞 사진을 기다리는 동안 뒤 사진들이 같은 배치로 묶일 수 있게)
+    """
+    pending: deque = deque()
+    for item in items:
+        item["alpha_future"] = broker.submit(item["framed"])
+        submitted.append(item["alpha_future"])
+        pending.append(item)
+        if len(pending) >= window:
+            yield pending.popleft()
+
+    while pending:
+        yield pending.popleft()
+
+
+def run_streaming_pipeline(
+    job_path: str,
+    filenames: list[str],
+    *,
+    detect_fn,
+    frame_params: dict,
+    broker,
+    aligner,
+    output_profile: dict,
+    on_item: Callable[[], None] | None = None,
+) -> dict:
+    """
+    업로드 목록 전체를 generator 파이프라인으로 처리한다.
+
+    반환 dict:
+      passed / rejected / duplicates : 품질 검사 결과 (report["quality_check"]와 같은 형식)
+      prepared_faces / framing_failed / framing : 프레이밍 결과
+      bg_outputs / bg_failed         : 배경 제거 결과 (report["background"]와 같은 형식)
+      identity_items / aligned_items / aligned_crops : finalize_identity 입력
+
+    output_profile: bg_outputs.resolve_profile() 결과. 흰 배경 결과는 identity 단계가 읽으므로 항상 저장한다.
+    """
+    on_item = on_item or (lambda: None)
+
+    results = {
+        "passed": [],
+        "rejected": [],
+        "duplicates": [],
+        "prepared_faces": [],
+        "framing_failed": [],
+        "framing": {},
+        "bg_outputs": [],
+        "bg_failed": [],
+        "identity_items": [],
+        "aligned_items": [],
+        "aligned_crops": [],
+    }
+
+    submitted: list = []
+    checked = _iter_checked(job_path, filenames, detect_fn, results, on_item)
+    framed = _iter_framed(checked, job_path, frame_params, results, on_item)
+    matted = _iter_matted(framed, broker, broker.max_batch, submitted)
+
+    try:
+        for item in matted:
+            name = item["name"]
+            try:
+                alpha = item["alpha_future"].result()
+            except Exception as e:
+                results["bg_failed"].append({"src": name, "reason": f"matting error: {type(e).__name__}: {e}"})
+                on_item()
+                continue
+
+            # 4) 배경 합성 결과 저장 (최종 산출물)
+            bg_entry, rendered = write_outputs(
+                job_path, f"faces/{name}", item["framed"], alpha, output_profile, always=("white",)
+            )
+            white_bgr = rendered["white"]
+            white_rel = bg_entry["white"]
+            results["bg_outputs"].append(bg_entry)
+
+            # 5) ArcFace 정렬: 프레이밍 변환으로 5점을 바로 구한다 (FaceMesh 재탐지 없음)
+            src5 = project_points(item["M_norm"], item["landmarks"][aligner.five_point_indices])
+            aligned, a_meta = aligner.align_112(white_bgr, src5=src5)
+            if aligned is None:
+                results["identity_items"].append({
+                    "src": white_rel,
+                    "ok": False,
+                    "reason": "Face alignment failed (FaceMesh/affine)",
+                })
+            else:
+                a_meta["landmark_source"] = "stored"
+                entry = {"src": white_rel, "ok": True, "align": a_meta}
+                results["identity_items"].append(entry)
+                results["aligned_items"].append(entry)
+                results["aligned_crops"].append(aligned)
+
+            on_item()
+    except BaseException:
+        # 취소/실패 시 아직 배치에 들어가지 않은 매팅 요청은 큐에서 뺀다
+        for fut in submitted:
+            fut.cancel()
+        raise
+
+    return results
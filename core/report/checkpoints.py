@@ -0,0 +1,60 @@
+# 단계별 사진 1장 단위 fingerprint + 완료 기록 (증분 재실행 / 이어서 실행)
+# 사진마다 "이 결과를 만든 입력과 파라미터"의 fingerprint를 job 저장소(checkpoints 테이블)에 남겨두고,
+# 다시 실행할 때 fingerprint가 같고 결과 파일도 남아 있는 사진은 건너뛴다.
+#   - background가 30장 중 25장째에서 죽어도 다시 실행하면 26장째부터 돈다
+#   - 파라미터가 바뀌어도 그 파라미터에 영향을 받지 않은 사진(입력 파일 내용이 같은 사진)은 재사용한다
+# 어떤 사진을 재사용했고 어떤 사진을 다시 계산했는지는 report의 단계 섹션 "incremental"에 남긴다.
+import os
+import json
+import hashlib
+from typing import Callable
+
+from core.report.job_store import get_job_store
+
+
+def fingerprint(**parts) -> str:
+    """입력 해시 / 파라미터 → fingerprint (키 순서와 무관)"""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class StageCheckpoints:
+    """
+    한 job / 한 단계의 사진별 완료 기록.
+
+    lookup(item, fp, exists)  : fingerprint가 같고 결과가 남아 있으면 저장해둔 결과 dict, 아니면 None
+    record(item, fp, outputs) : 사진 1장 완료 즉시 기록
+    summary(items)            : {"reused": [...], "recomputed": [...]} (items 순서, 재사용하지 않은 사진은 모두 recomputed)
+                                + 이번 대상이 아닌 기록 정리
+    """
+
+    def __init__(self, job_id: str, stage: str):
+        self.job_id = job_id
+        self.stage = stage
+        self._store = get_job_store()
+        self._previous = self._store.load_checkpoints(job_id, stage)
+        self.reused: set[str] = set()
+
+    def lookup(self, item: str, fp: str, exists: Callable[[dict], bool] | None = None) -> dict | None:
+        prev = self._previous.get(item)
+        if prev is None or prev[0] != fp:
+            return None
+        outputs = prev[1]
+        if exists is not None and not exists(outputs):
+            return None
+        self.reused.add(item)
+        return outputs
+
+    def record(self, item: str, fp: str, outputs: dict) -> None:
+        self._store.put_checkpoint(self.job_id, self.stage, item, fp, outputs)
+
+    def summary(self, items: list[str]) -> dict:
+        self._store.prune_checkpoints(self.job_id, self.stage, items)
+        return {
+            "reused": [x for x in items if x in self.reused],
+            "recomputed": [x for x in items if x not in self.reused],
+        }
+
+
+def files_exist(job_path: str, rels) -> bool:
+    return all(rel and os.path.exists(os.path.join(job_path, rel)) for rel in rels)
@@ -0,0 +1,207 @@
+# Job 상태 저장소 (SQLite, WAL 모드)
+# report.json 전체를 매 단계마다 다시 읽고/쓰는 대신, report의 최상위 키(section)를
+# 한 행씩 저장해서 바뀐 section만 트랜잭션으로 갱신한다.
+#   - 서로 다른 section을 고치는 단계끼리는 동시에 저장해도 업데이트가 사라지지 않는다
+#     (같은 section은 save_report가 job lock 안에서 키 단위로 합친다)
+#   - jobs 테이블에 next_stage 같은 작은 상태를 따로 둬서 status 조회는 report 전체를 읽지 않는다
+#   - 호환용으로 report.json도 같은 모양으로 export 한다 (update_report.py)
+import os
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+# 저장소 DB 파일 경로
+JOB_DB_PATH = os.environ.get("IDPHOTO_JOB_DB", os.path.join("data", "jobs.sqlite3"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id     TEXT PRIMARY KEY,
+    next_stage TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sections (
+    job_id     TEXT NOT NULL,
+    name       TEXT NOT NULL,
+    value      TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (job_id, name)
+);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    job_id      TEXT NOT NULL,
+    stage       TEXT NOT NULL,
+    item        TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    outputs     TEXT NOT NULL,
+    updated_at  REAL NOT NULL,
+    PRIMARY KEY (job_id, stage, item)
+);
+"""
+
+
+def dump_section(value) -> str:
+    """section 값을 저장용 JSON 문자열로 (변경 감지 비교에도 같은 형식을 쓴다. 키 순서는 그대로 유지)"""
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+class JobStore:
+    """
+    job_id 단위 section 저장소.
+
+    load(job_id)                    : 전체 report dict (없으면 None)
+    write_sections(job_id, updates, deleted) : 바뀐 section만 한 트랜잭션으로 저장
+    status(job_id)                  : next_stage / 시간 정보만 (section은 읽지 않음)
+    load_checkpoints / put_checkpoint / prune_checkpoints : 단계별 사진 1장 단위 완료 기록 (core/report/checkpoints.py)
+    job_lock(job_id)                : 같은 job의 read-modify-write를 직렬화할 때 사용 (프로세스 내)
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._locks: dict[str, threading.RLock] = {}
+        self._locks_guard = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        """스레드마다 연결 1개 (sqlite3 연결은 스레드 간 공유하지 않는다)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def job_lock(self, job_id: str) -> threading.RLock:
+        with self._locks_guard:
+            lock = self._locks.get(job_id)
+            if lock is None:
+                lock = threading.RLock()
+                self._locks[job_id] = lock
+            return lock
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._conn()
+        # 쓰기 잠금을 처음부터 잡아서 다른 프로세스와 섞이지 않게
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def exists(self, job_id: str) -> bool:
+        row = self._conn().execute("SELECT 1 FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return row is not None
+
+    def load_raw(self, job_id: str) -> dict[str, str] | None:
+        """{section 이름: 저장된 JSON 문자열}. job이 없으면 None"""
+        if not self.exists(job_id):
+            return None
+        # rowid 순서 = section이 처음 저장된 순서 (report.json 키 순서 유지)
+        rows = self._conn().execute(
+            "SELECT name, value FROM sections WHERE job_id = ? ORDER BY rowid", (job_id,)
+        ).fetchall()
+        return {name: value for name, value in rows}
+
+    def load(self, job_id: str) -> dict | None:
+        raw = self.load_raw(job_id)
+        if raw is None:
+            return None
+        return {name: json.loads(value) for name, value in raw.items()}
+
+    def load_section(self, job_id: str, name: str, default=None):
+        row = self._conn().execute(
+            "SELECT value FROM sections WHERE job_id = ? AND name = ?", (job_id, name)
+        ).fetchone()
+        return json.loads(row[0]) if row is not None else default
+
+    def write_sections(
+        self,
+        job_id: str,
+        updates: dict[str, str],
+        deleted: list[str] | tuple = (),
+    ) -> None:
+        """
+        updates: {section 이름: dump_section() 결과}
+        deleted: 지울 section 이름
+        """
+        now = time.time()
+        with self.job_lock(job_id), self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, created_at, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(job_id) DO UPDATE SET updated_at = excluded.updated_at",
+                (job_id, now, now),
+            )
+            conn.executemany(
+                "INSERT INTO sections (job_id, name, value, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(job_id, name) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+                [(job_id, name, value, now) for name, value in updates.items()],
+            )
+            conn.executemany(
+                "DELETE FROM sections WHERE job_id = ? AND name = ?",
+                [(job_id, name) for name in deleted],
+            )
+            if "next_stage" in updates:
+                conn.execute(
+                    "UPDATE jobs SET next_stage = ? WHERE job_id = ?",
+                    (json.loads(updates["next_stage"]), job_id),
+                )
+
+    def load_checkpoints(self, job_id: str, stage: str) -> dict[str, tuple[str, dict]]:
+        """{item: (fingerprint, outputs)}"""
+        rows = self._conn().execute(
+            "SELECT item, fingerprint, outputs FROM checkpoints WHERE job_id = ? AND stage = ?", (job_id, stage)
+        ).fetchall()
+        return {item: (fp, json.loads(outputs)) for item, fp, outputs in rows}
+
+    def put_checkpoint(self, job_id: str, stage: str, item: str, fingerprint: str, outputs: dict) -> None:
+        """사진 1장 완료 기록. 단계 도중에 죽어도 여기까지는 다시 돌리지 않는다 (autocommit 1문장)"""
+        self._conn().execute(
+            "INSERT INTO checkpoints (job_id, stage, item, fingerprint, outputs, updated_at) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(job_id, stage, item) DO UPDATE SET fingerprint = excluded.fingerprint, "
+            "outputs = excluded.outputs, updated_at = excluded.updated_at",
+            (job_id, stage, item, fingerprint, dump_section(outputs), time.time()),
+        )
+
+    def prune_checkpoints(self, job_id: str, stage: str, keep: list[str]) -> None:
+        """이번 실행 대상이 아닌 사진의 기록 삭제"""
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT item FROM checkpoints WHERE job_id = ? AND stage = ?", (job_id, stage)
+            ).fetchall()
+            keep_set = set(keep)
+            conn.executemany(
+                "DELETE FROM checkpoints WHERE job_id = ? AND stage = ? AND item = ?",
+                [(job_id, stage, item) for (item,) in rows if item not in keep_set],
+            )
+
+    def status(self, job_id: str) -> dict | None:
+        row = self._conn().execute(
+            "SELECT next_stage, created_at, updated_at FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"next_stage": row[0], "created_at": row[1], "updated_at": row[2]}
+
+
+_store: JobStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_job_store() -> JobStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = JobStore(JOB_DB_PATH)
+    return _store
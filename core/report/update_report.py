@@ -1,17 +1,147 @@
+# report 읽기/저장
+# 실제 상태는 job 상태 저장소(core/report/job_store.py, SQLite)에 section 단위로 들어있고,
+# report.json은 같은 모양으로 내보내는 호환용 사본이다.
+import os
 import json
+import threading
+
+from core.report.job_store import dump_section, get_job_store
+
+# 저장할 때 report.json도 같이 내보낼지 (외부 도구 / 기존 스크립트 호환용, 기본 켬)
+# 끄면 report.json은 GET /api/jobs/{job_id}/report?export=true 요청 때만 만든다.
+REPORT_JSON_EXPORT = os.environ.get("IDPHOTO_REPORT_JSON_EXPORT", "1") == "1"
+
+
+class Report(dict):
+    """
+    load_report가 돌려주는 dict.
+    읽은 시점의 section별 JSON을 기억해두고, save_report 때 바뀐 section만 저장한다.
+    """
+
+    def __init__(self, data: dict, snapshot: dict[str, str]):
+        super().__init__(data)
+        self._snapshot = snapshot
+
+
+def _job_id(report_path: str) -> str:
+    # data/jobs/<job_id>/report.json
+    return os.path.basename(os.path.dirname(os.path.abspath(report_path)))
+
+
+def report_exists(report_path: str) -> bool:
+    return get_job_store().exists(_job_id(report_path)) or os.path.exists(report_path)
 
 
 def load_report(report_path: str) -> dict:
     """
-    report.json 파일을 읽어서 dict(파이썬 자료구조)로 반환한다.
+    report를 dict(파이썬 자료구조)로 반환한다.
+    저장소에 없고 report.json만 있는 예전 job이면 읽어서 저장소로 옮긴다.
+    """
+    store = get_job_store()
+    job_id = _job_id(report_path)
+
+    raw = store.load_raw(job_id)
+    if raw is None:
+        with open(report_path, "r", encoding="utf-8") as fp:
+            legacy = json.load(fp)
+        raw = {name: dump_section(value) for name, value in legacy.items()}
+        store.write_sections(job_id, raw)
+
+    data = {name: json.loads(value) for name, value in raw.items()}
+    return Report(data, raw)
+
+
+def load_report_section(report_path: str, name: str, default=None):
+    """section 1개만 읽는다 (endpoint의 선행 단계 확인용, report 전체를 역직렬화하지 않음)"""
+    store = get_job_store()
+    job_id = _job_id(report_path)
+    if not store.exists(job_id):
+        if not os.path.exists(report_path):
+            return default
+        load_report(report_path)  # 예전 job → 저장소로 옮긴다
+    return store.load_section(job_id, name, default)
+
+
+def load_report_status(report_path: str) -> dict | None:
+    """next_stage 등 작은 상태만 읽는다 (report 전체를 역직렬화하지 않음). job이 없으면 None"""
+    store = get_job_store()
+    job_id = _job_id(report_path)
+    status = store.status(job_id)
+    if status is None and os.path.exists(report_path):
+        load_report(report_path)  # 예전 job → 저장소로 옮긴 뒤 다시 조회
+        status = store.status(job_id)
+    return status
+
+
+def _merge(base, mine, theirs):
+    """
+    3-way merge: base(읽은 시점) → mine(이 단계가 고친 값), theirs(그 사이 다른 단계가 저장한 값)
+    dict면 이 단계가 바꾼 키만 theirs 위에 덮어쓴다 (안쪽 dict도 같은 방식). 그 외에는 mine
     """
-    with open(report_path, "r", encoding="utf-8") as fp:
-        return json.load(fp)
+    if not (isinstance(base, dict) and isinstance(mine, dict) and isinstance(theirs, dict)):
+        return mine
+    merged = dict(theirs)
+    for key in base.keys() - mine.keys():
+        merged.pop(key, None)
+    for key, value in mine.items():
+        if key in base and base[key] == value:
+            continue
+        merged[key] = _merge(base.get(key), value, theirs[key]) if key in theirs else value
+    return merged
 
 
 def save_report(report_path: str, report: dict) -> None:
     """
-    dict 형태의 report를 report.json에 저장한다.
+    report에서 바뀐 section만 저장소에 저장하고, report.json도 내보낸다 (IDPHOTO_REPORT_JSON_EXPORT=0이면 생략)
+    job lock 안에서 최신 값을 다시 읽어, 그 사이 다른 단계가 같은 section(summary 등)을 저장했으면
+    이 단계가 바꾼 키만 합친다. (다른 단계가 저장한 section / 키는 덮어쓰지 않는다)
     """
-    with open(report_path, "w", encoding="utf-8") as fp:
-        json.dump(report, fp, ensure_ascii=False, indent=2)
\ No newline at end of file
+    store = get_job_store()
+    job_id = _job_id(report_path)
+
+    snapshot = getattr(report, "_snapshot", {})
+    current = {name: dump_section(value) for name, value in report.items()}
+    updates = {name: value for name, value in current.items() if snapshot.get(name) != value}
+    deleted = [name for name in snapshot if name not in current]
+
+    with store.job_lock(job_id):
+        latest = store.load_raw(job_id) or {}
+        for name, value in list(updates.items()):
+            # 읽은 뒤 다른 단계가 바꾼 section이면 키 단위로 합친다
+            if name in latest and latest[name] != snapshot.get(name):
+                base = json.loads(snapshot[name]) if name in snapshot else {}
+                merged = _merge(base, report[name], json.loads(latest[name]))
+                report[name] = merged
+                updates[name] = current[name] = dump_section(merged)
+
+        if updates or deleted or not store.exists(job_id):
+            store.write_sections(job_id, updates, deleted)
+        if isinstance(report, Report):
+            report._snapshot = current
+
+        if REPORT_JSON_EXPORT:
+            # 방금 lock 안에서 읽은 값 + 이번 저장분으로 내보낸다 (저장소를 다시 읽지 않음)
+            raw = {**latest, **updates}
+            for name in deleted:
+                raw.pop(name, None)
+            _write_report_json(report_path, {name: json.loads(value) for name, value in raw.items()})
+
+
+def export_report_json(report_path: str) -> dict | None:
+    """저장소의 현재 report를 report.json으로 원자적으로 내보낸다 (임시 파일 → os.replace). 내보낸 report 반환"""
+    store = get_job_store()
+    job_id = _job_id(report_path)
+
+    with store.job_lock(job_id):
+        report = store.load(job_id)
+        if report is None:
+            return None
+        _write_report_json(report_path, report)
+    return report
+
+
+def _write_report_json(report_path: str, report: dict) -> None:
+    tmp_path = f"{report_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fp:
+        json.dump(report, fp, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, report_path)
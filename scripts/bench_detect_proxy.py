@@ -0,0 +1,100 @@
+# 축소 프록시 탐지 벤치마크: 원본 해상도 FaceMesh vs 긴 변 N px 프록시
+# 사용법:
+#   python scripts/bench_detect_proxy.py --images path/to/phone_photos --sizes 640,960,1280,1920
+# 사진마다 랜드마크 추출 지연시간(ms)과, 원본 해상도 결과 대비 랜드마크 오차를 비교한다.
+#   - err_px : 원본 픽셀 기준 평균 오차
+#   - nme    : 눈 사이 거리로 나눈 평균 오차 (얼굴 크기와 무관한 지표)
+#   - eye_px : 프레이밍에 쓰는 두 눈 중심점 오차 (최대값)
+import os
+import sys
+import time
+import argparse
+from glob import glob
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import cv2
+import numpy as np
+
+from core.io.storage import is_allowed_image
+from core.pipeline.face_align import _get_eye_centers, detect_landmarks
+
+
+def _timed(img: np.ndarray, max_side: int, repeat: int) -> tuple[float, np.ndarray | None]:
+    best = None
+    lms = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        lms = detect_landmarks(img, max_side=max_side)
+        dt = (time.perf_counter() - t0) * 1000.0
+        best = dt if best is None else min(best, dt)
+    return best, lms
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", required=True, help="벤치마크할 사진 폴더")
+    parser.add_argument("--sizes", default="640,960,1280,1920", help="프록시 긴 변 목록 (px)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    paths = sorted(p for p in glob(os.path.join(args.images, "*")) if is_allowed_image(p))
+    images = [img for img in (cv2.imread(p) for p in paths) if img is not None]
+    if not images:
+        raise SystemExit(f"No readable images in {args.images}")
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    mp_sizes = [img.shape[0] * img.shape[1] / 1e6 for img in images]
+    print(f"images={len(images)}  mean_resolution={np.mean(mp_sizes):.1f}MP  repeat={args.repeat}")
+
+    # 첫 호출은 모델 로딩이 섞이므로 warm-up으로 제외
+    detect_landmarks(images[0], max_side=0)
+
+    # 기준: 원본 해상도 (max_side=0)
+    ref_ms = []
+    refs = []
+    for img in images:
+        ms, lms = _timed(img, 0, args.repeat)
+        ref_ms.append(ms)
+        refs.append(lms)
+    print(f"{'full':>6}: mean={np.mean(ref_ms):8.1f}ms  median={np.median(ref_ms):8.1f}ms")
+
+    for size in sizes:
+        per_ms = []
+        err_px = []
+        nme = []
+        eye_px = []
+        missing = 0
+        for img, ref in zip(images, refs):
+            ms, lms = _timed(img, size, args.repeat)
+            per_ms.append(ms)
+            if ref is None or lms is None:
+                missing += int((ref is None) != (lms is None))
+                continue
+
+            h, w = img.shape[:2]
+            scale = np.array([w, h], dtype=np.float64)
+            d = np.linalg.norm((lms[:, :2] - ref[:, :2]) * scale, axis=1)
+            l_ref, r_ref = _get_eye_centers(ref, w, h)
+            l_new, r_new = _get_eye_centers(lms, w, h)
+            eye_dist = float(np.linalg.norm(r_ref - l_ref))
+
+            err_px.append(float(d.mean()))
+            nme.append(float(d.mean()) / max(eye_dist, 1.0))
+            eye_px.append(max(float(np.linalg.norm(l_new - l_ref)), float(np.linalg.norm(r_new - r_ref))))
+
+        speedup = np.mean(ref_ms) / max(np.mean(per_ms), 1e-6)
+        line = f"{size:>6}: mean={np.mean(per_ms):8.1f}ms  median={np.median(per_ms):8.1f}ms  x{speedup:4.1f}"
+        if err_px:
+            line += (
+                f"  err_px={np.mean(err_px):6.2f}  nme={np.mean(nme):.4f}"
+                f"  eye_px(p95)={np.percentile(eye_px, 95):6.2f}"
+            )
+        line += f"  detect_mismatch={missing}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
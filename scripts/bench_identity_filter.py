@@ -0,0 +1,85 @@
+# 동일인 필터 벤치마크 (합성 임베딩): 예전 방식(첫 사진 기준 루프) vs NxN 행렬 필터
+# 사용법:
+#   python scripts/bench_identity_filter.py --sizes 50,200,500 --outliers 0.2
+# 한 사람(중심 주변으로 흩어진 임베딩) + 다른 사람(outlier)을 섞고, 첫 번째 사진을 일부러 outlier로 둔다.
+# 방식마다 필터 시간(ms)과 정답 대비 precision / recall을 출력한다.
+import os
+import sys
+import time
+import argparse
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import numpy as np
+
+from core.pipeline.face_embedding import identity_filter
+
+
+def _synthetic(n: int, outlier_ratio: float, noise: float, rng: np.random.Generator) -> tuple[np.ndarray, np.ndarray]:
+    """(N,512) 임베딩, (N,) 동일인 여부. 0번은 항상 outlier"""
+    center = rng.standard_normal(512).astype(np.float32)
+    n_out = max(1, int(round(n * outlier_ratio)))
+    same = np.ones(n, dtype=bool)
+    same[:n_out] = False
+    embeds = np.empty((n, 512), dtype=np.float32)
+    for i in range(n):
+        base = center if same[i] else rng.standard_normal(512).astype(np.float32)
+        embeds[i] = base + noise * rng.standard_normal(512).astype(np.float32)
+    return embeds, same
+
+
+def _first_ref_loop(embeds: np.ndarray, sim_threshold: float) -> np.ndarray:
+    """예전 finalize_identity: 첫 사진 기준 쌍별 cosine 루프 (+ kept<3이면 평균 임베딩 기준)"""
+    def cos(a, b):
+        a = a / (np.linalg.norm(a) + 1e-8)
+        b = b / (np.linalg.norm(b) + 1e-8)
+        return float(np.dot(a, b))
+
+    kept = np.array([cos(e, embeds[0]) >= sim_threshold for e in embeds])
+    if kept.sum() < 3:
+        mean = embeds.mean(axis=0)
+        kept = np.array([cos(e, mean) >= sim_threshold for e in embeds])
+    return kept
+
+
+def _score(kept: np.ndarray, same: np.ndarray) -> str:
+    tp = int((kept & same).sum())
+    precision = tp / kept.sum() if kept.sum() else 0.0
+    recall = tp / same.sum() if same.sum() else 0.0
+    return f"precision={precision:.3f} recall={recall:.3f}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="50,200,500")
+    parser.add_argument("--outliers", type=float, default=0.2, help="다른 사람 비율")
+    parser.add_argument("--noise", type=float, default=1.0, help="같은 사람 임베딩 흩어짐 (클수록 유사도 낮음)")
+    parser.add_argument("--threshold", type=float, default=0.38)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    for n in [int(x) for x in args.sizes.split(",") if x.strip()]:
+        embeds, same = _synthetic(n, args.outliers, args.noise, rng)
+        print(f"N={n}  same={int(same.sum())}  outliers={int((~same).sum())}")
+
+        runs = {
+            "first-ref loop": lambda: _first_ref_loop(embeds, args.threshold),
+            "medoid": lambda: identity_filter(embeds, args.threshold, method="medoid")["kept"],
+            "density": lambda: identity_filter(embeds, args.threshold, method="density")["kept"],
+        }
+        for name, fn in runs.items():
+            best = None
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                kept = fn()
+                dt = (time.perf_counter() - t0) * 1000.0
+                best = dt if best is None else min(best, dt)
+            print(f"{name:>16}: {best:8.2f} ms  {_score(kept, same)}")
+
+
+if __name__ == "__main__":
+    main()
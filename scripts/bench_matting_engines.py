@@ -0,0 +1,109 @@
+# 매팅 엔진 벤치마크 + alpha 차이 검사 (기준: PyTorch eager fp32)
+# 사용법:
+#   python scripts/bench_matting_engines.py --images data/jobs/<job_id>/faces --variants torch-bf16,torch-cl,onnx
+# 변형마다 장당 추론 시간(ms)과, 기준 alpha 대비 차이를 출력한다.
+#   - mad     : 평균 절대 차이 (0~1)
+#   - max     : 최대 절대 차이 (사진별 최대값 중 최대)
+#   - iou@0.5 : 0.5로 이진화한 전경 마스크 IoU (사진별 최소값)
+# --max-mad 를 넘는 변형이 있으면 exit code 1.
+import os
+import sys
+import time
+import argparse
+from glob import glob
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import cv2
+import numpy as np
+
+from core.io.storage import is_allowed_image
+from core.pipeline.background_birefnet import create_matting
+from core.pipeline.model_registry import BIREFNET_WEIGHT_PATH
+
+# 변형 이름 → create_matting 인자
+VARIANTS = {
+    "torch": {"engine": "torch", "channels_last": False, "dtype": "fp32"},
+    "torch-cl": {"engine": "torch", "channels_last": True, "dtype": "fp32"},
+    "torch-bf16": {"engine": "torch", "channels_last": False, "dtype": "bf16"},
+    "torch-cl-bf16": {"engine": "torch", "channels_last": True, "dtype": "bf16"},
+    "onnx": {"engine": "onnx"},
+}
+
+
+def _run(matting, images: list[np.ndarray], repeat: int, batch_size: int) -> tuple[float, list[np.ndarray]]:
+    """장당 추론 시간(ms, repeat 중 최소) + alpha 목록"""
+    matting.predict_alpha(images[0])  # warm-up (ONNX 세션 / oneDNN 커널 준비)
+    best = None
+    alphas = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        alphas = matting.predict_alpha_batch(images, batch_size=batch_size)
+        dt = (time.perf_counter() - t0) * 1000.0 / len(images)
+        best = dt if best is None else min(best, dt)
+    return best, alphas
+
+
+def _iou(a: np.ndarray, b: np.ndarray) -> float:
+    ma, mb = a >= 0.5, b >= 0.5
+    union = np.logical_or(ma, mb).sum()
+    return float(np.logical_and(ma, mb).sum() / union) if union else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", required=True, help="프레이밍된 얼굴 사진 폴더 (예: job의 faces/)")
+    parser.add_argument("--weights", default=BIREFNET_WEIGHT_PATH)
+    parser.add_argument("--variants", default="torch-cl,torch-bf16,onnx", help=f"비교할 변형 ({', '.join(VARIANTS)})")
+    parser.add_argument("--repeat", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--limit", type=int, default=8, help="사용할 사진 수")
+    parser.add_argument("--max-mad", type=float, default=0.01, help="허용 평균 절대 차이")
+    args = parser.parse_args()
+
+    paths = sorted(p for p in glob(os.path.join(args.images, "*")) if is_allowed_image(p))[:args.limit]
+    images = [img for img in (cv2.imread(p) for p in paths) if img is not None]
+    if not images:
+        raise SystemExit(f"No readable images in {args.images}")
+
+    names = [v.strip() for v in args.variants.split(",") if v.strip()]
+    unknown = [v for v in names if v not in VARIANTS]
+    if unknown:
+        raise SystemExit(f"Unknown variants: {unknown}")
+
+    print(f"images={len(images)}  batch_size={args.batch_size}  repeat={args.repeat}")
+
+    base = create_matting(args.weights, device="cpu", **VARIANTS["torch"])
+    base_ms, refs = _run(base, images, args.repeat, args.batch_size)
+    del base
+    print(f"{'torch (baseline)':>16}: {base_ms:8.1f} ms/img")
+
+    failed = False
+    for name in names:
+        if name == "torch":
+            continue
+        kwargs = dict(VARIANTS[name])
+        if kwargs["engine"] == "torch":
+            kwargs["device"] = "cpu"
+        matting = create_matting(args.weights, **kwargs)
+        ms, alphas = _run(matting, images, args.repeat, args.batch_size)
+        del matting
+
+        diffs = [np.abs(a - r) for a, r in zip(alphas, refs)]
+        mad = float(np.mean([d.mean() for d in diffs]))
+        mx = float(max(d.max() for d in diffs))
+        iou = min(_iou(a, r) for a, r in zip(alphas, refs))
+        ok = mad <= args.max_mad
+        failed |= not ok
+        print(
+            f"{name:>16}: {ms:8.1f} ms/img  x{base_ms / ms:4.2f}  "
+            f"mad={mad:.4f}  max={mx:.3f}  iou@0.5={iou:.4f}  {'OK' if ok else 'FAIL'}"
+        )
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# 매팅 해상도 단계(tier) 벤치마크: 지연시간 + 경계 정확도 (기준: full tier alpha)
+# 사용법:
+#   python scripts/bench_matting_tiers.py --images data/jobs/<job_id>/faces --tiers medium,low
+# tier마다 장당 추론 / guided upsampling 시간(ms)과, full tier 대비 아래 지표를 출력한다.
+# 같은 저해상도 alpha를 bilinear로만 올린 결과도 같이 비교한다 (guided filter의 효과 확인용).
+#   - mad      : 전체 평균 절대 차이 (0~1)
+#   - band_mad : 기준 마스크 경계 주변(±band px) 평균 절대 차이
+#   - bf1      : boundary F1 (0.5 이진화 경계끼리 tol px 이내 일치 비율)
+import os
+import sys
+import time
+import argparse
+from glob import glob
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import cv2
+import numpy as np
+
+from core.io.storage import is_allowed_image
+from core.pipeline.background_birefnet import (
+    MATTING_TIERS,
+    create_matting,
+    guided_upsample,
+    tier_min_hw,
+    tier_scale,
+)
+from core.pipeline.model_registry import BIREFNET_WEIGHT_PATH
+
+
+def _boundary(mask: np.ndarray) -> np.ndarray:
+    m = mask.astype(np.uint8)
+    return (m - cv2.erode(m, np.ones((3, 3), np.uint8))) > 0
+
+
+def _metrics(alpha: np.ndarray, ref: np.ndarray, band: int, tol: int) -> dict:
+    diff = np.abs(alpha - ref)
+
+    ref_edge = _boundary(ref >= 0.5)
+    pred_edge = _boundary(alpha >= 0.5)
+
+    k = 2 * band + 1
+    band_mask = cv2.dilate(ref_edge.astype(np.uint8), np.ones((k, k), np.uint8)) > 0
+
+    # 각 경계 픽셀에서 상대 경계까지의 거리
+    dist_to_ref = cv2.distanceTransform((~ref_edge).astype(np.uint8), cv2.DIST_L2, 3)
+    dist_to_pred = cv2.distanceTransform((~pred_edge).astype(np.uint8), cv2.DIST_L2, 3)
+    precision = float((dist_to_ref[pred_edge] <= tol).mean()) if pred_edge.any() else 1.0
+    recall = float((dist_to_pred[ref_edge] <= tol).mean()) if ref_edge.any() else 1.0
+    bf1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+
+    return {
+        "mad": float(diff.mean()),
+        "band_mad": float(diff[band_mask].mean()) if band_mask.any() else 0.0,
+        "bf1": bf1,
+    }
+
+
+def _summary(rows: list[dict]) -> str:
+    return (
+        f"mad={np.mean([r['mad'] for r in rows]):.4f}  "
+        f"band_mad={np.mean([r['band_mad'] for r in rows]):.4f}  "
+        f"bf1={np.mean([r['bf1'] for r in rows]):.4f} (min {min(r['bf1'] for r in rows):.4f})"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", required=True, help="프레이밍된 얼굴 사진 폴더 (예: job의 faces/)")
+    parser.add_argument("--weights", default=BIREFNET_WEIGHT_PATH)
+    parser.add_argument("--engine", default="torch", help="torch | onnx")
+    parser.add_argument("--tiers", default="medium,low", help=f"비교할 tier ({', '.join(MATTING_TIERS)})")
+    parser.add_argument("--limit", type=int, default=16)
+    parser.add_argument("--band", type=int, default=5, help="경계 band 반폭 (px)")
+    parser.add_argument("--tol", type=int, default=2, help="boundary F1 허용 거리 (px)")
+    args = parser.parse_args()
+
+    paths = sorted(p for p in glob(os.path.join(args.images, "*")) if is_allowed_image(p))[:args.limit]
+    images = [img for img in (cv2.imread(p) for p in paths) if img is not None]
+    if not images:
+        raise SystemExit(f"No readable images in {args.images}")
+
+    tiers = [t.strip() for t in args.tiers.split(",") if t.strip() and t.strip() != "full"]
+    for t in tiers:
+        tier_scale(t)
+
+    matting = create_matting(args.weights, engine=args.engine)
+    matting.predict_alpha(images[0])  # warm-up
+
+    t0 = time.perf_counter()
+    refs = [matting.predict_alpha(img, tier="full") for img in images]
+    full_ms = (time.perf_counter() - t0) * 1000.0 / len(images)
+    print(f"images={len(images)}  engine={args.engine}")
+    print(f"{'full':>8}: infer {full_ms:8.1f} ms/img  (reference)")
+
+    for tier in tiers:
+        scale = tier_scale(tier)
+        min_hw = tier_min_hw(tier)
+        small = [
+            cv2.resize(img, (int(round(img.shape[1] * scale)), int(round(img.shape[0] * scale))),
+                       interpolation=cv2.INTER_AREA)
+            for img in images
+        ]
+        matting._predict_padded(small[:1], 1, min_hw)  # 이 크기 첫 실행 (ONNX export / 커널 준비)
+
+        t0 = time.perf_counter()
+        lows = [matting._predict_padded([s], 1, min_hw)[0] for s in small]
+        t1 = time.perf_counter()
+        guided = [guided_upsample(low, img) for low, img in zip(lows, images)]
+        t2 = time.perf_counter()
+
+        bilinear = [
+            cv2.resize(low, (img.shape[1], img.shape[0]), interpolation=cv2.INTER_LINEAR)
+            for low, img in zip(lows, images)
+        ]
+
+        infer_ms = (t1 - t0) * 1000.0 / len(images)
+        up_ms = (t2 - t1) * 1000.0 / len(images)
+        print(
+            f"{tier:>8}: infer {infer_ms:8.1f} ms/img + guided {up_ms:5.1f} ms  "
+            f"x{full_ms / (infer_ms + up_ms):4.2f}"
+        )
+        print(f"{'':>10}guided   {_summary([_metrics(a, r, args.band, args.tol) for a, r in zip(guided, refs)])}")
+        print(f"{'':>10}bilinear {_summary([_metrics(a, r, args.band, args.tol) for a, r in zip(bilinear, refs)])}")
+
+
+if __name__ == "__main__":
+    main()
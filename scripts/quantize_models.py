@@ -0,0 +1,84 @@
+# ArcFace / BiRefNet INT8 양자화 (CPU 배포용)
+# 사용법:
+#   python scripts/quantize_models.py --job <job_id> [--eval-job <job_id>] [--models arcface,birefnet]
+# job의 프레이밍된 얼굴(faces/)과 정렬된 112x112 crop(흰 배경 결과 + 저장된 랜드마크)으로 calibration 하고,
+# 모델 옆에 *.int8.onnx 와 정확도 기록(*.int8.onnx.json)을 만든다.
+#   - arcface : fp32 임베딩 대비 cosine (mean / min / p05), job 평균 임베딩 cosine
+#   - birefnet: fp32 ONNX alpha 대비 IoU@0.5 (mean / min), 평균 절대 차이
+# --eval-job을 주면 calibration에 쓰지 않은 job으로 평가한다.
+# 결과를 보고 배포별로 IDPHOTO_QUANTIZED_MODELS="arcface,birefnet" 로 켠다.
+import os
+import sys
+import json
+import argparse
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from core.io.frame_cache import get_frame_cache
+from core.pipeline.model_registry import ARCFACE_MODEL_PATH, BIREFNET_WEIGHT_PATH
+from core.report.update_report import load_report, report_exists
+
+
+def _load_job(job_id: str, limit: int) -> tuple[list, list]:
+    """(프레이밍된 얼굴 BGR 목록, 정렬된 112x112 crop 목록)"""
+    from core.pipeline.face_embedding import FaceMeshAligner, _list_background_white_images, _stored_src5
+
+    job_path = os.path.join("data", "jobs", job_id)
+    report_path = os.path.join(job_path, "report.json")
+    if not report_exists(report_path):
+        raise SystemExit(f"Job not found: {job_id}")
+    report = load_report(report_path)
+    cache = get_frame_cache()
+
+    names = report.get("idphoto_dataset", {}).get("prepared_faces", [])[:limit]
+    faces = [img for img in (cache.get_bgr(job_path, f"faces/{n}") for n in names) if img is not None]
+
+    crops = []
+    aligner = FaceMeshAligner()
+    stored = _stored_src5(job_path, report, aligner)
+    for rel in _list_background_white_images(job_path, report)[:limit]:
+        img = cache.get_bgr(job_path, rel)
+        if img is None:
+            continue
+        aligned, _ = aligner.align_112(img, src5=stored.get(rel))
+        if aligned is not None:
+            crops.append(aligned)
+
+    return faces, crops
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--job", required=True, help="calibration에 쓸 job_id (prepare_faces / background 완료)")
+    parser.add_argument("--eval-job", default=None, help="평가용 job_id (없으면 calibration job으로 평가)")
+    parser.add_argument("--models", default="arcface,birefnet")
+    parser.add_argument("--limit", type=int, default=64, help="job당 최대 사용 장수")
+    parser.add_argument("--arcface", default=ARCFACE_MODEL_PATH)
+    parser.add_argument("--birefnet", default=BIREFNET_WEIGHT_PATH)
+    args = parser.parse_args()
+
+    from core.pipeline.quantize import quantize_arcface, quantize_birefnet
+
+    models = [m.strip() for m in args.models.split(",") if m.strip()]
+    unknown = [m for m in models if m not in ("arcface", "birefnet")]
+    if unknown:
+        raise SystemExit(f"Unknown models: {unknown}")
+
+    faces, crops = _load_job(args.job, args.limit)
+    eval_faces, eval_crops = _load_job(args.eval_job, args.limit) if args.eval_job else (None, None)
+    print(f"calibration: faces={len(faces)} crops={len(crops)}"
+          + (f"  eval: faces={len(eval_faces)} crops={len(eval_crops)}" if args.eval_job else ""))
+
+    results = {}
+    if "arcface" in models:
+        results["arcface"] = quantize_arcface(args.arcface, crops, eval_crops)
+    if "birefnet" in models:
+        results["birefnet"] = quantize_birefnet(args.birefnet, faces, eval_faces)
+
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
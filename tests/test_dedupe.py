@@ -0,0 +1,35 @@
+from core.face.dedupe import dedupe_passed, hamming
+
+
+def _item(name: str, bits: int, sharpness: float) -> dict:
+    return {"filename": name, "dhash": f"{bits:016x}", "sharpness": sharpness}
+
+
+def test_keeps_sharpest_of_near_duplicates():
+    passed = [_item("a.jpg", 0b0, 10.0), _item("b.jpg", 0b11, 50.0), _item("c.jpg", (1 << 64) - 1, 5.0)]
+    kept, duplicates = dedupe_passed(passed, max_distance=6)
+
+    assert [x["filename"] for x in kept] == ["b.jpg", "c.jpg"]
+    assert duplicates == [{"filename": "a.jpg", "duplicate_of": "b.jpg", "distance": 2, "sharpness": 10.0}]
+
+
+def test_similar_photos_do_not_chain_into_one_group():
+    # a-b, b-c, c-d는 각각 4bit 차이지만 a-d는 12bit 차이 → 이어서 한 그룹으로 묶으면 안 된다
+    a, b, c, d = 0x0, 0xF, 0xFF, 0xFFF
+    passed = [_item("a.jpg", a, 40.0), _item("b.jpg", b, 30.0), _item("c.jpg", c, 20.0), _item("d.jpg", d, 10.0)]
+    kept, duplicates = dedupe_passed(passed, max_distance=6)
+
+    assert [x["filename"] for x in kept] == ["a.jpg", "c.jpg"]
+    assert {x["filename"]: x["duplicate_of"] for x in duplicates} == {"b.jpg": "a.jpg", "d.jpg": "c.jpg"}
+    for dup in duplicates:
+        assert dup["distance"] <= 6
+        assert dup["distance"] == hamming(
+            next(x["dhash"] for x in passed if x["filename"] == dup["filename"]),
+            next(x["dhash"] for x in passed if x["filename"] == dup["duplicate_of"]),
+        )
+
+
+def test_negative_distance_disables_dedupe():
+    passed = [_item("a.jpg", 0, 1.0), _item("b.jpg", 0, 2.0)]
+    kept, duplicates = dedupe_passed(passed, max_distance=-1)
+    assert kept == passed and duplicates == []
@@ -0,0 +1,127 @@
+# 단일 warp 프레이밍(frame_id_photo)이 이전 3단계 프레이밍(원본 크기 회전 -> zero canvas crop -> resize)과
+# 같은 기하 결과를 내는지 확인한다. 이전 방식은 비교 기준으로 이 파일 안에만 둔다.
+# 합성 케이스(부드러운 랜덤 텍스처 + 임의의 눈 위치/기울기/얼굴 크기, 가장자리 클램프 포함)라 FaceMesh가 필요 없다.
+import cv2
+import numpy as np
+import pytest
+
+from core.pipeline.face_align import _framing_transform, _get_eye_centers, frame_id_photo
+
+OUT_W, OUT_H = 600, 800
+EYE_Y_RATIO = 0.35
+EYE_DIST_TO_CROP_W = 3.5
+PARAMS = dict(out_w=OUT_W, out_h=OUT_H, eye_y_ratio=EYE_Y_RATIO, eye_dist_to_crop_w=EYE_DIST_TO_CROP_W)
+
+# 허용 오차
+MAX_MEAN_DIFF = 2.0
+MAX_P99_DIFF = 12.0
+MAX_MASK_MISMATCH = 0.02  # 경계 1~2px 보간 차이
+MAX_EYE_ERR_PX = 2.0  # crop 좌표 정수화 때문에 1px 안팎은 원래 생긴다
+
+LEFT_EYE_IDX = [33, 133]
+RIGHT_EYE_IDX = [362, 263]
+
+
+def _reference_three_pass(image_bgr, *, landmarks, out_w, out_h, eye_y_ratio, eye_dist_to_crop_w):
+    """이전 구현: 원본 크기 회전 -> 겹치는 영역만 zero canvas에 붙임 -> resize"""
+    h, w = image_bgr.shape[:2]
+    geom = _framing_transform(
+        landmarks, w, h,
+        out_w=out_w, out_h=out_h, eye_y_ratio=eye_y_ratio, eye_dist_to_crop_w=eye_dist_to_crop_w,
+    )
+    if geom is None:
+        return None, None, None
+    M_rot, (x1, y1, crop_w, crop_h), M_total = geom
+
+    rotated = cv2.warpAffine(image_bgr, M_rot, (w, h), flags=cv2.INTER_LINEAR)
+
+    canvas = np.zeros((crop_h, crop_w, 3), dtype=rotated.dtype)
+    src_x1 = max(0, x1)
+    src_y1 = max(0, y1)
+    src_x2 = min(w, x1 + crop_w)
+    src_y2 = min(h, y1 + crop_h)
+    dst_x1 = src_x1 - x1
+    dst_y1 = src_y1 - y1
+    canvas[dst_y1:dst_y1 + (src_y2 - src_y1), dst_x1:dst_x1 + (src_x2 - src_x1)] = \
+        rotated[src_y1:src_y2, src_x1:src_x2]
+
+    return cv2.resize(canvas, (out_w, out_h)), landmarks, M_total
+
+
+def _landmarks(left: np.ndarray, right: np.ndarray, w: int, h: int) -> np.ndarray:
+    """눈 4점만 채운 (478,3) 정규화 랜드마크"""
+    lms = np.zeros((478, 3), dtype=np.float32)
+    for idx in LEFT_EYE_IDX:
+        lms[idx, :2] = left / [w, h]
+    for idx in RIGHT_EYE_IDX:
+        lms[idx, :2] = right / [w, h]
+    return lms
+
+
+def _synthetic_case(seed: int) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    w = int(rng.choice([800, 1200, 1600]))
+    h = int(w * rng.choice([0.75, 1.333]))
+    small = rng.integers(0, 256, size=(max(8, h // 40), max(8, w // 40), 3), dtype=np.uint8)
+    image = cv2.resize(small, (w, h), interpolation=cv2.INTER_CUBIC)
+
+    # 눈 중심 / 눈 사이 거리 / 기울기 (가장자리 근처 케이스도 섞는다)
+    eye_dist = rng.uniform(0.05, 0.3) * w
+    cx = rng.uniform(0.05, 0.95) * w
+    cy = rng.uniform(0.05, 0.95) * h
+    angle = np.radians(rng.uniform(-25, 25))
+    d = 0.5 * eye_dist * np.array([np.cos(angle), np.sin(angle)])
+    return image, _landmarks(np.array([cx, cy]) - d, np.array([cx, cy]) + d, w, h)
+
+
+def _valid_mask(shape: tuple[int, int], landmarks: np.ndarray, fn) -> np.ndarray:
+    """원본 전체가 255인 이미지를 같은 방식으로 프레이밍해서 원본 픽셀이 닿는 영역을 구한다"""
+    ones = np.full((shape[0], shape[1], 3), 255, dtype=np.uint8)
+    out, _, _ = fn(ones, landmarks=landmarks, **PARAMS)
+    return out[:, :, 0] >= 250
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_single_warp_matches_three_pass_reference(seed):
+    image, lms = _synthetic_case(seed)
+    new, _, M_new = frame_id_photo(image, landmarks=lms, **PARAMS)
+    old, _, M_old = _reference_three_pass(image, landmarks=lms, **PARAMS)
+
+    assert (new is None) == (old is None)
+    if new is None:
+        return
+    assert new.shape == (OUT_H, OUT_W, 3)
+    np.testing.assert_allclose(M_new, M_old)
+
+    mask_new = _valid_mask(image.shape[:2], lms, frame_id_photo)
+    mask_old = _valid_mask(image.shape[:2], lms, _reference_three_pass)
+    assert np.mean(mask_new != mask_old) <= MAX_MASK_MISMATCH
+
+    # 경계 보간 차이는 빼고 안쪽만 비교
+    both = cv2.erode((mask_new & mask_old).astype(np.uint8), np.ones((5, 5), np.uint8)) > 0
+    diff = np.abs(new.astype(np.int16) - old.astype(np.int16)).max(axis=2)[both]
+    if diff.size:
+        assert diff.mean() <= MAX_MEAN_DIFF
+        assert np.percentile(diff, 99) <= MAX_P99_DIFF
+
+
+def test_eyes_land_on_target_when_not_clamped():
+    w, h = 1600, 2000
+    image = np.full((h, w, 3), 128, dtype=np.uint8)
+    left, right = np.array([700.0, 900.0]), np.array([900.0, 940.0])
+    lms = _landmarks(left, right, w, h)
+
+    framed, _, M = frame_id_photo(image, landmarks=lms, **PARAMS)
+    assert framed is not None
+
+    l_px, r_px = _get_eye_centers(lms, w, h)
+    eyes = ((l_px + r_px) / 2.0).reshape(1, 1, 2).astype(np.float32)
+    projected = cv2.transform(eyes, M)[0, 0]
+    target = np.array([OUT_W / 2.0, OUT_H * EYE_Y_RATIO])
+    assert np.linalg.norm(projected - target) <= MAX_EYE_ERR_PX
+
+
+def test_degenerate_eye_distance_fails():
+    image = np.zeros((400, 300, 3), dtype=np.uint8)
+    lms = _landmarks(np.array([150.0, 200.0]), np.array([150.5, 200.0]), 300, 400)
+    assert frame_id_photo(image, landmarks=lms, **PARAMS) == (None, None, None)
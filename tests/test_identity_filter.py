@@ -0,0 +1,47 @@
+import numpy as np
+
+from core.pipeline.face_embedding import identity_filter
+
+
+def _two_clusters() -> np.ndarray:
+    """
+    0..5: 원 위에 60도 간격으로 놓인 큰 덩어리 (옆 사진끼리만 cos 0.5 → 이웃 2개씩)
+    6..9: 서로 모두 닮은 작은 덩어리 (cos 0.92 → 이웃 3개씩, 이웃이 가장 많은 사진은 여기 있다)
+    """
+    e = np.zeros((10, 8), dtype=np.float32)
+    for i in range(6):
+        angle = np.deg2rad(60 * i)
+        e[i, 0], e[i, 1] = np.cos(angle), np.sin(angle)
+    for j in range(4):
+        e[6 + j, 2] = 1.0
+        e[6 + j, 3 + j] = 0.3
+    return e
+
+
+def test_density_keeps_largest_cluster_not_most_connected_seed():
+    e = _two_clusters()
+    res = identity_filter(e, 0.4, method="density", min_neighbors=0.2)
+
+    assert res["neighbors"].tolist() == [2] * 6 + [3] * 4
+    assert res["kept"].tolist() == [True] * 6 + [False] * 4
+    assert res["ref"] in range(6)
+
+
+def test_density_adds_border_photos_of_the_cluster():
+    # 큰 덩어리의 0번과만 닮은 사진 하나 (이웃 1개 → core는 아니지만 border로 남긴다)
+    e = np.vstack([_two_clusters(), np.zeros((1, 8), dtype=np.float32)])
+    e[10, 0], e[10, 7] = 1.0, 1.0
+    res = identity_filter(e, 0.4, method="density", min_neighbors=0.2)
+
+    assert res["kept"].tolist() == [True] * 6 + [False] * 4 + [True]
+
+
+def test_medoid_keeps_photos_similar_to_reference():
+    e = np.zeros((4, 3), dtype=np.float32)
+    e[:3, 0] = 1.0
+    e[:3, 1] = [0.0, 0.2, -0.2]
+    e[3, 2] = 1.0
+    res = identity_filter(e, 0.5, method="medoid")
+
+    assert res["ref"] == 0
+    assert res["kept"].tolist() == [True, True, True, False]